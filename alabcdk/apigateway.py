@@ -0,0 +1,115 @@
+from constructs import Construct
+from aws_cdk import (
+    CfnOutput,
+    aws_apigateway,
+    aws_lambda)
+
+from .lambdas import Function
+from .profiling import timed_init
+from .utils import (gen_name, get_params, generate_output, route_kwargs)
+
+
+class RestApi(aws_apigateway.RestApi):
+    @timed_init
+    def __init__(
+            self,
+            scope: Construct,
+            id: str,
+            **kwargs):
+        """
+        Creates a RestApi with some sensible defaults.
+
+        defaults:
+        - rest_api_name -> gen_name(scope, id) if not set
+        """
+        kwargs.setdefault('rest_api_name', gen_name(scope, id))
+
+        # Set default deploy options
+        kwargs.setdefault('deploy_options', aws_apigateway.StageOptions(
+            logging_level=aws_apigateway.MethodLoggingLevel.INFO,
+            metrics_enabled=True))
+
+        super().__init__(scope, id, **kwargs)
+
+        generate_output(self, id, self.url)
+
+
+class ResourceWithLambda(Construct):
+    '''
+    Construct that wraps the creation of a lambda function,
+    optionally a resource and adds a method to the resource
+    integrated with the lambda.
+    '''
+    @timed_init
+    def __init__(
+            self,
+            scope: Construct,
+            id: str, *,
+            parent_resource: aws_apigateway.IResource,
+            code: aws_lambda.Code = None,
+            description: str = None,
+            verb: str = "ANY",
+            resource_name: str = None,
+            integration_request_templates: dict = {"application/json": '{ "statusCode": "200" }'},
+            resource_add_child: bool = True,
+            **kwargs):
+        '''
+        Create a lambda function and hook it up to a resource
+        with a lambda integration.
+
+        To standardize code, the following defaults are used:
+
+        * function.handler => "{id}.main"
+
+        * function.function_name => "{self.gen_name(f'{id}_handler')}"
+
+        * If resource_name is not set the method will be named {id}
+
+        To simplify passing additional arguments to the sub-parts, any argument
+        prefixed with:
+
+        lambda_ -> will be send to the Function constructor
+
+        method_ -> will be sent to add_method()
+
+        integration_ -> will be sent to the integration constructor
+        '''
+        super().__init__(scope, f"{id}_ResourceWithLambda")
+        kwargs = get_params(locals())
+
+        if resource_name and not resource_add_child:
+            self.node.add_error(f"{type(self).__name__}('{id}'): Cannot specify both resource_add_child=True and set a resource_name ('{resource_name}').")  # noqa e501
+
+        if not resource_name:
+            resource_name = id
+
+        lambda_kwargs, method_kwargs, integration_kwargs = route_kwargs(
+            self, kwargs, ["lambda_", "method_", "integration_"]).values()
+
+        lambda_kwargs.setdefault("function_name", gen_name(scope, f"{id}"))
+        lambda_kwargs.setdefault("handler", f"{id}.main")
+        if code:
+            lambda_kwargs['code'] = code
+
+        # TODO: Wrap this in a canarydeploy. That may be a breaking change unfortunately.
+        handler = Function(
+            scope,
+            f"{id}",
+            description=description,
+            **lambda_kwargs
+        )
+        self.handler = handler
+
+        # The alias has the provisioned concurrency or SnapStart of a performance profile.
+        self.integration = aws_apigateway.LambdaIntegration(self.handler.alias or self.handler, **integration_kwargs)
+
+        if resource_add_child:
+            self.resource = parent_resource.add_resource(resource_name)
+        else:
+            self.resource = parent_resource
+        self.method = self.resource.add_method(verb, self.integration, **method_kwargs)
+        CfnOutput(
+            self,
+            f"{id}_url",
+            value=f"{id}:: {self.resource.api.url_for_path(self.resource.path)} -- {verb}",
+            description=f"url for {id}")
@@ -1,6 +1,7 @@
 from constructs import Construct
 from aws_cdk import (aws_backup, aws_events, aws_iam)
 import aws_cdk as cdk
+from .profiling import timed_init
 from .utils import gen_name
 
 '''
@@ -21,6 +22,7 @@ backup.add_backup_rule(cron_expression="15 14 * * ? *", retentation_period_days=
 
 class BackupPlan(aws_backup.BackupPlan):
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -1,5 +1,6 @@
 from constructs import Construct
 from aws_cdk import aws_budgets
+from .profiling import timed_init
 from .utils import gen_name
 from typing import List
 
@@ -8,6 +9,7 @@ from typing import List
 
 class BillingAlert(Construct):
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
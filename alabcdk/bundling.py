@@ -0,0 +1,254 @@
+import glob
+import importlib.machinery
+import logging
+import modulefinder
+import os
+import pathlib
+import shutil
+import sys
+from typing import Dict, List, Optional, Sequence, Set
+
+from .distributions import installed_distributions
+from .layer_size import dir_size
+
+logger = logging.getLogger("alabcdk")
+
+_SOURCE_SUFFIXES = (".py", ".pyc", ".pyi")
+# Preinstalled in the Lambda python runtimes.
+_RUNTIME_MODULES = ("boto3", "botocore", "s3transfer", "jmespath", "dateutil", "urllib3", "six")
+# uname -m of the Lambda architectures, as in the extension module suffixes.
+_MACHINES = {"x86_64": "x86_64", "arm64": "aarch64"}
+
+
+def extension_suffixes(runtime: str, architecture: str) -> List[str]:
+    """
+    The suffixes of the extension modules the Lambda runtime imports, like
+    importlib.machinery.EXTENSION_SUFFIXES on Lambda.
+
+    :param runtime: e.g. "python3.12".
+    :param architecture: "x86_64" or "arm64".
+    """
+    version = runtime[len("python"):].replace(".", "")
+    return [f".cpython-{version}-{_MACHINES[architecture]}-linux-gnu.so", ".abi3.so", ".so"]
+
+
+class _TargetModuleFinder(modulefinder.ModuleFinder):
+    """
+    ModuleFinder finding extension modules by the suffixes of another interpreter
+    instead of those of the running one.
+    """
+
+    def __init__(self, path: List[str], suffixes: Sequence[str]):
+        super().__init__(path=path)
+        self.loaders = [
+            (importlib.machinery.ExtensionFileLoader, list(suffixes)),
+            (importlib.machinery.SourceFileLoader, importlib.machinery.SOURCE_SUFFIXES),
+            (importlib.machinery.SourcelessFileLoader, importlib.machinery.BYTECODE_SUFFIXES),
+        ]
+
+    def find_module(self, name, path, parent=None):
+        fullname = f"{parent.__name__}.{name}" if parent is not None else name
+        if fullname in self.excludes:
+            raise ImportError(name)
+        for entry in self.path if path is None else path:
+            if not os.path.isdir(entry):
+                continue
+            spec = importlib.machinery.FileFinder(entry, *self.loaders).find_spec(name)
+            if spec is None:
+                continue
+            if spec.loader is None:
+                # A namespace package portion.
+                return None, spec.submodule_search_locations[0], ("", "", modulefinder._PKG_DIRECTORY)
+            if spec.loader.is_package(name):
+                return None, os.path.dirname(spec.origin), ("", "", modulefinder._PKG_DIRECTORY)
+            if isinstance(spec.loader, importlib.machinery.ExtensionFileLoader):
+                kind = modulefinder._C_EXTENSION
+            elif isinstance(spec.loader, importlib.machinery.SourceFileLoader):
+                kind = modulefinder._PY_SOURCE
+            else:
+                kind = modulefinder._PY_COMPILED
+            return open(spec.origin, "rb"), spec.origin, (os.path.splitext(spec.origin)[1], "rb", kind)
+        if path is None and name in sys.builtin_module_names:
+            return None, None, ("", "", modulefinder._C_BUILTIN)
+        raise ImportError(f"No module named {name!r}", name=name)
+
+    def load_package(self, fqname, pathname):
+        if any(os.path.isfile(os.path.join(pathname, f"__init__{_}")) for _ in (".py", ".pyc")):
+            return super().load_package(fqname, pathname)
+        # A namespace package, which has no file of its own.
+        module = self.add_module(fqname)
+        module.__path__ = [pathname]
+        return module
+
+
+def bundle_modules(
+        handler_module: str,
+        *,
+        code_dir: str,
+        layer_dirs: Sequence[str],
+        include: Sequence[str] = (),
+        target_dir: pathlib.Path,
+        suffixes: Sequence[str] = None) -> dict:
+    """
+    Copy the modules of layer_dirs that the handler module imports, directly or indirectly,
+    into target_dir.
+
+    The import graph is followed statically (modulefinder) from handler_module in code_dir.
+    Imports the analysis cannot see (importlib.import_module, __import__ with computed
+    names, plugins) are missed; name those packages or modules in include, they are copied
+    whole, with what they import. Of every distribution a bundled module belongs to, the
+    .dist-info and all non-Python files (data, shared libraries in <name>.libs) are copied
+    too; its Python modules and extension modules only when they are reached.
+
+    :param handler_module: e.g. "myfunction" for the handler "myfunction.main".
+    :param code_dir: the function code; it is copied separately and not bundled.
+    :param layer_dirs: the python/ directories of the layers, in sys.path order.
+    :param include: extra modules or packages to bundle, e.g. ["yaml", "mypkg.plugins"].
+    :param target_dir: where the modules are copied to, relative to their layer directory.
+    :param suffixes: extension module suffixes of the runtime, see extension_suffixes.
+        Defaults to those of the running interpreter.
+    :return: report {"modules": [...], "missing": [...], "files": n, "size": bytes, "layer_size": bytes}
+    :raises ValueError: if an import is in the layers but cannot be bundled, such as an
+        extension module built for another Python version or architecture.
+    """
+    roots = [os.path.abspath(_) for _ in layer_dirs]
+    suffixes = list(suffixes or importlib.machinery.EXTENSION_SUFFIXES)
+    finder = _TargetModuleFinder([os.path.abspath(code_dir)] + roots, suffixes)
+    try:
+        finder.import_hook(handler_module)
+    except ImportError as e:
+        raise ValueError(f"Cannot analyze handler module '{handler_module}' in {code_dir}: {e}") from e
+
+    files: Set[str] = set()
+    for name in include:
+        located = _locate(name, roots, suffixes)
+        if located is None:
+            raise ValueError(f"Module '{name}' to include in the bundle is in none of the layers.")
+        tree = _tree(located) if os.path.isdir(located) else [located]
+        files.update(tree)
+        # Importing a package does not import its modules, follow each of them.
+        for module in [name] + _module_names(tree, _root_of(located, roots), suffixes):
+            try:
+                finder.import_hook(module)
+            except ImportError:
+                logger.debug(f"Cannot follow the imports of '{module}', copying it without them.")
+
+    modules = set()
+    for module in finder.modules.values():
+        path = module.__file__
+        if path and _root_of(path, roots):
+            files.add(os.path.abspath(path))
+            modules.add(module.__name__)
+
+    # Imports found nowhere: the standard library and the runtime (boto3) are expected.
+    expected = set(getattr(sys, "stdlib_module_names", sys.builtin_module_names)) | set(_RUNTIME_MODULES)
+    missing = sorted(name for name in finder.badmodules if name.split(".")[0] not in expected)
+    unusable = [name for name in missing if _in_layers(name, roots)]
+    if unusable:
+        raise ValueError(
+            f"Imports of '{handler_module}' are in the layers but cannot be bundled: {', '.join(unusable)}. "
+            f"Extension modules must have one of the suffixes {', '.join(suffixes)}."
+        )
+
+    files.update(_distribution_files(files, roots, suffixes))
+
+    size = 0
+    for path in sorted(files):
+        destination = target_dir / os.path.relpath(path, _root_of(path, roots))
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(path, destination)
+        size += os.path.getsize(path)
+
+    return {
+        "modules": sorted(modules),
+        "missing": missing,
+        "files": len(files),
+        "size": size,
+        "layer_size": sum(dir_size(root) for root in roots if os.path.isdir(root)),
+    }
+
+
+def _root_of(path: str, roots: List[str]) -> Optional[str]:
+    path = os.path.abspath(path)
+    for root in roots:
+        if os.path.commonpath([root, path]) == root:
+            return root
+    return None
+
+
+def _locate(name: str, roots: List[str], suffixes: Sequence[str]) -> Optional[str]:
+    """
+    The package directory or module file of the dotted name in the first root having it.
+    """
+    parts = name.split(".")
+    for root in roots:
+        base = os.path.join(root, *parts)
+        if os.path.isdir(base):
+            return base
+        for suffix in [".py", *suffixes]:
+            if os.path.isfile(base + suffix):
+                return base + suffix
+    return None
+
+
+def _module_names(files: List[str], root: str, suffixes: Sequence[str]) -> List[str]:
+    """
+    The dotted names of the modules among files, which are below root.
+    """
+    names = []
+    for path in sorted(files):
+        suffix = next((_ for _ in [".py", *suffixes] if path.endswith(_)), None)
+        if suffix is None:
+            continue
+        parts = os.path.relpath(path[:-len(suffix)], root).split(os.sep)
+        if parts[-1] == "__init__":
+            parts.pop()
+        if all(part.isidentifier() for part in parts):
+            names.append(".".join(parts))
+    return names
+
+
+def _in_layers(name: str, roots: List[str]) -> bool:
+    """
+    Whether any root has a package, module or extension module (for any interpreter) for the dotted name.
+    """
+    for root in roots:
+        base = os.path.join(root, *name.split("."))
+        if os.path.isdir(base) or os.path.isfile(base + ".py") or glob.glob(glob.escape(base) + ".*so"):
+            return True
+    return False
+
+
+def _tree(directory: str) -> List[str]:
+    return [
+        os.path.join(path, f)
+        for path, dirs, names in os.walk(directory)
+        if "__pycache__" not in path.split(os.sep)
+        for f in names
+    ]
+
+
+def _distribution_files(files: Set[str], roots: List[str], suffixes: Sequence[str]) -> Set[str]:
+    """
+    The .dist-info and data files of the distributions owning any of files.
+    """
+    result = set()
+    for root in roots:
+        for dist in installed_distributions(root):
+            owned: Dict[str, bool] = {str(path): str(path) in files for path in dist.files}
+            if not any(owned.values()):
+                continue
+            result.update(_tree(str(dist.dist_info)))
+            for path in owned:
+                if os.path.isfile(path) and _is_data(path, suffixes):
+                    result.add(path)
+    return result
+
+
+def _is_data(path: str, suffixes: Sequence[str]) -> bool:
+    if os.path.basename(os.path.dirname(path)).endswith(".libs"):
+        # Shared libraries vendored by auditwheel, loaded by the extension modules.
+        return True
+    if "__pycache__" in path.split(os.sep) or path.endswith(_SOURCE_SUFFIXES):
+        return False
+    return not any(path.endswith(suffix) for suffix in suffixes)
@@ -0,0 +1,81 @@
+import compileall
+import logging
+import pathlib
+import py_compile
+import re
+import sys
+from typing import List, Optional, Tuple
+
+from aws_cdk import aws_lambda
+
+logger = logging.getLogger("alabcdk")
+
+
+def runtime_python_version(runtime: aws_lambda.Runtime) -> Optional[Tuple[int, int]]:
+    """
+    Python version of a Lambda runtime, e.g. (3, 12) for Runtime.PYTHON_3_12.
+    None for non-python runtimes.
+    """
+    match = re.fullmatch(r"python(\d+)\.(\d+)", runtime.name)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def can_compile_for(
+    runtimes: List[aws_lambda.Runtime], *, on_mismatch: str = "warn", log=logger
+) -> bool:
+    """
+    Check whether bytecode produced by this interpreter is usable by runtimes.
+
+    Bytecode is specific to the python minor version, so it can only be generated
+    for a runtime matching the interpreter running the synth.
+
+    :param runtimes: Lambda runtimes the code will run on.
+    :param on_mismatch: "warn" to log and skip compiling, "error" to raise.
+    :raises ValueError: if no runtime matches and on_mismatch is "error".
+    :return: True if at least one of the runtimes matches the interpreter.
+    """
+    if on_mismatch not in ("warn", "error"):
+        raise ValueError(f"on_mismatch must be 'warn' or 'error', not '{on_mismatch}'.")
+
+    build_version = sys.version_info[:2]
+    versions = {runtime_python_version(runtime) for runtime in runtimes} - {None}
+    if build_version in versions:
+        if len(versions) > 1:
+            log.info(
+                f"Bytecode is only generated for python{build_version[0]}.{build_version[1]}, "
+                "other runtimes will compile on import."
+            )
+        return True
+
+    message = (
+        f"Cannot precompile bytecode for {', '.join(r.name for r in runtimes)} "
+        f"using python{build_version[0]}.{build_version[1]}. "
+        "Run the synth with a matching interpreter."
+    )
+    if on_mismatch == "error":
+        raise ValueError(message)
+    log.warning(message + " Skipping bytecode compilation.")
+    return False
+
+
+def compile_tree(root_dir: pathlib.Path, *, log=logger) -> bool:
+    """
+    Compile all .py files under root_dir to __pycache__/*.pyc for this interpreter.
+
+    The pycs are hash based and unchecked: the zip in the Lambda asset does not
+    preserve source timestamps exactly, and sources in a deployed asset never change.
+
+    :return: True if every file compiled. Files that do not compile (typically
+        python 2 leftovers in packages) are skipped and imported from source.
+    """
+    success = compileall.compile_dir(
+        str(root_dir),
+        quiet=2,
+        legacy=False,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    if not success:
+        log.debug(f"Some files under {root_dir} could not be compiled.")
+    return bool(success)
@@ -1,6 +1,9 @@
+from typing import TYPE_CHECKING, Sequence
 from constructs import Construct
 from aws_cdk import (
+    CfnOutput,
     Duration,
+    Stack,
     aws_iam,
     aws_route53,
     aws_route53_targets,
@@ -10,10 +13,15 @@ from aws_cdk import (
     aws_s3,
 )
 from .s3 import Bucket
-from .utils import (gen_name, get_params, filter_kwargs, generate_output)
+from .profiling import timed_init
+from .utils import (gen_name, get_params, generate_output, route_kwargs)
+
+if TYPE_CHECKING:
+    from aws_cdk import aws_apigateway
 
 
 class Website(Construct):
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -29,13 +37,13 @@ class Website(Construct):
             web_bucket_name: str = None,
             **kwargs) -> None:
 
-        super().__init__(scope, id, **kwargs)
         index_document = index_document or "index.html"
         error_document = error_document or index_document
         web_bucket_name = web_bucket_name or "webcontent"
+        # The s3_ and cf_ arguments are for the parts, Construct takes none of them.
         kwargs = get_params(locals())
-        s3_kwargs = filter_kwargs(kwargs, "s3_")
-        cf_kwargs = filter_kwargs(kwargs, "cf_")
+        super().__init__(scope, id)
+        s3_kwargs, cf_kwargs = route_kwargs(self, kwargs, ["s3_", "cf_"]).values()
         # Set our own cloudfront defaults
         cf_kwargs.setdefault("price_class", aws_cloudfront.PriceClass.PRICE_CLASS_100)
         cf_kwargs.setdefault("comment", f"CDN for {id}/{gen_name(self, 'distro')}")
@@ -135,4 +143,124 @@ class Website(Construct):
             "CDN_AliasRecord",
             zone=self.hosted_zone,
             target=aws_route53.RecordTarget.from_alias(
-                aws_route53_targets.CloudFrontTarget(self.distribution)))
\ No newline at end of file
+                aws_route53_targets.CloudFrontTarget(self.distribution)))
+
+
+class WebsiteXX(Construct):
+    @timed_init
+    def __init__(
+            self,
+            scope: Construct,
+            id: str,
+            *,
+            index_document: str = None,
+            error_document: str = None,
+            cors_rules: Sequence[aws_s3.CorsRule] = None,
+            domain_names: Sequence[str] = None,
+            certificate: aws_certificatemanager.Certificate = None,
+            certificate_arn: str = None,
+            backend: "aws_apigateway.IRestApi" = None,
+            **kwargs) -> None:
+        """Create a bucket and a CDN in front of it. The CDN will be connected to a
+        certificate and domain_names if provided. Passing a backend will also add
+        the backend behind /api
+
+        Args:
+            scope (core.Construct): Scope of construct
+            id (str): id of construct
+            index_document (str, optional): Index document in the bucket. Defaults to "index.html" if not set.
+            error_document (str, optional): Error document in bucket. Defaults to index_document.
+            cors_rules (Sequence[aws_s3.CorsRule], optional): Cors rules for the bucket.
+            Defaults to GET/*/* if not set.
+            domain_names (Sequence[str], optional): Aliases for the CDN. Defaults to None.
+            certificate (aws_certificatemanager.Certificate, optional): Certificate for the CDN.
+            Defaults to None if certificate_arn is not set.
+            certificate_arn (str, optional): [description]. arn to an existing certificate.
+            backend (aws_apigateway.IRestApi, optional): Backend to include in the CDN. Defaults to None.
+
+        Raises:
+            ValueError: [description]
+        """
+        super().__init__(scope, f"{id}_website")
+
+        if all([certificate, certificate_arn]):
+            raise ValueError("You cannot pass values for both 'certificate' and 'certificate_arn'.")
+        kwargs = get_params(locals())
+        bucket_kwargs, cdn_kwargs = route_kwargs(self, kwargs, ["bucket_", "cdn_"]).values()
+
+        index_document = index_document or "index.html"
+        error_document = error_document or "index.html"
+        cors_rules = cors_rules or [aws_s3.CorsRule(
+                allowed_methods=[aws_s3.HttpMethods.GET],
+                allowed_headers=["*"],
+                allowed_origins=["*"])]
+
+        routing_rules = []
+        error_responses = []
+        for error_code in ["403", "404"]:
+            routing_rules.append(
+                aws_s3.RoutingRule(
+                    condition=aws_s3.RoutingRuleCondition(
+                        http_error_code_returned_equals=error_code,
+                    ),
+                    replace_key=aws_s3.ReplaceKey.prefix_with("#!")
+                )
+            )
+            error_responses.append(aws_cloudfront.CfnDistribution.CustomErrorResponseProperty(
+                        error_code=int(error_code),
+                        response_page_path="/index.html",
+                        response_code=200))
+
+        self.bucket = Bucket(
+            self,
+            f"{id}_bucket",
+            website_index_document=index_document,
+            website_error_document=error_document,
+            block_public_access=bucket_kwargs.pop("block_public_access", None) or None,
+            public_read_access=True,
+            website_routing_rules=routing_rules,
+            cors=cors_rules,
+            **bucket_kwargs)
+        self.bucket.grant_public_access()
+        CfnOutput(self, "S3WebUrl", value=self.bucket.bucket_website_url, )
+
+        if not certificate and certificate_arn:
+            certificate = aws_certificatemanager.Certificate.from_certificate_arn(
+                self,
+                f"{id}_certificate",
+                certificate_arn
+            )
+
+        self.distribution = aws_cloudfront.Distribution(
+            self,
+            f"{id}_distro",
+            comment=f"CDN for {id}",
+
+            default_behavior=aws_cloudfront.BehaviorOptions(
+                origin=aws_cloudfront_origins.S3Origin(self.bucket)
+            ),
+            price_class=aws_cloudfront.PriceClass.PRICE_CLASS_100,
+            domain_names=domain_names,
+            certificate=certificate,
+            default_root_object=index_document,
+            **cdn_kwargs
+        )
+        if backend:
+            self.distribution.add_behavior(
+                "/api/*",
+                origin=aws_cloudfront_origins.HttpOrigin(
+                    f"{backend.rest_api_id}.execute-api.{Stack.of(self).region}.amazonaws.com",
+                    origin_path=f"/{backend.deployment_stage.stage_name}"
+                ),
+                allowed_methods=aws_cloudfront.AllowedMethods.ALLOW_ALL,
+                cache_policy=aws_cloudfront.CachePolicy(
+                    self,
+                    f"{id}_api_cachepolicy",
+                    cookie_behavior=aws_cloudfront.CacheCookieBehavior.all(),
+                    query_string_behavior=aws_cloudfront.CacheQueryStringBehavior.all(),
+                    default_ttl=Duration.seconds(0),
+                    header_behavior=aws_cloudfront.CacheHeaderBehavior.allow_list("Authorization")
+                )
+            )
+
+        CfnOutput(self, "CDNUrl", value=self.distribution.distribution_domain_name)
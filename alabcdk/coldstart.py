@@ -0,0 +1,396 @@
+"""
+Reproduce the cold starts of the Functions of a synthesized app locally.
+
+Every Function writes its handler, code directory and the local directories of the
+layers alabcdk built for it (PipLayers, the config bundle and the runtime layer) to
+<outdir>/<stack>.functions.json when the app is synthesized. For
+each function the handler module is imported in a fresh interpreter with the code and
+exactly its layers first on sys.path, as on Lambda, and called once with a synthetic
+event. Per function the median over --repeat runs is reported of:
+
+- import_ms: importing the handler module, attributed to the packages it imports with
+  -X importtime
+- first_invoke_ms: the first call of the handler
+- rss_mb: peak RSS of the interpreter
+
+    cdk synth && python -m alabcdk.coldstart --budgets coldstart.json --update-budgets
+    python -m alabcdk.coldstart --budgets coldstart.json --tolerance 0.2
+
+With --budgets the results are compared against the budgets in the file and the exit
+status is 1 if a function fails to import, times out, or exceeds a budget by more than
+--tolerance (relative) and, for times, more than --min-delta-ms.
+
+The interpreter runs isolated (-I -S), without any site-packages. After the layers
+come only the distributions the Lambda runtime provides itself (boto3, botocore, ...,
+see preinstalled_dists_<runtime>.txt), taken from the interpreter's installation, like
+/var/runtime on Lambda.
+
+Functions with layers not built by alabcdk, or with environment variables referring to
+other resources, are measured without them and reported as incomplete; no budgets are
+written for them.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from .distributions import read_manifest
+
+# Written per stack to the cloud assembly directory by the Functions, see alabcdk.lambdas.
+FUNCTIONS_FILE_SUFFIX = ".functions.json"
+METRICS = ["import_ms", "first_invoke_ms", "rss_mb"]
+
+_RESULT_PREFIX = "alabcdk-coldstart:"
+_IMPORT_MARKER = "alabcdk-coldstart: import"
+
+# Prints {distribution: [top level modules and packages]} for the distributions in argv[1]
+# and what they require, which the runtime ships with them.
+_LOCATE = """
+import importlib.metadata, json, re, sys
+result = {}
+todo = json.loads(sys.argv[1])
+while todo:
+    name = todo.pop()
+    if name in result:
+        continue
+    try:
+        dist = importlib.metadata.distribution(name)
+    except importlib.metadata.PackageNotFoundError:
+        continue
+    todo += [re.match(r"[A-Za-z0-9._-]+", r).group(0) for r in dist.requires or [] if "extra ==" not in r]
+    tops = {f.parts[0] for f in dist.files or [] if len(f.parts) > 1 or f.suffix == ".py"}
+    tops = sorted(t for t in tops if not t.endswith((".dist-info", ".data")) and t not in ("..", "__pycache__"))
+    result[name] = [str(dist.locate_file(t)) for t in tops]
+print(json.dumps(result))
+"""
+
+# Runs in the fresh interpreter; argv[1] is the JSON spec.
+_RUNNER = f"""
+import importlib, json, os, resource, sys, time
+spec = json.loads(sys.argv[1])
+sys.path[:] = spec["path"] + [p for p in sys.path if p]
+os.environ.update(spec["environment"])
+
+
+class Context:
+    function_name = spec["function_name"]
+    function_version = "$LATEST"
+    memory_limit_in_mb = str(spec["memory_size"])
+    aws_request_id = "00000000-0000-0000-0000-000000000000"
+    invoked_function_arn = "arn:aws:lambda:eu-west-1:123456789012:function:" + function_name
+    log_group_name = "/aws/lambda/" + function_name
+    log_stream_name = "coldstart"
+    deadline = time.time() + spec["timeout"]
+
+    def get_remaining_time_in_millis(self):
+        return int(max(self.deadline - time.time(), 0) * 1000)
+
+
+module_name, _, function_name = spec["handler"].rpartition(".")
+result = {{}}
+print("{_IMPORT_MARKER}", file=sys.stderr, flush=True)
+start = time.perf_counter()
+try:
+    handler = getattr(importlib.import_module(module_name), function_name)
+    result["import_ms"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    try:
+        handler(spec["event"], Context())
+    except Exception as e:
+        result["invoke_error"] = type(e).__name__ + ": " + str(e)
+    result["first_invoke_ms"] = (time.perf_counter() - start) * 1000
+except Exception as e:
+    result["error"] = type(e).__name__ + ": " + str(e)
+# kilobytes on Linux
+result["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print("{_RESULT_PREFIX}" + json.dumps(result), flush=True)
+"""
+
+
+def load_functions(outdir: str) -> Dict[str, dict]:
+    """
+    The functions of all stacks synthesized to outdir, keyed on node path.
+    """
+    functions = {}
+    for filename in sorted(glob.glob(os.path.join(outdir, "*" + FUNCTIONS_FILE_SUFFIX))):
+        with open(filename) as f:
+            functions.update(json.load(f)["functions"])
+    return functions
+
+
+def incomplete(function: dict) -> List[str]:
+    """
+    What of function cannot be reproduced locally: layers not built in the app, and
+    environment variables referring to other resources, which are only known when deployed.
+    """
+    reasons = []
+    missing = sum(1 for layer in function["layers"] if not layer)
+    if missing:
+        reasons.append(f"{missing} layer(s) not built by alabcdk are left out")
+    unresolved = function.get("unresolved_environment", [])
+    if unresolved:
+        reasons.append(f"environment variables {', '.join(unresolved)} refer to other resources and are not set")
+    return reasons
+
+
+def parse_importtime(stderr: str, top: int) -> List[dict]:
+    """
+    The packages imported by the handler module itself, by cumulative import time
+    (including what they import), from the -X importtime output after the import marker.
+    """
+    lines = stderr.splitlines()
+    if _IMPORT_MARKER in lines:
+        lines = lines[lines.index(_IMPORT_MARKER) + 1:]
+    imports = []
+    for line in lines:
+        fields = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # Nested imports are indented two spaces per level.
+        indent = len(fields[2]) - len(fields[2].lstrip())
+        imports.append((indent, fields[2].strip(), int(fields[1]) / 1000))
+    if not imports:
+        return []
+    # The handler module is the outermost import; its direct imports are one level deeper.
+    direct = min(indent for indent, _, _ in imports) + 2
+    packages = {}
+    for indent, name, ms in imports:
+        if indent == direct:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + ms
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": name, "ms": round(ms, 1)} for name, ms in ranked]
+
+
+def runtime_packages(runtime: str, python: str, directory: str) -> List[str]:
+    """
+    Link the top level modules and packages of the distributions the Lambda runtime
+    provides, as installed for python, into directory.
+
+    :return: the distributions python does not have.
+    """
+    manifest = os.path.join(os.path.dirname(__file__), f"preinstalled_dists_{runtime}.txt")
+    names = sorted(read_manifest(manifest)) if os.path.exists(manifest) else []
+    located = json.loads(subprocess.run(
+        [python, "-c", _LOCATE, json.dumps(names)], capture_output=True, text=True, check=True
+    ).stdout)
+    os.makedirs(directory, exist_ok=True)
+    for paths in located.values():
+        for path in paths:
+            target = os.path.join(directory, os.path.basename(path))
+            if os.path.exists(path) and not os.path.lexists(target):
+                os.symlink(path, target)
+    return [name for name in names if name not in located]
+
+
+def run_once(
+        path: str,
+        function: dict,
+        *,
+        python: str,
+        event: dict,
+        timeout: float,
+        top: int,
+        runtime_path: List[str]) -> dict:
+    """
+    Import and invoke function in a fresh, isolated interpreter.
+
+    :param runtime_path: directories after the layers on sys.path, see runtime_packages.
+    """
+    spec = {
+        "path": [function["code_dir"]] + [layer for layer in function["layers"] if layer] + runtime_path,
+        "handler": function["handler"],
+        "environment": {
+            **function.get("environment", {}),
+            "AWS_LAMBDA_FUNCTION_NAME": path.replace("/", "-"),
+            "AWS_LAMBDA_FUNCTION_MEMORY_SIZE": str(function["memory_size"]),
+        },
+        "function_name": path.replace("/", "-"),
+        "memory_size": function["memory_size"],
+        "timeout": function["timeout"],
+        "event": event,
+    }
+    env = {k: v for k, v in os.environ.items() if not k.startswith("PYTHON")}
+    env.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(
+            [python, "-I", "-S", "-X", "importtime", "-c", _RUNNER, json.dumps(spec)],
+            cwd=function["code_dir"],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout}s"}
+    wall_ms = (time.perf_counter() - start) * 1000
+    results = [line for line in process.stdout.splitlines() if line.startswith(_RESULT_PREFIX)]
+    if not results:
+        return {"error": f"exit code {process.returncode}: {process.stderr.strip()[-500:]}"}
+    result = json.loads(results[-1][len(_RESULT_PREFIX):])
+    result["wall_ms"] = wall_ms
+    result["imports"] = parse_importtime(process.stderr, top)
+    return result
+
+
+def measure(path: str, function: dict, *, repeat: int, **options) -> dict:
+    runs = [run_once(path, function, **options) for _ in range(repeat)]
+    failed = [run for run in runs if "error" in run]
+    if failed:
+        return {"error": failed[0]["error"]}
+    result = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS + ["wall_ms"]}
+    result["imports"] = runs[0]["imports"]
+    if "invoke_error" in runs[0]:
+        result["invoke_error"] = runs[0]["invoke_error"]
+    return result
+
+
+def compare(
+        results: Dict[str, dict], budgets: Dict[str, dict], tolerance: float, min_delta_ms: float = 0) -> List[str]:
+    """
+    :param min_delta_ms: times are only over budget when also more than this many milliseconds
+        over it, so small budgets do not fail on noise.
+    :return: descriptions of the failed functions and the metrics more than tolerance over budget.
+    """
+    regressions = []
+    for path, result in results.items():
+        if "error" in result:
+            regressions.append(f"{path}: {result['error']}")
+            continue
+        budget = budgets.get(path)
+        if budget is None:
+            continue
+        for metric in METRICS:
+            limit, value = budget.get(metric), result[metric]
+            if not limit:
+                continue
+            change = (value - limit) / limit
+            flag = ""
+            if change > tolerance and not (metric.endswith("_ms") and value - limit <= min_delta_ms):
+                flag = "  OVER BUDGET"
+                regressions.append(f"{path} {metric}: {value:.1f} over budget {limit:.1f} ({change:+.0%})")
+            print(f"{path:40} {metric:16} {limit:9.1f} -> {value:9.1f} {change:+6.0%}{flag}")
+    return regressions
+
+
+def _runtime_mismatch(functions: Dict[str, dict], python: str) -> Optional[str]:
+    version = subprocess.run(
+        [python, "-c", "import sys; print('python%d.%d' % sys.version_info[:2])"], capture_output=True, text=True
+    ).stdout.strip()
+    runtimes = sorted({f["runtime"] for f in functions.values() if f["runtime"] != version})
+    if runtimes:
+        return f"Measuring with {version}, functions run on {', '.join(runtimes)}; results will differ."
+    return None
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m alabcdk.coldstart", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("outdir", nargs="?", default="cdk.out", help="the synthesized app, default: cdk.out")
+    parser.add_argument("--function", "-f", action="append", default=[], help="only functions whose path contains this")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--event", help="JSON file with the event to invoke the handlers with, default: {}")
+    parser.add_argument("--python", default=sys.executable, help="interpreter to run the handlers with")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per run")
+    parser.add_argument("--top", type=int, default=5, help="packages to list per function")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--budgets", help="compare against the budgets in this file")
+    parser.add_argument("--update-budgets", action="store_true", help="write the results as budgets to --budgets")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative excess over a budget")
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=10, help="allowed absolute excess over a time budget, in ms"
+    )
+    args = parser.parse_args(argv)
+
+    functions = {
+        path: function
+        for path, function in load_functions(args.outdir).items()
+        if function["code_dir"] and (not args.function or any(f in path for f in args.function))
+    }
+    if not functions:
+        parser.error(f"no functions found in {args.outdir}/*{FUNCTIONS_FILE_SUFFIX}, synthesize the app first")
+    mismatch = _runtime_mismatch(functions, args.python)
+    if mismatch:
+        print(mismatch)
+    event = {}
+    if args.event:
+        with open(args.event) as f:
+            event = json.load(f)
+
+    runtime_dir = tempfile.TemporaryDirectory(prefix="alabcdk-coldstart-")
+    runtime_paths = {}
+    for runtime in sorted({function["runtime"] for function in functions.values()}):
+        runtime_paths[runtime] = os.path.join(runtime_dir.name, runtime)
+        missing = runtime_packages(runtime, args.python, runtime_paths[runtime])
+        if missing:
+            print(f"{args.python} lacks {', '.join(missing)} of the {runtime} runtime, they are left out")
+
+    results = {}
+    for path, function in functions.items():
+        reasons = incomplete(function)
+        if reasons:
+            print(f"{path}: incomplete, {'; '.join(reasons)}")
+        result = measure(
+            path,
+            function,
+            repeat=args.repeat,
+            python=args.python,
+            event=event,
+            timeout=args.timeout,
+            top=args.top,
+            runtime_path=[runtime_paths[function["runtime"]]],
+        )
+        if reasons:
+            result["incomplete"] = reasons
+        results[path] = result
+        if "error" in result:
+            print(f"{path:40} FAILED: {result['error']}")
+            continue
+        imports = ", ".join(f"{i['package']} {i['ms']:.0f}ms" for i in result["imports"])
+        print(
+            f"{path:40} import {result['import_ms']:7.1f}ms  first invoke {result['first_invoke_ms']:7.1f}ms"
+            f"  rss {result['rss_mb']:5.0f}MB  ({imports})"
+        )
+        if "invoke_error" in result:
+            print(f"{'':40} the synthetic invocation raised {result['invoke_error']}")
+
+    runtime_dir.cleanup()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": args.python, "functions": results}, f, indent=2)
+
+    if args.budgets and args.update_budgets:
+        budgets = {}
+        if os.path.exists(args.budgets):
+            with open(args.budgets) as f:
+                budgets = json.load(f)
+        for path, result in results.items():
+            if "incomplete" in result:
+                print(f"{path}: incomplete, no budget written")
+            elif "error" not in result:
+                budgets[path] = {metric: round(result[metric], 1) for metric in METRICS}
+        with open(args.budgets, "w") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+        print(f"Budgets written to {args.budgets}")
+    elif args.budgets:
+        with open(args.budgets) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Over budget:\n  " + "\n  ".join(regressions))
+            return 1
+    elif any("error" in result for result in results.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+import jsii
+from aws_cdk import aws_lambda
+from constructs import IConstruct
+
+from .fingerprints import fingerprint_cache, staged_dir
+from .layer_planner import LAMBDA_MAX_LAYERS
+from .layer_size import record_layer
+from .perf_lint import _StackIndex
+from .runtime import config as runtime_config
+from .utils import gen_name
+
+logger = logging.getLogger("alabcdk")
+
+CONFIG_BUNDLE_CONTEXT_KEY = "alabcdk:config-bundle"
+# Module name of alabcdk/runtime/config.py in the config layer.
+READER_MODULE = "alabcdk_config"
+# Read by the Lambda runtime or its extensions, these stay environment variables.
+_ENVIRONMENT_ONLY = ("AWS_", "PYTHON", "LD_", "_")
+
+_NAME_PROPERTY = {
+    "AWS::DynamoDB::Table": "tableName",
+    "AWS::SQS::Queue": "queueName",
+    "AWS::SNS::Topic": "topicName",
+    "AWS::S3::Bucket": "bucketName",
+    "AWS::SSM::Parameter": "name",
+}
+_ARN = "arn:${{AWS::Partition}}"
+# Ref and attributes of the resources above from their name, as CloudFormation returns them.
+_ATTRIBUTES = {
+    "AWS::DynamoDB::Table": {
+        "Ref": "{name}",
+        "Arn": _ARN + ":dynamodb:${{AWS::Region}}:${{AWS::AccountId}}:table/{name}",
+    },
+    "AWS::SQS::Queue": {
+        "Ref": "https://sqs.${{AWS::Region}}.${{AWS::URLSuffix}}/${{AWS::AccountId}}/{name}",
+        "QueueUrl": "https://sqs.${{AWS::Region}}.${{AWS::URLSuffix}}/${{AWS::AccountId}}/{name}",
+        "QueueName": "{name}",
+        "Arn": _ARN + ":sqs:${{AWS::Region}}:${{AWS::AccountId}}:{name}",
+    },
+    "AWS::SNS::Topic": {
+        "Ref": _ARN + ":sns:${{AWS::Region}}:${{AWS::AccountId}}:{name}",
+        "TopicArn": _ARN + ":sns:${{AWS::Region}}:${{AWS::AccountId}}:{name}",
+        "TopicName": "{name}",
+    },
+    "AWS::S3::Bucket": {
+        "Ref": "{name}",
+        "Arn": _ARN + ":s3:::{name}",
+        "DomainName": "{name}.s3.${{AWS::URLSuffix}}",
+        "RegionalDomainName": "{name}.s3.${{AWS::Region}}.${{AWS::URLSuffix}}",
+    },
+    "AWS::SSM::Parameter": {
+        "Ref": "{name}",
+    },
+}
+_PSEUDO_PARAMETERS = ("AWS::AccountId", "AWS::Region", "AWS::Partition", "AWS::URLSuffix")
+_PLACEHOLDER = re.compile(r"\$\{(AWS::[A-Za-z]+)\}")
+
+
+def enabled(scope: IConstruct, config_bundle: Optional[bool]) -> bool:
+    """
+    config_bundle, defaulting to the context value "alabcdk:config-bundle".
+    """
+    if config_bundle is None:
+        value = scope.node.try_get_context(CONFIG_BUNDLE_CONTEXT_KEY)
+        return str(value).lower() in ("1", "true", "yes") if isinstance(value, str) else bool(value)
+    return config_bundle
+
+
+@jsii.implements(cdk.IAspect)
+class ConfigBundle:
+    """
+    Collects the values added to a Function with add_environment (table and bucket names,
+    queue URLs, topic ARNs, SSM parameter names, LOGLEVEL) and compiles them at synth time
+    into alabcdk-config.json, in a layer of the function together with the reader module
+    alabcdk_config (alabcdk/runtime/config.py).
+
+    References to resources of the same stack with a literal name, as all alabcdk
+    constructs have (gen_name), become static strings; the account, region and partition
+    are substituted at runtime. Other deploy-time values stay environment variables, and
+    so does everything if the function has no room for another layer. The value of an SSM
+    parameter whose name is bundled is included when it is known at synth time.
+    """
+
+    def __init__(self, function: aws_lambda.Function):
+        self.function = function
+        self.values: Dict[str, object] = {}
+
+    def add(self, key: str, value) -> None:
+        self.values[key] = value
+
+    def visit(self, node: IConstruct) -> None:
+        if node is self.function and self.values:
+            self.compile()
+
+    def compile(self) -> None:
+        function = self.function
+        stack = cdk.Stack.of(function)
+        index = _index(stack)
+        known = {
+            "AWS::AccountId": stack.account,
+            "AWS::Region": stack.region,
+            "AWS::Partition": stack.partition,
+            "AWS::URLSuffix": stack.url_suffix,
+        }
+        known = {k: v for k, v in known.items() if not cdk.Token.is_unresolved(v)}
+
+        values: Dict[str, str] = {}
+        parameters: Dict[str, str] = {}
+        environment: List[str] = []
+        for key, value in self.values.items():
+            static = None
+            if not key.startswith(_ENVIRONMENT_ONLY):
+                static = _static(stack.resolve(value), index, parameters)
+            if static is None:
+                environment.append(key)
+            else:
+                values[key] = _PLACEHOLDER.sub(lambda m: known.get(m.group(1), m.group(0)), static)
+
+        if values and len(function.attached_layers) >= LAMBDA_MAX_LAYERS:
+            cdk.Annotations.of(function).add_warning(
+                f"No room for the config layer next to {len(function.attached_layers)} layers, "
+                "its values are environment variables."
+            )
+            environment, values, parameters = list(self.values), {}, {}
+        for key in environment:
+            # Past Function.add_environment, which would add it to the bundle again.
+            aws_lambda.Function.add_environment(function, key, self.values[key])
+        if not values:
+            return
+        if any("${AWS::AccountId}" in value for value in values.values()):
+            aws_lambda.Function.add_environment(function, runtime_config.ACCOUNT_ENV, stack.account)
+
+        layer_dir = _write_layer(function, {
+            "version": runtime_config.FORMAT_VERSION,
+            "values": values,
+            "parameters": parameters,
+            "environment": sorted(environment),
+        })
+        layer = aws_lambda.LayerVersion(
+            function,
+            "Config",
+            code=fingerprint_cache().code(str(layer_dir.parent)),
+            compatible_runtimes=[function.runtime],
+            layer_version_name=gen_name(function, f"{function.node.id}-config"),
+            description=f"alabcdk config of {function.node.path}",
+        )
+        # Seen by the size validation and alabcdk.coldstart like the PipLayers layers.
+        record_layer(layer, str(layer_dir))
+        function.add_layers(layer)
+        logger.debug(
+            f"Function '{function.node.path}': {len(values)} values in its config layer, "
+            f"{len(environment)} environment variables."
+        )
+
+
+def _index(stack: cdk.Stack) -> _StackIndex:
+    index = getattr(stack, "_config_bundle_index", None)
+    if index is None:
+        index = stack._config_bundle_index = _StackIndex(stack)
+    return index
+
+
+def _static(value, index: _StackIndex, parameters: Dict[str, str]) -> Optional[str]:
+    """
+    The resolved value as a string with ${AWS::...} placeholders, None if it is only known at deploy time.
+    Collects the values of the referenced SSM parameters known at synth time in parameters.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, dict) or len(value) != 1:
+        return None
+    if value.get("Ref") in _PSEUDO_PARAMETERS:
+        return "${" + value["Ref"] + "}"
+    if "Fn::Join" in value:
+        separator, parts = value["Fn::Join"]
+        parts = [_static(part, index, parameters) for part in parts]
+        return None if None in parts else separator.join(parts)
+    resource = index.by_reference(value)
+    if resource is None:
+        return None
+    attribute = "Ref" if "Ref" in value else value["Fn::GetAtt"][1]
+    template = _ATTRIBUTES.get(resource.cfn_resource_type, {}).get(attribute)
+    properties = index.properties_of(resource)
+    name = properties.get(_NAME_PROPERTY.get(resource.cfn_resource_type))
+    if template is None or not isinstance(name, str):
+        return None
+    if resource.cfn_resource_type == "AWS::SSM::Parameter" and isinstance(properties.get("value"), str):
+        parameters[name] = properties["value"]
+    return template.format(name=name)
+
+
+def _write_layer(function: aws_lambda.Function, config: dict) -> pathlib.Path:
+    """
+    Write the config and the reader to ./.functions.out/config/<node path>/<hash>/python,
+    one directory per content, so the fingerprint and the layer version stay the same and
+    synths of other stages writing another config do not interfere.
+
+    :return: the python/ directory.
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "-", function.node.path)
+    content = json.dumps(config, indent=2, sort_keys=True)
+    source = pathlib.Path(runtime_config.__file__).read_text()
+
+    def write(directory: pathlib.Path) -> None:
+        (directory / "python").mkdir(parents=True)
+        (directory / "python" / runtime_config.CONFIG_FILE).write_text(content)
+        (directory / "python" / f"{READER_MODULE}.py").write_text(source)
+
+    key = hashlib.sha256(json.dumps([content, source]).encode()).hexdigest()[:16]
+    parent = pathlib.Path(os.path.abspath(os.curdir)) / ".functions.out" / "config" / name
+    return staged_dir(parent, key, write) / "python"
@@ -10,10 +10,12 @@ from aws_cdk import (
     aws_apigatewayv2_integrations_alpha as _api_integrations
 )
 from constructs import Construct
+from .profiling import timed_init
 from .utils import (gen_name, generate_output)
 
 
 class ApiDomain(Construct):
+    @timed_init
     def __init__(self, scope: Construct, id: str, *,
                  domain_name: str,
                  zone_name: str,
@@ -62,6 +64,7 @@ class ApiDomain(Construct):
 
 
 class DataIngestionApi(Construct):
+    @timed_init
     def __init__(self, scope: Construct, construct_id: str, *,
                  name: str,
                  description: str,
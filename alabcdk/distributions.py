@@ -0,0 +1,192 @@
+import csv
+import logging
+import os
+import pathlib
+import re
+import shutil
+from typing import Dict, List, Optional, Set
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import InvalidVersion, Version
+
+logger = logging.getLogger("alabcdk")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Canonical distribution name as per PEP 503, e.g. "Python_Dateutil" -> "python-dateutil".
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class InstalledDistribution:
+    """
+    A distribution installed into a directory by pip, as described by its .dist-info.
+    """
+
+    def __init__(self, dist_info: pathlib.Path):
+        self.dist_info = dist_info
+        self.root_dir = dist_info.parent
+        self.name, self.version, self.requires = _read_metadata(dist_info)
+        self.files = self._read_record()
+        self.top_level = self._read_top_level()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name}=={self.version})"
+
+    def _read_record(self) -> List[pathlib.Path]:
+        """
+        Files belonging to the distribution, limited to those inside root_dir.
+        """
+        record = self.dist_info / "RECORD"
+        if not record.exists():
+            return []
+        root = os.path.abspath(self.root_dir)
+        files = []
+        with open(record, newline="") as f:
+            for row in csv.reader(f):
+                if not row:
+                    continue
+                path = os.path.abspath(os.path.join(root, row[0]))
+                if os.path.commonpath([root, path]) == root:
+                    files.append(pathlib.Path(path))
+        return files
+
+    def _read_top_level(self) -> Set[str]:
+        """
+        Importable top level names, from top_level.txt or else derived from RECORD.
+        """
+        top_level = self.dist_info / "top_level.txt"
+        if top_level.exists():
+            names = {_.strip() for _ in top_level.read_text().splitlines() if _.strip()}
+            # Some packages list sub packages (e.g. "google/protobuf").
+            return {_.split("/")[0] for _ in names}
+
+        names = set()
+        for path in self.files:
+            first = path.relative_to(self.root_dir).parts[0]
+            if first.endswith(".dist-info") or first in ("__pycache__", "bin"):
+                continue
+            names.add(first[:-3] if first.endswith(".py") else first.split(".")[0])
+        return names
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self.files if path.is_file())
+
+    def remove(self) -> int:
+        """
+        Delete exactly the files listed in RECORD, the .dist-info and directories left empty.
+
+        :return: Number of bytes removed.
+        """
+        removed = 0
+        dirs = set()
+        for path in self.files:
+            if path.is_file() or path.is_symlink():
+                removed += path.lstat().st_size
+                path.unlink()
+                dirs.add(path.parent)
+        shutil.rmtree(self.dist_info, ignore_errors=True)
+
+        root = pathlib.Path(os.path.abspath(self.root_dir))
+        # Deepest first, so parents become empty before they are visited.
+        for d in sorted(dirs, key=lambda p: len(p.parts), reverse=True):
+            while d != root and d.exists() and not any(d.iterdir()):
+                d.rmdir()
+                d = d.parent
+        return removed
+
+
+def installed_distributions(root_dir: str) -> List[InstalledDistribution]:
+    """
+    All distributions pip installed into root_dir (e.g. with pip install -t root_dir).
+    """
+    return [
+        InstalledDistribution(dist_info)
+        for dist_info in sorted(pathlib.Path(root_dir).glob("*.dist-info"))
+        if dist_info.is_dir()
+    ]
+
+
+def read_manifest(filename: str) -> Dict[str, Optional[str]]:
+    """
+    Read a preinstalled distribution manifest.
+
+    Each line holds a distribution name, optionally pinned as name==version.
+    Empty lines and lines starting with # are ignored.
+
+    :return: dict with normalized names as keys and the version (or None) as values.
+    """
+    result = {}
+    with open(filename) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            name, _, version = line.partition("==")
+            result[normalize_name(name.strip())] = version.strip() or None
+    return result
+
+
+def pinned_requirements(requirements_file: str) -> Dict[str, str]:
+    """
+    Version specifiers of the distributions in a requirements file, keyed on normalized name,
+    e.g. {"boto3": "==1.34.42", "requests": "<3,>=2.28"}. Requirements without one, pip
+    options and URLs are left out.
+    """
+    result = {}
+    with open(requirements_file) as f:
+        for line in f:
+            line = line.split(" #")[0].strip()
+            if not line or line.startswith(("#", "-")):
+                continue
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                continue
+            if requirement.specifier:
+                result[normalize_name(requirement.name)] = str(requirement.specifier)
+    return result
+
+
+def satisfies(version: Optional[str], specifier: str) -> Optional[bool]:
+    """
+    Whether version satisfies specifier (e.g. ">=1.26,<2"), None if the version is unknown or invalid.
+    """
+    if not version:
+        return None
+    try:
+        return SpecifierSet(specifier).contains(Version(version), prereleases=True)
+    except (InvalidSpecifier, InvalidVersion):
+        return None
+
+
+def _read_metadata(dist_info: pathlib.Path):
+    """
+    Name, version and (non-extra) required distribution names from METADATA.
+    """
+    metadata = dist_info / "METADATA"
+    name = version = None
+    requires = set()
+    if metadata.exists():
+        with open(metadata, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    break
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    name = value.strip()
+                elif key == "Version":
+                    version = value.strip()
+                elif key == "Requires-Dist" and "extra ==" not in value:
+                    match = re.match(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)", value)
+                    if match:
+                        requires.add(normalize_name(match.group(1)))
+    if not (name and version):
+        # <name>-<version>.dist-info
+        stem = dist_info.name[: -len(".dist-info")]
+        fallback_name, _, fallback_version = stem.rpartition("-")
+        name = name or fallback_name
+        version = version or fallback_version
+    return normalize_name(name), version, requires
@@ -1,4 +1,5 @@
 from typing import Sequence
+from .profiling import timed_init
 from .utils import (
     gen_name,
     get_params,
@@ -29,6 +30,7 @@ class Table(aws_dynamodb.Table):
             if isinstance(grantee, aws_lambda.Function):
                 grantee.add_environment(env_var_name, self.table_name)
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -0,0 +1,26 @@
+from constructs import Construct
+from aws_cdk import (
+    aws_events,
+    aws_events_targets,
+    aws_lambda)
+
+from .profiling import timed_init
+from .utils import (gen_name, get_params)
+
+
+class Rule(aws_events.Rule):
+    @timed_init
+    def __init__(
+            self,
+            scope: Construct,
+            id: str,
+            target: aws_lambda.Function = None,
+            **kwargs):
+        kwargs = get_params(locals())
+        if all([target, kwargs.get("targets")]):
+            raise Exception("You may only specify one of 'target' and 'targets")
+
+        if target:
+            kwargs.setdefault("targets", [aws_events_targets.LambdaFunction(target)])
+        kwargs.setdefault("rule_name", gen_name(scope, id))
+        super().__init__(scope, id, **kwargs)
@@ -0,0 +1,61 @@
+import contextlib
+import logging
+import pathlib
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("alabcdk")
+
+_WAIT_LOG_SECONDS = 10
+
+
+@contextlib.contextmanager
+def file_lock(path: pathlib.Path):
+    """
+    Exclusive lock on the file path (created if missing), held for the duration of the
+    with block. It excludes other processes, e.g. synths of several stages running at once
+    (see alabcdk.synth_driver), as well as other threads, since every acquisition opens
+    the file anew.
+
+    The lock is released when the process dies, so a crashed synth never leaves a
+    stale lock behind.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as f:
+        start = time.monotonic()
+        logged = False
+        while not _try_lock(f):
+            if not logged and time.monotonic() - start > _WAIT_LOG_SECONDS:
+                logger.info(f"Waiting for lock {path}, held by another synth.")
+                logged = True
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def _try_lock(f) -> bool:
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(f) -> None:
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,267 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+import stat
+import threading
+import time
+import uuid
+import zipfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aws_cdk as cdk
+from aws_cdk import aws_lambda
+
+from .file_lock import file_lock
+from .profiling import span
+
+logger = logging.getLogger("alabcdk")
+
+_FINGERPRINT_FILE = "fingerprints.json"
+_ASSET_DIR = "assets"
+_CHUNK = 1024 * 1024
+# Zip entries get a fixed timestamp, so equal content gives byte-identical zips.
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+# Staged directories for other inputs are removed once they have not been used for this long.
+_STAGED_KEEP_SECONDS = 24 * 3600
+
+_caches: Dict[str, "FingerprintCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def default_out_dir() -> pathlib.Path:
+    """
+    Per-project directory for fingerprints and prebuilt asset zips, ./.alabcdk.out.
+    """
+    return pathlib.Path(os.path.abspath(os.curdir)) / ".alabcdk.out"
+
+
+class FingerprintCache:
+    """
+    Content hashes of directories, reused as long as the file metadata is unchanged.
+
+    Hashing an asset reads every byte of it; listing the size and modification time of
+    every file does not. The content hash of a directory is stored together with the
+    metadata of its files (path, size, mtime, mode) and only recomputed when these change,
+    much like git's index.
+
+    Each fingerprinted directory is also packaged once into a deterministic zip under
+    <out_dir>/assets, which becomes the Lambda asset. CDK is given the content hash as
+    custom asset hash, so it neither hashes the directory again nor copies its tree.
+    """
+
+    def __init__(self, out_dir: str = None):
+        """
+        :param out_dir: Defaults to default_out_dir().
+        """
+        self.out_dir = pathlib.Path(out_dir) if out_dir else default_out_dir()
+        self._file = self.out_dir / _FINGERPRINT_FILE
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, dict]] = None
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self._file) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        # Other processes (see alabcdk.synth_driver) may have added entries since we loaded.
+        with file_lock(self.out_dir / f".{_FINGERPRINT_FILE}.lock"):
+            try:
+                with open(self._file) as f:
+                    self._entries = {**json.load(f), **self._entries}
+            except (OSError, ValueError):
+                pass
+            tmp = self._file.with_name(f"{self._file.name}.{uuid.uuid4().hex}")
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f, indent=1, sort_keys=True)
+            os.replace(tmp, self._file)
+
+    def fingerprint(self, directory: str, *, exclude: List[str] = None, extra: dict = None) -> str:
+        """
+        Content hash of directory.
+
+        :param directory: directory to fingerprint.
+        :param exclude: fnmatch patterns; a file is left out if its relative path or any
+            of its path segments matches. Patterns starting with "/" only match the relative
+            path, as in .gitignore, e.g. "/buildkey" excludes buildkey at the top level only.
+        :param extra: other inputs that should change the hash, e.g. a build key.
+        """
+        return self._entry(directory, exclude=exclude, extra=extra)["hash"]
+
+    def _entry(self, directory: str, *, exclude: List[str], extra: dict) -> dict:
+        directory = os.path.abspath(directory)
+        with span("fingerprint: list files", directory=directory):
+            files = list_files(directory, exclude=exclude)
+        metadata = hashlib.sha256(
+            json.dumps([files, exclude or [], extra or {}], sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        with self._lock:
+            entry = self._load().get(directory)
+            if entry and entry["metadata"] == metadata:
+                return entry
+
+        logger.debug(f"Fingerprinting {directory}.")
+        digest = hashlib.sha256(json.dumps(extra or {}, sort_keys=True, default=str).encode())
+        with span("fingerprint: hash", directory=directory, files=len(files)):
+            for relpath, _, _, mode in files:
+                # The mode goes into the zip, so it is part of the content.
+                digest.update(f"{relpath}\0{mode:o}\0".encode())
+                if stat.S_ISLNK(mode):
+                    digest.update(os.readlink(os.path.join(directory, relpath)).encode())
+                    continue
+                with open(os.path.join(directory, relpath), "rb") as f:
+                    for chunk in iter(lambda: f.read(_CHUNK), b""):
+                        digest.update(chunk)
+        entry = {"metadata": metadata, "hash": digest.hexdigest()}
+
+        with self._lock:
+            previous = self._load().get(directory, {})
+            if previous.get("zip") and previous["hash"] != entry["hash"]:
+                pathlib.Path(previous["zip"]).unlink(missing_ok=True)
+            self._entries[directory] = entry
+            self._save()
+        return entry
+
+    def zip(self, directory: str, *, exclude: List[str] = None, extra: dict = None) -> Tuple[pathlib.Path, str]:
+        """
+        Deterministic zip of directory, built only when its fingerprint changed.
+
+        :return: (zip file, content hash)
+        """
+        directory = os.path.abspath(directory)
+        entry = self._entry(directory, exclude=exclude, extra=extra)
+        zip_file = self.out_dir / _ASSET_DIR / f"{entry['hash']}.zip"
+        if not zip_file.exists():
+            logger.info(f"Packaging {directory} to {zip_file}.")
+            with span("fingerprint: zip", directory=directory):
+                deterministic_zip(
+                    directory, zip_file, files=[f for f, _, _, _ in list_files(directory, exclude=exclude)]
+                )
+        with self._lock:
+            entry = self._load()[directory]
+            if entry.get("zip") != str(zip_file):
+                entry["zip"] = str(zip_file)
+                self._save()
+        return zip_file, entry["hash"]
+
+    def code(self, directory: str, *, exclude: List[str] = None, extra: dict = None) -> aws_lambda.Code:
+        """
+        Lambda Code for directory, as a prebuilt zip with its content hash as asset hash.
+        """
+        zip_file, asset_hash = self.zip(directory, exclude=exclude, extra=extra)
+        return aws_lambda.Code.from_asset(
+            str(zip_file), asset_hash=asset_hash, asset_hash_type=cdk.AssetHashType.CUSTOM
+        )
+
+
+def list_files(directory: str, *, exclude: List[str] = None) -> List[Tuple[str, int, int, int]]:
+    """
+    Sorted (relative path, size, mtime_ns, mode) of all regular files and symlinks under directory.
+
+    Symlinks, also to directories, are not followed; they are listed (and zipped) as links.
+    mode is stat.S_IFLNK for symlinks, stat.S_IFREG with the executable bits for files.
+    """
+    exclude = exclude or []
+    floating = [p for p in exclude if not p.startswith("/")]
+    anchored = [p[1:] for p in exclude if p.startswith("/")]
+    excluded = re.compile("|".join(fnmatch.translate(p) for p in floating)).match if floating else None
+    excluded_path = re.compile("|".join(fnmatch.translate(p) for p in anchored)).match if anchored else None
+    result = []
+    todo = [""]
+    while todo:
+        rel_dir = todo.pop()
+        with os.scandir(os.path.join(directory, rel_dir)) as entries:
+            for entry in entries:
+                relpath = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                # A pattern matches a path segment or the whole relative path, an anchored one only the latter.
+                if excluded and (excluded(entry.name) or excluded(relpath)):
+                    continue
+                if excluded_path and excluded_path(relpath):
+                    continue
+                if entry.is_symlink():
+                    st = entry.stat(follow_symlinks=False)
+                    result.append((relpath, st.st_size, st.st_mtime_ns, stat.S_IFLNK))
+                elif entry.is_dir(follow_symlinks=False):
+                    todo.append(relpath)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    result.append((relpath, st.st_size, st.st_mtime_ns, stat.S_IFREG | (st.st_mode & 0o111)))
+    return sorted(result)
+
+
+def deterministic_zip(directory: str, zip_file: pathlib.Path, *, files: List[str]) -> None:
+    """
+    Zip files (relative to directory) in sorted order with fixed timestamps and permissions
+    (0755 for executables, 0644 otherwise). Symlinks are stored as symlinks, as zip -y does.
+    """
+    zip_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = zip_file.with_name(f"{zip_file.name}.{uuid.uuid4().hex}")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for relpath in sorted(files):
+            fp = os.path.join(directory, relpath)
+            info = zipfile.ZipInfo(relpath, date_time=_ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            st = os.lstat(fp)
+            if stat.S_ISLNK(st.st_mode):
+                info.external_attr = (stat.S_IFLNK | 0o777) << 16
+                z.writestr(info, os.readlink(fp))
+                continue
+            info.external_attr = (stat.S_IFREG | (0o755 if st.st_mode & 0o111 else 0o644)) << 16
+            with open(fp, "rb") as src, z.open(info, "w") as dst:
+                for chunk in iter(lambda: src.read(_CHUNK), b""):
+                    dst.write(chunk)
+    os.replace(tmp, zip_file)
+
+
+def fingerprint_cache(out_dir: str = None) -> FingerprintCache:
+    """
+    The FingerprintCache for out_dir (default_out_dir() if None), shared within the process.
+    """
+    out_dir = str(pathlib.Path(out_dir) if out_dir else default_out_dir())
+    with _caches_lock:
+        return _caches.setdefault(out_dir, FingerprintCache(out_dir))
+
+
+def staged_dir(parent: pathlib.Path, key: str, build: Callable[[pathlib.Path], None]) -> pathlib.Path:
+    """
+    The directory parent/<key>, created by build(directory) if it does not exist yet.
+
+    The directory is named after its inputs (key, e.g. the fingerprint of its sources) and
+    does not change once it exists, so synths running at the same time with other inputs
+    (e.g. stages, see alabcdk.synth_driver) each package their own directory, and never
+    one that is being rebuilt. It is built in a temporary directory and renamed into place.
+    Directories of other keys, and other files, that were not used for a day are removed.
+    """
+    parent.mkdir(parents=True, exist_ok=True)
+    target = parent / key
+    if not target.exists():
+        tmp = parent / f".{key}.{uuid.uuid4().hex}"
+        try:
+            build(tmp)
+            os.rename(tmp, target)
+        except OSError:
+            # Another synth renamed its build into place first.
+            if not target.is_dir():
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    os.utime(target)
+    stale = time.time() - _STAGED_KEEP_SECONDS
+    for path in parent.iterdir():
+        if path != target and path.lstat().st_mtime < stale:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+    return target
@@ -0,0 +1,241 @@
+import functools
+import logging
+import os
+import pathlib
+import re
+import subprocess
+import zlib
+from typing import Dict, List, Optional
+
+from .profiling import span
+
+logger = logging.getLogger("alabcdk")
+
+_SECTION = re.compile(r'^\s*\[\s*([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+_KEY_VALUE = re.compile(r"^\s*([A-Za-z][A-Za-z0-9-]*)\s*=\s*(.*?)\s*$")
+
+
+class GitInfo:
+    """
+    Deploy information about the git checkout a CDK app is synthesized from.
+
+    Everything is read from the .git directory. Only what cannot be derived from
+    refs alone (git describe for a commit without an annotated tag) runs git, once.
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = os.path.abspath(directory or os.curdir)
+        self.git_dir, self.common_dir = find_git_dir(self.directory)
+
+    def _git(self, *args: str) -> str:
+        try:
+            with span("git " + args[0], "subprocess", args=" ".join(args)):
+                result = subprocess.run(
+                    ["git", *args],
+                    cwd=self.directory,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+        except OSError:
+            logger.warning(f"Could not run 'git {' '.join(args)}'.")
+            return ""
+        if result.returncode != 0:
+            return ""
+        return result.stdout.decode().strip()
+
+    @functools.cached_property
+    def head(self) -> Optional[str]:
+        """
+        Contents of HEAD: "ref: refs/heads/<branch>" or a commit id when detached.
+        """
+        if not self.git_dir:
+            return None
+        return (self.git_dir / "HEAD").read_text().strip()
+
+    @functools.cached_property
+    def commit_id(self) -> str:
+        if not self.head:
+            return self._git("rev-parse", "HEAD")
+        if self.head.startswith("ref: "):
+            return self.resolve_ref(self.head[5:]) or self._git("rev-parse", "HEAD")
+        return self.head
+
+    @functools.cached_property
+    def branch(self) -> str:
+        """
+        Current branch, empty when HEAD is detached (like git branch --show-current).
+        """
+        if not self.head:
+            return self._git("branch", "--show-current")
+        if self.head.startswith("ref: refs/heads/"):
+            return self.head[len("ref: refs/heads/"):]
+        return ""
+
+    @functools.cached_property
+    def tag(self) -> str:
+        """
+        Like git describe --always: the annotated tag on HEAD if there is exactly one,
+        otherwise git itself describes the commit (and picks the newest of several tags).
+        """
+        commit = self.commit_id
+        if self.git_dir and commit:
+            names = self.annotated_tags.get(commit, [])
+            if len(names) == 1:
+                return names[0]
+        return self._git("describe", "--always")
+
+    @functools.cached_property
+    def annotated_tags(self) -> Dict[str, List[str]]:
+        """
+        {commit: [tag name, ...]} of the annotated tags found without running git.
+        """
+        result = {}
+        for name, target in sorted(self.refs("refs/tags/").items()):
+            commit = self.tagged_commit(target)
+            if commit:
+                result.setdefault(commit, []).append(name[len("refs/tags/"):])
+        return result
+
+    @functools.cached_property
+    def remotes(self) -> List[str]:
+        """
+        Remotes in the format of git remote -v, with tabs replaced by spaces.
+        """
+        if not self.common_dir:
+            return self._git("remote", "-v").replace("\t", " ").splitlines()
+        result = []
+        config = read_config(self.common_dir / "config")
+        for (section, name), values in sorted(config.items(), key=lambda item: item[0][1] or ""):
+            if section != "remote" or "url" not in values:
+                continue
+            result.append(f"{name} {values['url'][-1]} (fetch)")
+            for url in values.get("pushurl", values["url"][-1:]):
+                result.append(f"{name} {url} (push)")
+        return result
+
+    @functools.cached_property
+    def packed_refs(self) -> Dict[str, tuple]:
+        """
+        {ref: (target, peeled target or None)} from packed-refs.
+        """
+        result = {}
+        packed = self.common_dir / "packed-refs"
+        if not packed.exists():
+            return result
+        last = None
+        for line in packed.read_text().splitlines():
+            if line.startswith("#") or not line.strip():
+                continue
+            if line.startswith("^") and last:
+                result[last] = (result[last][0], line[1:].strip())
+                continue
+            target, _, last = line.partition(" ")
+            result[last] = (target, None)
+        return result
+
+    @functools.cached_property
+    def _peeled(self) -> Dict[str, str]:
+        """
+        {tag object id: object id} of the peeled entries in packed-refs.
+        """
+        return {target: peeled for target, peeled in self.packed_refs.values() if peeled}
+
+    def refs(self, prefix: str) -> Dict[str, str]:
+        """
+        {ref: object id} of all refs starting with prefix, loose refs taking precedence.
+        """
+        result = {ref: target for ref, (target, _) in self.packed_refs.items() if ref.startswith(prefix)}
+        root = self.common_dir / prefix
+        if root.is_dir():
+            for path in root.rglob("*"):
+                if path.is_file():
+                    result[path.relative_to(self.common_dir).as_posix()] = path.read_text().strip()
+        return result
+
+    def resolve_ref(self, ref: str, depth: int = 0) -> Optional[str]:
+        """
+        Object id a ref points to, following symbolic refs.
+        """
+        for base in (self.git_dir, self.common_dir):
+            path = base / ref
+            if path.is_file():
+                content = path.read_text().strip()
+                if content.startswith("ref: ") and depth < 5:
+                    return self.resolve_ref(content[5:], depth + 1)
+                return content
+        if ref in self.packed_refs:
+            return self.packed_refs[ref][0]
+        return None
+
+    def tagged_commit(self, object_id: str) -> Optional[str]:
+        """
+        Object an annotated tag object points to. None for other objects (lightweight
+        tags, which git describe ignores) and for objects only found in pack files.
+        """
+        if object_id in self._peeled:
+            return self._peeled[object_id]
+        path = self.common_dir / "objects" / object_id[:2] / object_id[2:]
+        if not path.exists():
+            return None
+        data = zlib.decompress(path.read_bytes())
+        header, _, body = data.partition(b"\0")
+        if not header.startswith(b"tag "):
+            return None
+        match = re.match(rb"object ([0-9a-f]+)", body)
+        return match.group(1).decode() if match else None
+
+
+def find_git_dir(directory: str):
+    """
+    The git directory of the checkout containing directory, and its common directory
+    (they differ for worktrees).
+
+    :return: (git_dir, common_dir), both None if directory is not in a checkout.
+    """
+    path = pathlib.Path(os.path.abspath(directory))
+    for candidate in [path, *path.parents]:
+        dot_git = candidate / ".git"
+        if dot_git.is_dir():
+            return dot_git, dot_git
+        if dot_git.is_file():
+            content = dot_git.read_text().strip()
+            if content.startswith("gitdir: "):
+                git_dir = (candidate / content[len("gitdir: "):]).resolve()
+                common_dir = git_dir
+                if (git_dir / "commondir").exists():
+                    common_dir = (git_dir / (git_dir / "commondir").read_text().strip()).resolve()
+                return git_dir, common_dir
+    return None, None
+
+
+def read_config(filename: pathlib.Path) -> Dict[tuple, Dict[str, List[str]]]:
+    """
+    Minimal git config reader: {(section, subsection): {key: [values]}}.
+    """
+    result = {}
+    values = None
+    if not filename.exists():
+        return result
+    for line in filename.read_text().splitlines():
+        if line.lstrip().startswith(("#", ";")):
+            continue
+        match = _SECTION.match(line)
+        if match:
+            values = result.setdefault((match.group(1).lower(), match.group(2)), {})
+            continue
+        match = _KEY_VALUE.match(line)
+        if match and values is not None:
+            values.setdefault(match.group(1).lower(), []).append(match.group(2).strip('"'))
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _git_info(directory: str) -> GitInfo:
+    return GitInfo(directory)
+
+
+def git_info(directory: str = None) -> GitInfo:
+    """
+    GitInfo for directory (default: the current directory), shared within the process.
+    """
+    return _git_info(os.path.abspath(directory or os.curdir))
@@ -0,0 +1,530 @@
+import functools
+import glob
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+import sys
+import sysconfig
+import types
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+import aws_cdk as cdk
+from constructs import Construct
+
+from .fingerprints import default_out_dir, fingerprint_cache
+from .profiling import enable_from_context, span
+
+logger = logging.getLogger("alabcdk")
+
+# Set to false (cdk synth -c alabcdk:incremental=false) to rebuild every stack.
+INCREMENTAL_CONTEXT_KEY = "alabcdk:incremental"
+# Overrides the cache directory, e.g. one per stage when stages are synthesized concurrently.
+CACHE_CONTEXT_KEY = "alabcdk:incremental-cache"
+# Stack ids (a list or comma separated) to synthesize, with the stacks they depend on.
+STACKS_CONTEXT_KEY = "alabcdk:stacks"
+# Context that selects what to synthesize rather than what the stacks look like.
+_NOT_INPUTS = (INCREMENTAL_CONTEXT_KEY, CACHE_CONTEXT_KEY, STACKS_CONTEXT_KEY)
+# Written to the cloud assembly directory.
+REPORT_FILE = "alabcdk-incremental.json"
+_CACHE_DIR = "incremental"
+_INPUTS_FILE = "inputs.json"
+# The files written for a stack to the cloud assembly: <artifact id>.template.json, .assets.json,
+# .functions.json and so on.
+_FILES_DIR = "files"
+# Bump when what is cached changes, so older cache entries are rebuilt.
+_CACHE_FORMAT = 2
+
+# Files and directories the constructs of a stack were built from (function code,
+# requirements files), keyed on stack path. Filled during construction, see record_input.
+stack_inputs: Dict[str, Set[str]] = {}
+
+
+def record_input(scope: Construct, path: str) -> None:
+    """
+    Note that the stack of scope is built from path (a file or directory), so
+    IncrementalSynth rebuilds the stack when its content changes.
+    """
+    stack_inputs.setdefault(cdk.Stack.of(scope).node.path, set()).add(os.path.abspath(path))
+
+
+class IncrementalSynth:
+    """
+    Synthesizes an app, reusing the templates of stacks whose inputs did not change.
+
+    Stacks are added as factories instead of being constructed directly:
+
+        app = cdk.App()
+        incremental = alabcdk.IncrementalSynth(app)
+        incremental.add("Data", DataStack, stage="DEV")
+        incremental.add(
+            "Api", lambda scope, id: ApiStack(scope, id, table=incremental.get("Data").table), uses=["Data"]
+        )
+        incremental.synth()
+
+    The inputs of a stack are the app context, the arguments passed to the factory, the
+    versions of alabcdk, aws-cdk-lib and python, the source of alabcdk, the source file
+    of the factory and of sources, the project modules the factory imports (directly, via
+    other project modules, or while it runs), and the files and directories its
+    constructs were built from: the sources of all its file assets and those passed to
+    record_input (such as layer requirements). A stack whose factory has no known module
+    is always rebuilt.
+
+    When none of these changed since the previous synth, the factory is not called and a
+    placeholder stack takes its place. After synthesizing, the placeholder is replaced in
+    the cloud assembly by what the last build of the stack wrote there, kept in
+    ./.alabcdk.out/incremental: its manifest entry (with its warnings), template, asset
+    manifest, other files such as the functions.json and perf-lint.json of AlabStack, and
+    its staged assets. The cloud assembly is the same as if the stack had been built. A stack is also
+    rebuilt when a stack it depends on is rebuilt, and a stack is built when a rebuilt
+    stack depends on it, so references between stacks stay intact.
+    Dependencies are those passed as uses plus those found in the previous cloud assembly.
+    Stacks with docker image assets are always rebuilt.
+
+    Why each stack was rebuilt or reused is logged and written to alabcdk-incremental.json
+    in the cloud assembly directory.
+    """
+
+    def __init__(self, app: cdk.App, *, cache_dir: str = None):
+        """
+        :param app: the app to add the stacks to.
+        :param cache_dir: where templates and assets are cached. Defaults to the context
+            value alabcdk:incremental-cache or <alabcdk.fingerprints.default_out_dir()>/incremental.
+        """
+        self.app = app
+        cache_dir = cache_dir or app.node.try_get_context(CACHE_CONTEXT_KEY)
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir else default_out_dir() / _CACHE_DIR
+        self.enabled = str(app.node.try_get_context(INCREMENTAL_CONTEXT_KEY)).lower() not in ("false", "0", "no")
+        self.stacks: Dict[str, cdk.Stack] = {}
+        self.report: Dict[str, dict] = {}
+        self._specs: Dict[str, dict] = {}
+        self._built: Set[str] = set()
+        # Project modules first imported while building a stack, keyed on stack id.
+        self._imported: Dict[str, Set[str]] = {}
+        # Reused stacks are no AlabStacks, which would otherwise pick up alabcdk:profile.
+        enable_from_context(app)
+
+    def add(
+        self,
+        id: str,
+        factory: Callable[..., cdk.Stack],
+        *,
+        uses: Sequence[str] = (),
+        sources: Sequence[str] = (),
+        **kwargs,
+    ) -> None:
+        """
+        Add the stack id, built by factory(app, id, **kwargs). Stacks are built in the
+        order they are added.
+
+        :param uses: ids of stacks whose constructs factory uses (via get()).
+        :param sources: more files or directories the stack is defined by, next to the
+            source file of factory.
+        """
+        if id in self._specs:
+            raise ValueError(f"Stack '{id}' was already added.")
+        self._specs[id] = {"factory": factory, "uses": list(uses), "sources": list(sources), "kwargs": kwargs}
+
+    def get(self, id: str) -> cdk.Stack:
+        """
+        The stack id as built by its factory.
+
+        :raises KeyError: if the stack was reused or is not built yet; pass uses=[id]
+            when adding the stack that needs it, and add id before that stack.
+        """
+        if id not in self._built:
+            raise KeyError(f"Stack '{id}' is not built. Add it before the stacks using it, and pass uses=['{id}'].")
+        return self.stacks[id]
+
+    def synth(self, **options):
+        """
+        Build or reuse the stacks and synthesize the app.
+
+        With the context key alabcdk:stacks set to a list of stack ids, only those stacks and
+        the stacks they depend on are added to the app.
+
+        :param options: passed to App.synth().
+        :return: the cloud assembly.
+        """
+        with span("IncrementalSynth: decide"):
+            cached = {id: self._load(id) for id in self._specs}
+            inputs = {id: self._inputs(id, cached[id]) for id in self._specs}
+            dependencies = {
+                id: (set(spec["uses"]) | set((cached[id] or {}).get("dependencies", []))) & set(self._specs)
+                for id, spec in self._specs.items()
+            }
+            included = self._included(dependencies)
+            rebuild = self._decide(cached, inputs, dependencies, included)
+
+        for id, spec in self._specs.items():
+            if id not in included:
+                continue
+            if id in rebuild:
+                with span("IncrementalSynth: build", id=id):
+                    before = set(sys.modules)
+                    self.stacks[id] = spec["factory"](self.app, id, **spec["kwargs"])
+                    self._imported[id] = _module_files(sys.modules[name] for name in set(sys.modules) - before)
+                self._built.add(id)
+            else:
+                with span("IncrementalSynth: reuse", id=id):
+                    self.stacks[id] = self._reuse(id, cached[id])
+        for id in self.stacks:
+            if id not in rebuild:
+                for dependency in cached[id]["dependencies"]:
+                    if dependency in self.stacks:
+                        self.stacks[id].add_dependency(self.stacks[dependency])
+
+        assembly = self.app.synth(**options)
+
+        reused = [id for id in self.stacks if id not in rebuild]
+        if reused:
+            with span("IncrementalSynth: restore"):
+                for id in reused:
+                    self._restore(id, cached[id], pathlib.Path(assembly.directory))
+            # The assembly read before the templates were restored.
+            assembly = cdk.cx_api.CloudAssembly(assembly.directory)
+
+        with span("IncrementalSynth: save"):
+            for id in self._built:
+                # A stack synthesized without the stacks depending on it misses their references.
+                if all(id not in uses or other in included for other, uses in dependencies.items()):
+                    self._save(id, inputs[id], pathlib.Path(assembly.directory))
+        with open(pathlib.Path(assembly.directory) / REPORT_FILE, "w") as f:
+            json.dump(self.report, f, indent=2)
+        return assembly
+
+    def _included(self, dependencies: Dict[str, Set[str]]) -> Set[str]:
+        selected = self.app.node.try_get_context(STACKS_CONTEXT_KEY)
+        if not selected:
+            return set(self._specs)
+        if isinstance(selected, str):
+            selected = [id.strip() for id in selected.split(",") if id.strip()]
+        unknown = set(selected) - set(self._specs)
+        if unknown:
+            raise ValueError(f"Context '{STACKS_CONTEXT_KEY}' names unknown stacks: {', '.join(sorted(unknown))}.")
+        result = set()
+        todo = list(selected)
+        while todo:
+            id = todo.pop()
+            if id not in result:
+                result.add(id)
+                todo.extend(dependencies[id])
+        return result
+
+    def _decide(
+        self,
+        cached: Dict[str, dict],
+        inputs: Dict[str, dict],
+        dependencies: Dict[str, Set[str]],
+        included: Set[str],
+    ) -> Set[str]:
+        reasons = {}
+        for id in included:
+            if not self.enabled:
+                reasons[id] = [f"incremental synth is disabled ({INCREMENTAL_CONTEXT_KEY})"]
+            elif cached[id] is None:
+                reasons[id] = ["no cached template"]
+            elif cached[id].get("not_cacheable"):
+                reasons[id] = [cached[id]["not_cacheable"]]
+            else:
+                reasons[id] = _changes(cached[id]["inputs"], inputs[id])
+
+        rebuild = {id for id, why in reasons.items() if why}
+        changed = True
+        while changed:
+            changed = False
+            for id in included:
+                for other in sorted(dependencies[id] & included):
+                    if other in rebuild and id not in rebuild:
+                        reasons[id].append(f"depends on {other}, which is rebuilt")
+                        rebuild.add(id)
+                        changed = True
+                    if id in rebuild and other not in rebuild:
+                        reasons[other].append(f"{id} depends on it and is rebuilt")
+                        rebuild.add(other)
+                        changed = True
+
+        for id in self._specs:
+            if id not in included:
+                self.report[id] = {"action": "skipped", "reasons": [f"not selected by {STACKS_CONTEXT_KEY}"]}
+                continue
+            action = "rebuilt" if id in rebuild else "reused"
+            self.report[id] = {"action": action, "reasons": reasons[id]}
+            logger.info(f"Stack {id}: {action}" + (f" ({'; '.join(reasons[id])})." if reasons[id] else "."))
+        return rebuild
+
+    def _inputs(self, id: str, cached: dict) -> dict:
+        spec = self._specs[id]
+        context = {k: v for k, v in self.app.node.get_all_context().items() if k not in _NOT_INPUTS}
+        sources = [spec["factory"], *spec["sources"]]
+        return {
+            "context": _hash(context),
+            "arguments": _hash(spec["kwargs"]),
+            "versions": _versions(),
+            "alabcdk": _alabcdk_source_hash(),
+            "sources": {_display(path): _path_hash(path) for path in map(_source_path, sources) if path},
+            # Partly only known after a stack was built once; the inputs of a new build are saved then.
+            "modules": {
+                _display(path): _path_hash(path)
+                for path in sorted(_imported_modules(spec["factory"]) | set((cached or {}).get("module_paths", [])))
+            },
+            "assets": {_display(path): _path_hash(path) for path in (cached or {}).get("asset_paths", [])},
+        }
+
+    def _load(self, id: str):
+        try:
+            with open(self.cache_dir / id / _INPUTS_FILE) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached if cached.get("format") == _CACHE_FORMAT else None
+
+    def _save(self, id: str, inputs: dict, assembly_dir: pathlib.Path) -> None:
+        stack = self.stacks[id]
+        directory = self.cache_dir / id
+        shutil.rmtree(directory, ignore_errors=True)
+        (directory / "assets").mkdir(parents=True)
+        (directory / _FILES_DIR).mkdir()
+
+        with open(assembly_dir / "manifest.json") as f:
+            artifacts = json.load(f)["artifacts"]
+        artifact = artifacts[stack.artifact_id]
+        artifact_ids = {other_stack.artifact_id: other for other, other_stack in self.stacks.items()}
+        asset_paths = set(stack_inputs.get(stack.node.path, set()))
+        # Where the assets were staged from; the manifest only has the staged copies.
+        asset_paths.update(
+            os.path.abspath(c.source_path) for c in stack.node.find_all() if isinstance(c, cdk.AssetStaging)
+        )
+        module_paths = _imported_modules(self._specs[id]["factory"]) | self._imported.get(id, set())
+        entry = {
+            "format": _CACHE_FORMAT,
+            "inputs": {
+                **inputs,
+                "modules": {_display(path): _path_hash(path) for path in sorted(module_paths)},
+            },
+            "module_paths": sorted(module_paths),
+            "dependencies": sorted(artifact_ids[d] for d in artifact.get("dependencies", []) if d in artifact_ids),
+            "stack": {
+                "stack_name": stack.stack_name,
+                "environment": artifact.get("environment"),
+                "termination_protection": artifact["properties"].get("terminationProtection", False),
+                "tags": artifact["properties"].get("tags", {}),
+            },
+            "artifact": artifact,
+            "assets": [],
+        }
+
+        template_file = artifact["properties"]["templateFile"]
+        for dependency in artifact.get("dependencies", []):
+            if artifacts.get(dependency, {}).get("type") != "cdk:asset-manifest":
+                continue
+            with open(assembly_dir / artifacts[dependency]["properties"]["file"]) as f:
+                manifest = json.load(f)
+            if manifest.get("dockerImages"):
+                entry["not_cacheable"] = "it has docker image assets"
+            for source_hash, asset in manifest.get("files", {}).items():
+                source = asset["source"]
+                if source.get("path") == template_file:
+                    continue
+                if "path" not in source:
+                    entry["not_cacheable"] = "it has file assets built by a command"
+                    continue
+                if os.path.isabs(source["path"]):
+                    # Not staged (aws:cdk:disableAssetStaging), the path is the source itself.
+                    asset_paths.add(source["path"])
+                    continue
+                _link(assembly_dir / source["path"], directory / "assets" / source["path"])
+                entry["assets"].append(source["path"])
+
+        if _module_of(self._specs[id]["factory"]) is None:
+            entry["not_cacheable"] = "the module of its factory is unknown"
+        entry["asset_paths"] = sorted(asset_paths)
+        entry["inputs"]["assets"] = {_display(path): _path_hash(path) for path in entry["asset_paths"]}
+
+        for path in assembly_dir.glob(glob.escape(stack.artifact_id) + ".*"):
+            if path.is_file():
+                shutil.copyfile(path, directory / _FILES_DIR / path.name)
+        with open(directory / _INPUTS_FILE, "w") as f:
+            json.dump(entry, f, indent=1, sort_keys=True)
+
+    def _reuse(self, id: str, cached: dict) -> cdk.Stack:
+        """
+        A placeholder for the stack id with its properties, replaced by the cached stack
+        after synthesizing, see _restore.
+        """
+        props = cached["stack"]
+        account, region = None, None
+        match = re.match(r"aws://([^/]+)/(.+)", props.get("environment") or "")
+        if match:
+            account, region = (None if v.startswith("unknown-") else v for v in match.groups())
+        stack = cdk.Stack(
+            self.app,
+            id,
+            stack_name=props["stack_name"],
+            env=cdk.Environment(account=account, region=region) if account or region else None,
+            termination_protection=props["termination_protection"],
+            tags=props["tags"] or None,
+        )
+        # Keeps the template of the placeholder valid until it is replaced.
+        cdk.CfnWaitConditionHandle(stack, "Reused")
+        return stack
+
+    def _restore(self, id: str, cached: dict, assembly_dir: pathlib.Path) -> None:
+        """
+        Replace the placeholder of the reused stack id in the cloud assembly by the cached
+        stack: its manifest entry, its files and its staged assets.
+        """
+        directory = self.cache_dir / id
+        with open(assembly_dir / "manifest.json") as f:
+            manifest = json.load(f)
+        manifest["artifacts"][self.stacks[id].artifact_id] = cached["artifact"]
+        with open(assembly_dir / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+        for path in (directory / _FILES_DIR).iterdir():
+            shutil.copyfile(path, assembly_dir / path.name)
+        for name in cached["assets"]:
+            if not (assembly_dir / name).exists():
+                _link(directory / "assets" / name, assembly_dir / name)
+
+
+def _changes(before: dict, after: dict) -> List[str]:
+    """
+    Why inputs before and after differ, one entry per changed input.
+    """
+    result = []
+    for name, value in after.items():
+        old = before.get(name)
+        if old == value:
+            continue
+        if isinstance(value, dict) and isinstance(old, dict):
+            changed = sorted(k for k in set(old) | set(value) if old.get(k) != value.get(k))
+            result.append(f"{name} changed: {', '.join(changed)}")
+        else:
+            result.append(f"{name} changed")
+    return result
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=_describe).encode()).hexdigest()
+
+
+def _describe(value) -> str:
+    if isinstance(value, Construct):
+        return value.node.path
+    # Object addresses differ between runs.
+    return re.sub(r" at 0x[0-9a-fA-F]+", "", repr(value))
+
+
+def _versions() -> str:
+    versions = {"python": "%d.%d" % sys.version_info[:2]}
+    for distribution in ["alabcdk", "aws-cdk-lib"]:
+        try:
+            versions[distribution] = importlib.metadata.version(distribution)
+        except importlib.metadata.PackageNotFoundError:
+            versions[distribution] = None
+    return _hash(versions)
+
+
+def _alabcdk_source_hash() -> str:
+    return fingerprint_cache().fingerprint(str(pathlib.Path(__file__).parent), exclude=["__pycache__"])
+
+
+def _module_of(factory) -> Optional[types.ModuleType]:
+    while isinstance(factory, functools.partial):
+        factory = factory.func
+    module = inspect.getmodule(factory)
+    return module if module is not None and getattr(module, "__file__", None) else None
+
+
+def _imported_modules(factory) -> Set[str]:
+    """
+    Source files of the module of factory and of the project modules it refers to,
+    directly or through other project modules.
+    """
+    module = _module_of(factory)
+    if module is None:
+        return set()
+    seen = {module.__name__: module}
+    todo = [module]
+    while todo:
+        for value in list(vars(todo.pop()).values()):
+            if isinstance(value, types.ModuleType):
+                other = value
+            elif isinstance(value, (type, types.FunctionType)):
+                other = sys.modules.get(getattr(value, "__module__", None) or "")
+            else:
+                continue
+            if other is not None and other.__name__ not in seen and _module_files([other]):
+                seen[other.__name__] = other
+                todo.append(other)
+    return _module_files(seen.values())
+
+
+def _module_files(modules) -> Set[str]:
+    """
+    Source files of the modules that belong to the project: not alabcdk, not the
+    standard library and not installed packages.
+    """
+    excluded = _library_dirs()
+    result = set()
+    for module in modules:
+        path = getattr(module, "__file__", None)
+        if not path or not path.endswith(".py"):
+            continue
+        path = os.path.abspath(path)
+        if not path.startswith(excluded):
+            result.add(path)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _library_dirs() -> tuple:
+    dirs = {str(pathlib.Path(__file__).parent)}
+    for scheme in ("stdlib", "platstdlib", "purelib", "platlib"):
+        dirs.add(sysconfig.get_path(scheme))
+    dirs.update(p for p in sys.path if os.path.basename(p) in ("site-packages", "dist-packages"))
+    return tuple(os.path.abspath(d) + os.sep for d in dirs if d)
+
+
+def _source_path(source) -> str:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.abspath(source)
+    try:
+        return inspect.getsourcefile(source)
+    except TypeError:
+        return None
+
+
+def _path_hash(path: str) -> str:
+    if os.path.isdir(path):
+        return fingerprint_cache().fingerprint(path, exclude=["__pycache__"])
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    return "missing"
+
+
+def _display(path: str) -> str:
+    path = os.path.abspath(path)
+    return os.path.relpath(path) if path.startswith(os.path.abspath(os.curdir) + os.sep) else path
+
+
+def _link(source: pathlib.Path, target: pathlib.Path) -> None:
+    """
+    Hard link source (a file or directory tree) to target, copying where linking fails.
+    """
+    def link_file(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    if source.is_dir():
+        shutil.copytree(source, target, copy_function=link_file)
+    else:
+        link_file(source, target)
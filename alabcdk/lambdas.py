@@ -1,17 +1,68 @@
-import glob
-import hashlib
+import concurrent.futures
+import json
+import logging
 import os
 import pathlib
 import shutil
 import subprocess
+import sys
 import tempfile
-from typing import List, Optional
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 
 import aws_cdk as cdk
-from aws_cdk import Duration, aws_lambda, aws_logs
-from constructs import Construct
+import jsii
+from aws_cdk import Duration, aws_lambda, aws_logs, aws_ssm
+from constructs import Construct, IValidation
 
-from .utils import gen_name, generate_output, get_params, setup_logger
+from .bundling import bundle_modules, extension_suffixes
+from .bytecode import can_compile_for, compile_tree
+from .coldstart import FUNCTIONS_FILE_SUFFIX
+from .config_bundle import ConfigBundle, enabled
+from .distributions import (
+    installed_distributions,
+    normalize_name,
+    pinned_requirements,
+    read_manifest,
+    satisfies,
+)
+from .file_lock import file_lock
+from .fingerprints import fingerprint_cache, staged_dir
+from .incremental import record_input
+from .layer_cache import LayerCache, build_key
+from .layer_planner import LAMBDA_MAX_LAYERS, LayerGroup, drop_preinstalled, plan_layers, resolve
+from .layer_size import (
+    DEFAULT_SIZE_FAIL_MB,
+    DEFAULT_SIZE_WARN_MB,
+    analyze_layer,
+    check_budget,
+    built_layers,
+    dir_size,
+    record_layer,
+    top_distributions,
+    write_report,
+)
+from .layer_slimming import DEFAULT_SLIM_RULES, SlimRule, slim_layer
+from .performance_profiles import (
+    RECOGNIZE_LAYER_VERSION,
+    PerformanceProfile,
+    add_alias,
+    resolve_profile,
+    stage_of,
+)
+from .profiling import span, timed_init
+from .runtime import warm_cache as runtime_warm_cache
+from .shared_layers import (
+    DEFAULT_NAMESPACE,
+    layer_name_of,
+    lookup_shared_layer,
+    parameter_name,
+    published_layers,
+    register_shared_layer,
+    shared_layer_key,
+)
+from .utils import gen_name, generate_output, get_params, remove_params, setup_logger
+from .wheelhouse import Wheelhouse
 
 logger = setup_logger(name="alabcdk")
 _stage_to_loglevel = {"PROD": "INFO", "TEST": "DEBUG", "DEV": "DEBUG"}
@@ -19,6 +70,24 @@ _stage_to_loglevel = {"PROD": "INFO", "TEST": "DEBUG", "DEV": "DEBUG"}
 
 _DEFAULT_LAMBDA_LOGLEVEL = "DEBUG"
 
+# pip --platform per Lambda architecture name.
+_PIP_PLATFORMS = {"x86_64": "manylinux2014_x86_64", "arm64": "manylinux2014_aarch64"}
+# Bump when the way layers are built changes, to invalidate cached layers.
+_BUILD_RECIPE_VERSION = 1
+_BUILD_KEY_FILE = "buildkey"
+_SIZE_FILE = "size.json"
+_PLAN_DIR = "_plan"
+# Build bookkeeping in a layer directory, not part of the layer itself.
+# Anchored to the top, packages may have files with these names.
+_LAYER_BUILD_FILES = [f"/{_}" for _ in (_BUILD_KEY_FILE, _SIZE_FILE, "pip.log", "pip-download.log")]
+
+
+class _LayerLogAdapter(logging.LoggerAdapter):
+    """Prefix log lines with the layer id, keeping concurrent builds apart."""
+
+    def process(self, msg, kwargs):
+        return f"[{self.extra['layer']}] {msg}", kwargs
+
 
 class Function(aws_lambda.Function):
     def _loglevel_for_stage(self) -> str:
@@ -27,13 +96,126 @@ class Function(aws_lambda.Function):
             stage = self.stack.stage
         return _stage_to_loglevel.get(stage, _DEFAULT_LAMBDA_LOGLEVEL)
 
-    def __init__(self, scope: Construct, id: str, **kwargs):
+    @timed_init
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        compile_bytecode: bool = False,
+        bytecode_mismatch: str = "warn",
+        size_warn_mb: float = DEFAULT_SIZE_WARN_MB,
+        size_fail_mb: float = DEFAULT_SIZE_FAIL_MB,
+        fingerprint_assets: bool = False,
+        performance_profile: Union[str, PerformanceProfile, Dict[str, Union[str, PerformanceProfile]]] = None,
+        bundle: bool = False,
+        bundle_include: List[str] = None,
+        config_bundle: bool = None,
+        warm_cache: bool = False,
+        **kwargs,
+    ):
+        """
+        Creates a Function with some sensible defaults.
+
+        defaults:
+        - function_name -> gen_name(scope, id) if not set
+        - handler -> "{id}.main"
+        - code -> the directory {id}, excluding .env* files
+        - runtime -> PYTHON_3_12
+        - timeout -> 3 seconds
+        - architecture -> X86_64, pass aws_lambda.Architecture.ARM_64 for Graviton. Layers
+          from PipLayers built for another architecture fail the synth, use
+          PipLayers(architectures=[...]).idlayers_for(architecture).
+
+        layers may contain LayerGroups (PipLayers(plan=True).idlayers); they are flattened
+        and layers appearing more than once are attached only once. Layers built by PipLayers
+        that ship different versions of a distribution are reported as a warning.
+
+        - :param compile_bytecode: ship precompiled __pycache__/*.pyc files with the
+          default code. The code is staged in ./.functions.out/{id}/<fingerprint> and compiled there,
+          again only when its sources changed.
+          Ignored if code is passed.
+        - :param bytecode_mismatch: "warn" or "error" when the python running the synth
+          does not match the runtime, see PipLayers.
+        - :param size_warn_mb: warn when the code and layers together are larger than
+          this, unzipped. Defaults to 200.
+        - :param size_fail_mb: fail the synth when the code and layers together are
+          larger than this, unzipped. Defaults to the Lambda limit of 250.
+        - :param fingerprint_assets: package the default code as a zip in ./.alabcdk.out with
+          a content hash that is only recomputed when file sizes or modification times change,
+          see alabcdk.fingerprints. This changes the asset hashes once. Defaults to False.
+        - :param performance_profile: "latency-critical", "batch", "cheap" (see
+          alabcdk.performance_profiles.PROFILES), a PerformanceProfile, or {stage: profile}
+          with "*" for the other stages. Sets memory, ephemeral storage, architecture and
+          timeout, unless passed explicitly, for the stage of the AlabStack. With provisioned
+          concurrency or SnapStart the version is published as the alias "live" (self.alias),
+          which callers must invoke to benefit; self.alias is None otherwise.
+        - :param bundle: instead of attaching the layers built by PipLayers, copy only the
+          modules of those layers the handler imports (directly or indirectly, found by
+          static analysis) into the code, staged in ./.functions.out/{id}/<fingerprint>. What was bundled
+          is reported in ./.functions.out/{id}.bundle.json. Layers not built by PipLayers,
+          and layers added later with add_layers, stay attached. Ignored if code is passed.
+        - :param bundle_include: modules or packages imported dynamically, which the static
+          analysis cannot see, to bundle whole, e.g. ["mypackage.plugins"].
+        - :param config_bundle: compile the values added with add_environment (by the grants
+          of Table, Bucket, Queue, Topic and StringParameter, and LOGLEVEL) into a JSON file
+          in a config layer, read with alabcdk_config.get(key) instead of os.environ, see
+          alabcdk.config_bundle.ConfigBundle. Values passed in environment stay environment
+          variables. Defaults to the context value "alabcdk:config-bundle".
+        - :param warm_cache: attach the layer with the module alabcdk_warm_cache (see
+          alabcdk/runtime/warm_cache.py), caching boto3 clients, computed values and S3
+          objects in /tmp across warm invocations. One layer per stack.
+        """
         kwargs = get_params(locals())
+        remove_params(
+            kwargs,
+            [
+                "compile_bytecode",
+                "bytecode_mismatch",
+                "size_warn_mb",
+                "size_fail_mb",
+                "fingerprint_assets",
+                "performance_profile",
+                "bundle",
+                "bundle_include",
+                "config_bundle",
+                "warm_cache",
+            ],
+        )
 
         kwargs.setdefault("function_name", gen_name(scope, id))
         kwargs.setdefault("handler", f"{id}.main")
-        kwargs.setdefault("code", aws_lambda.Code.from_asset(id, exclude=[".env*"]))
         kwargs.setdefault("runtime", aws_lambda.Runtime.PYTHON_3_12)
+        profile = resolve_profile(performance_profile, stage_of(scope)) if performance_profile else None
+        if profile:
+            for k, v in profile.function_kwargs(kwargs["runtime"]).items():
+                kwargs.setdefault(k, v)
+        if "code" in kwargs:
+            code_dir = getattr(kwargs["code"], "path", None)
+            if code_dir:
+                record_input(scope, code_dir)
+        else:
+            record_input(scope, id)
+            bundle_layers = None
+            if bundle:
+                bundle_layers, kwargs["layers"] = _bundled_layers(
+                    scope, id, kwargs.get("layers") or [], kwargs.get("architecture", aws_lambda.Architecture.X86_64)
+                )
+            kwargs["code"], code_dir = _default_code(
+                id,
+                runtime=kwargs["runtime"],
+                architecture=kwargs.get("architecture", aws_lambda.Architecture.X86_64),
+                compile_bytecode=compile_bytecode,
+                bytecode_mismatch=bytecode_mismatch,
+                fingerprint_assets=fingerprint_assets,
+                handler=kwargs["handler"],
+                bundle_layers=bundle_layers,
+                bundle_include=bundle_include or [],
+            )
+        if warm_cache:
+            kwargs["layers"] = list(kwargs.get("layers") or []) + [_runtime_layer(scope)]
+        if kwargs.get("layers"):
+            kwargs["layers"] = _flatten_layers(kwargs["layers"])
         kwargs.setdefault("timeout", Duration.seconds(3))
         kwargs.setdefault("log_retention", aws_logs.RetentionDays.FIVE_DAYS)
 
@@ -51,18 +233,347 @@ class Function(aws_lambda.Function):
 
         super().__init__(scope, id, **kwargs)
 
+        self._config_bundle = ConfigBundle(self) if enabled(self, config_bundle) else None
+        if self._config_bundle:
+            cdk.Aspects.of(self).add(self._config_bundle)
+        self.attached_layers = list(kwargs.get("layers") or [])
+        self._untracked_layers: List[str] = []
+        self._track_layer_versions(self.attached_layers)
+        self.node.add_validation(
+            _FunctionSizeValidation(self, code_dir=code_dir, warn_mb=size_warn_mb, fail_mb=size_fail_mb)
+        )
+        self.node.add_validation(_FunctionArchitectureValidation(self))
+        self.node.add_validation(_FunctionLayerVersionsValidation(self))
+        _FunctionsManifest.of(self.stack).add(self, code_dir=code_dir, handler=kwargs["handler"])
+
         for k, v in kwargs.get("environment", {}).items():
             generate_output(self, k, v)
 
         self.add_environment("LOGLEVEL", self._loglevel_for_stage())
+        self.alias = add_alias(self, profile) if profile and profile.needs_alias else None
+        self._warn_untracked_layers()
+
+    def add_layers(self, *layers: aws_lambda.ILayerVersion) -> None:
+        attached = {layer.node.path for layer in self.attached_layers}
+        layers = [layer for layer in _flatten_layers(layers) if layer.node.path not in attached]
+        self.attached_layers.extend(layers)
+        self._track_layer_versions(layers)
+        self._warn_untracked_layers()
+        return super().add_layers(*layers)
+
+    def _track_layer_versions(self, layers: List[aws_lambda.ILayerVersion]) -> None:
+        """
+        Mix the content of layers into the hash of current_version, which does not change
+        with the layers unless the feature flag @aws-cdk/aws-lambda:recognizeLayerVersion is set.
+        Layers built here count with their content, imported layers with their ARN.
+        """
+        if cdk.FeatureFlags.of(self).is_enabled(RECOGNIZE_LAYER_VERSION):
+            return
+        for layer in layers:
+            built = built_layers(self).get(layer.node.path)
+            if built:
+                self.invalidate_version_based_on(fingerprint_cache().fingerprint(built["dir"]))
+            elif not cdk.Token.is_unresolved(layer.layer_version_arn):
+                self.invalidate_version_based_on(layer.layer_version_arn)
+            else:
+                self._untracked_layers.append(layer.node.path)
+
+    def _warn_untracked_layers(self) -> None:
+        if getattr(self, "alias", None) is None or not self._untracked_layers:
+            return
+        cdk.Annotations.of(self).add_warning(
+            f"The version of alias '{self.alias.alias_name}' does not change with layers "
+            f"{', '.join(self._untracked_layers)}; set the feature flag {RECOGNIZE_LAYER_VERSION} "
+            "in cdk.json."
+        )
+        self._untracked_layers = []
 
     def add_environment(
         self, key: str, value: str, *, remove_in_edge: Optional[bool] = None
     ) -> "Function":
         generate_output(self, key, value)
+        if getattr(self, "_config_bundle", None) and not remove_in_edge:
+            self._config_bundle.add(key, value)
+            return self
         return super().add_environment(key, value, remove_in_edge=remove_in_edge)
 
 
+def _build_id(layer_id: str, architecture: aws_lambda.Architecture) -> str:
+    """
+    Name of the build of a layer for architecture; x86_64 builds keep the plain layer id.
+    """
+    if architecture.name == aws_lambda.Architecture.X86_64.name:
+        return layer_id
+    return f"{layer_id}_{architecture.name}"
+
+
+def _flatten_layers(layers) -> List[aws_lambda.ILayerVersion]:
+    """
+    Layers with LayerGroups (or other lists) expanded, keeping the first occurrence of each layer.
+    """
+    result = []
+    seen = set()
+    for layer in layers:
+        for _ in layer if isinstance(layer, (list, tuple)) else [layer]:
+            if _.node.path not in seen:
+                seen.add(_.node.path)
+                result.append(_)
+    return result
+
+
+@jsii.implements(IValidation)
+class _FunctionSizeValidation:
+    """
+    Checks the unzipped size of a function's code and layers when the app is synthesized,
+    after all layers have been added.
+    """
+
+    def __init__(self, function: "Function", *, code_dir: Optional[str], warn_mb: float, fail_mb: float):
+        self.function = function
+        self.code_dir = code_dir
+        self.warn_mb = warn_mb
+        self.fail_mb = fail_mb
+
+    def validate(self) -> List[str]:
+        with span("Function: size walk", function=self.function.node.path):
+            total = dir_size(self.code_dir) if self.code_dir and os.path.isdir(self.code_dir) else 0
+        unknown = []
+        built = built_layers(self.function)
+        for layer in self.function.attached_layers:
+            if layer.node.path in built:
+                total += built[layer.node.path]["size"]
+            else:
+                unknown.append(layer.node.id)
+
+        what = f"Function '{self.function.node.id}' (code and layers)"
+        if unknown:
+            what += f", not counting layers {', '.join(unknown)}"
+        level, message = check_budget(what, total, warn_mb=self.warn_mb, fail_mb=self.fail_mb)
+        if level == "error":
+            return [message]
+        if level == "warning":
+            logger.warning(message)
+            cdk.Annotations.of(self.function).add_warning(message)
+        return []
+
+
+@jsii.implements(IValidation)
+class _FunctionArchitectureValidation:
+    """
+    Checks that the layers built by PipLayers match the architecture of the function.
+    """
+
+    def __init__(self, function: "Function"):
+        self.function = function
+
+    def validate(self) -> List[str]:
+        architecture = self.function.architecture.name
+        built = built_layers(self.function)
+        built_for = {path: layer["architecture"] for path, layer in built.items() if layer["architecture"]}
+        return [
+            f"Function '{self.function.node.id}' runs on {architecture}, but layer '{layer.node.id}' "
+            f"is built for {built_for[layer.node.path]}."
+            for layer in self.function.attached_layers
+            if built_for.get(layer.node.path, architecture) != architecture
+        ]
+
+
+@jsii.implements(IValidation)
+class _FunctionLayerVersionsValidation:
+    """
+    Warns when the layers built by PipLayers that are attached to a function ship different
+    versions of a distribution; their files end up mixed in /opt/python.
+    """
+
+    def __init__(self, function: "Function"):
+        self.function = function
+
+    def validate(self) -> List[str]:
+        built = built_layers(self.function)
+        versions: Dict[str, Dict[str, List[str]]] = {}
+        for layer in self.function.attached_layers:
+            for name, version in built.get(layer.node.path, {}).get("versions", {}).items():
+                versions.setdefault(name, {}).setdefault(version, []).append(layer.node.id)
+        for name, layers in sorted(versions.items()):
+            if len(layers) > 1:
+                message = (
+                    f"Function '{self.function.node.id}' has layers with different versions of {name}: "
+                    + ", ".join(f"{version} in {', '.join(ids)}" for version, ids in sorted(layers.items()))
+                    + ". Lambda extracts the layers into one directory, the later layers overwrite files."
+                )
+                logger.warning(message)
+                cdk.Annotations.of(self.function).add_warning(message)
+        return []
+
+
+@jsii.implements(IValidation)
+class _FunctionsManifest:
+    """
+    Writes the handler, code directory and local layer directories of the Functions of a
+    stack to <outdir>/<artifact id>.functions.json when the app is synthesized, so their
+    cold starts can be reproduced locally (python -m alabcdk.coldstart).
+    """
+
+    @classmethod
+    def of(cls, stack: cdk.Stack) -> "_FunctionsManifest":
+        manifest = getattr(stack, "_functions_manifest", None)
+        if manifest is None:
+            manifest = stack._functions_manifest = cls(stack)
+            stack.node.add_validation(manifest)
+        return manifest
+
+    def __init__(self, stack: cdk.Stack):
+        self.stack = stack
+        self.functions: List[Tuple["Function", Optional[str], str]] = []
+
+    def add(self, function: "Function", *, code_dir: Optional[str], handler: str) -> None:
+        self.functions.append((function, code_dir, handler))
+
+    def validate(self) -> List[str]:
+        outdir = getattr(self.stack.node.root, "outdir", None)
+        if not outdir:
+            return []
+        functions = {}
+        built = built_layers(self.stack)
+        for function, code_dir, handler in self.functions:
+            # As in alabcdk.perf_lint, the L1 attributes fail on lazily produced structs.
+            properties = self.stack.resolve(function.node.default_child._cfn_properties) or {}
+            variables = (properties.get("environment") or {}).get("variables") or {}
+            functions[function.node.path] = {
+                "handler": handler,
+                "code_dir": os.path.abspath(code_dir) if code_dir else None,
+                # None for layers not built in this app.
+                "layers": [built.get(layer.node.path, {}).get("dir") for layer in function.attached_layers],
+                "runtime": function.runtime.name,
+                "architecture": function.architecture.name,
+                "memory_size": properties.get("memorySize", 128),
+                "timeout": properties.get("timeout", 3),
+                # References to other resources are left out, and named in unresolved_environment.
+                "environment": {k: v for k, v in variables.items() if isinstance(v, str)},
+                "unresolved_environment": sorted(k for k, v in variables.items() if not isinstance(v, str)),
+            }
+        os.makedirs(outdir, exist_ok=True)
+        with open(os.path.join(outdir, self.stack.artifact_id + FUNCTIONS_FILE_SUFFIX), "w") as f:
+            json.dump({"stack": self.stack.node.path, "functions": functions}, f, indent=2)
+        return []
+
+
+def _runtime_layer(scope: Construct) -> aws_lambda.LayerVersion:
+    """
+    The layer of the stack of scope with alabcdk_warm_cache, created on first use.
+    """
+    stack = cdk.Stack.of(scope)
+    layer = stack.node.try_find_child("AlabcdkRuntime")
+    if layer is not None:
+        return layer
+    layer_dir = pathlib.Path(os.path.abspath(os.curdir)) / ".functions.out" / "runtime" / "python"
+    layer_dir.mkdir(parents=True, exist_ok=True)
+    source = pathlib.Path(runtime_warm_cache.__file__).read_text()
+    target = layer_dir / "alabcdk_warm_cache.py"
+    # Synths of other stages share the directory; unchanged files keep the fingerprint.
+    with file_lock(layer_dir.parent.with_name("runtime.lock")):
+        if not target.exists() or target.read_text() != source:
+            target.write_text(source)
+    layer = aws_lambda.LayerVersion(
+        stack,
+        "AlabcdkRuntime",
+        code=fingerprint_cache().code(str(layer_dir.parent)),
+        layer_version_name=gen_name(stack, "alabcdk-runtime"),
+        description="alabcdk runtime modules: alabcdk_warm_cache",
+    )
+    record_layer(layer, str(layer_dir))
+    return layer
+
+
+def _bundled_layers(
+    scope: Construct, id: str, layers: list, architecture: aws_lambda.Architecture
+) -> Tuple[List[str], List[aws_lambda.ILayerVersion]]:
+    """
+    Split layers into the directories of those built by PipLayers, to bundle, and the
+    layers to attach.
+    """
+    bundled, attached = [], []
+    built = built_layers(scope)
+    for layer in _flatten_layers(layers):
+        if layer.node.path not in built:
+            attached.append(layer)
+            continue
+        built_for = built[layer.node.path]["architecture"]
+        if built_for and built_for != architecture.name:
+            raise ValueError(
+                f"Function '{id}' runs on {architecture.name}, but layer '{layer.node.id}' "
+                f"is built for {built_for}."
+            )
+        bundled.append(built[layer.node.path]["dir"])
+    return bundled, attached
+
+
+def _default_code(
+    id: str,
+    *,
+    runtime: aws_lambda.Runtime,
+    architecture: aws_lambda.Architecture,
+    compile_bytecode: bool,
+    bytecode_mismatch: str,
+    fingerprint_assets: bool,
+    handler: str,
+    bundle_layers: Optional[List[str]] = None,
+    bundle_include: List[str] = (),
+) -> Tuple[aws_lambda.Code, str]:
+    """
+    Code asset from the directory named id. Sources are staged in
+    ./.functions.out/<id>/<fingerprint> when they need to be processed before packaging:
+    modules bundled from bundle_layers (when not None) and bytecode compiled.
+
+    :return: (code, directory the code is packaged from)
+    """
+    code_dir, exclude = id, [".env*"]
+    compile_bytecode = compile_bytecode and can_compile_for([runtime], on_mismatch=bytecode_mismatch)
+    if compile_bytecode or bundle_layers is not None:
+        staging = pathlib.Path(os.path.abspath(os.curdir)) / ".functions.out" / id
+        extra = {"python": sys.version_info[:2], "compile": compile_bytecode}
+        if bundle_layers is not None:
+            extra["bundle"] = {
+                "handler": handler,
+                "runtime": runtime.name,
+                "architecture": architecture.name,
+                "include": list(bundle_include),
+                "layers": [fingerprint_cache().fingerprint(layer_dir) for layer_dir in bundle_layers],
+            }
+        source = fingerprint_cache().fingerprint(id, exclude=[".env*", "__pycache__"], extra=extra)
+
+        def stage(directory: pathlib.Path) -> None:
+            shutil.copytree(id, directory, ignore=shutil.ignore_patterns(".env*", "__pycache__"))
+            if bundle_layers is not None:
+                with span("Function: bundle", function=id):
+                    report = bundle_modules(
+                        handler.rpartition(".")[0],
+                        code_dir=id,
+                        layer_dirs=bundle_layers,
+                        include=bundle_include,
+                        target_dir=directory,
+                        suffixes=extension_suffixes(runtime.name, architecture.name),
+                    )
+                write_report(staging.with_name(f"{id}.bundle.json"), {id: report})
+                logger.info(
+                    f"Function '{id}': bundled {len(report['modules'])} modules, "
+                    f"{report['size'] / 2**20:.1f} MB of {report['layer_size'] / 2**20:.1f} MB in its layers."
+                )
+                if report["missing"]:
+                    # Mostly optional imports guarded by try/except.
+                    logger.info(f"Function '{id}': imports not found in its code or layers: "
+                                f"{', '.join(report['missing'])}.")
+            if compile_bytecode:
+                compile_tree(directory)
+
+        # One directory per version of the sources, synths of other stages may stage another one.
+        code_dir, exclude = str(staged_dir(staging, source[:16], stage)), None
+
+    if fingerprint_assets:
+        return fingerprint_cache().code(code_dir, exclude=exclude), code_dir
+    return aws_lambda.Code.from_asset(code_dir, exclude=exclude), code_dir
+
+
 class PipLayers(Construct):
     def cleaned_requirements(self, filename) -> str:
         """
@@ -89,6 +600,7 @@ class PipLayers(Construct):
                     f.write(_ + "\n")
         return tempname
 
+    @timed_init
     def __init__(
         self,
         scope,
@@ -98,6 +610,24 @@ class PipLayers(Construct):
         compatible_runtimes=None,
         unpack_dir: str = None,
         force_exclude_packages: List[str] = None,
+        parallel: bool = False,
+        max_workers: int = None,
+        layer_cache: LayerCache = None,
+        wheelhouse: Wheelhouse = None,
+        slim: bool = False,
+        slim_rules: List[SlimRule] = None,
+        slim_keep: Dict[str, List[str]] = None,
+        compile_bytecode: bool = False,
+        bytecode_mismatch: str = "warn",
+        size_warn_mb: float = DEFAULT_SIZE_WARN_MB,
+        size_fail_mb: float = DEFAULT_SIZE_FAIL_MB,
+        plan: bool = False,
+        plan_max_layers: int = LAMBDA_MAX_LAYERS,
+        plan_combinations: List[List[str]] = None,
+        fingerprint_assets: bool = False,
+        architectures: List[aws_lambda.Architecture] = None,
+        shared: bool = False,
+        shared_namespace: str = DEFAULT_NAMESPACE,
         **kwargs,
     ):
         """
@@ -112,6 +642,11 @@ class PipLayers(Construct):
 
         The <dir> will end up under ./.layers.out/<id> (so .layers.out should be added to .gitognore).
 
+        Distributions that all compatible_runtimes already provide (see preinstalled_dists_*.txt
+        and preinstalled_*.txt) are removed from the layers, unless the requirements ask for a
+        version the runtimes are not known to have. Such conflicts are listed in
+        <construct>.version_conflicts[<layer_id>].
+
         The requirements-file must exist.
 
         Retrieve the layers via the dictionary <construct>.layers. Typical use would look something like
@@ -133,6 +668,11 @@ class PipLayers(Construct):
 
         in case your lambdas require vastly different layer configurations.
 
+        Layers that need to be (re)built are built one after another unless parallel=True,
+        in which case they are built concurrently by a pool of at most max_workers threads.
+        The output of each pip run is kept in <dir>/pip.log. The first failing layer aborts
+        all other builds, and the LayerVersions are always created in the order of layers.
+
         See also
         * https://docs.aws.amazon.com/cdk/api/latest/python/aws_cdk.aws_lambda/LayerVersion.html
 
@@ -140,14 +680,109 @@ class PipLayers(Construct):
         * :param layers: Dictionary with {"<layer_id>": <path to requirements.txt>, ...}
 
         * :param compatible_runtimes: defaults to
-        [aws_lambda.Runtime.PYTHON_3_8,
-        aws_lambda.Runtime.PYTHON_3_9
+        [aws_lambda.Runtime.PYTHON_3_11,
+        aws_lambda.Runtime.PYTHON_3_12]
 
         * :param unpack_dir: defaults to "./.layers.out"
 
+        * :param parallel: build stale layers concurrently. Defaults to False.
+
+        * :param max_workers: upper bound on concurrent builds when parallel=True.
+        Defaults to the number of CPUs + 4.
+
+        * :param layer_cache: machine-wide LayerCache to fetch layers from and store
+        built layers in. Layers are keyed on everything that goes into a build: the
+        requirements, target platform, runtimes, force_exclude_packages and the
+        preinstalled package lists. Defaults to None (only ./.layers.out is used).
+
+        * :param wheelhouse: Wheelhouse to install from. Each requirement set is downloaded
+        to the wheelhouse once and pip installs with --no-index from there. An offline
+        Wheelhouse never downloads. Defaults to None (pip downloads on every build).
+
+        * :param slim: remove content that is never imported (__pycache__, stubs, tests
+        directories that are not packages) and strip native extensions after installing.
+        Bytes saved per rule end up in <construct>.slim_report[<layer_id>]. Defaults to False.
+
+        * :param slim_rules: rules used when slim=True. Defaults to
+        alabcdk.layer_slimming.DEFAULT_SLIM_RULES; DOCS_SLIM_RULE and SOURCES_SLIM_RULE
+        remove more, for packages known not to read their docs or sources at runtime.
+
+        * :param slim_keep: per layer id, fnmatch patterns of paths (relative to the
+        layer's python directory) the slimming must leave alone.
+
+        * :param compile_bytecode: ship precompiled __pycache__/*.pyc files in the layers,
+        so cold starts do not compile on import. Only possible when the python running
+        the synth matches one of compatible_runtimes. Defaults to False.
+
+        * :param bytecode_mismatch: "warn" (skip compiling) or "error" (raise ValueError)
+        when compile_bytecode is set but the interpreter matches none of the runtimes.
+
+        * :param size_warn_mb: warn when a layer is larger than this, unzipped. Defaults to 200.
+
+        * :param size_fail_mb: fail the synth when a layer is larger than this, unzipped.
+        Defaults to the Lambda limit of 250. Functions check the total of their code
+        and layers against the same kind of thresholds.
+
+        The size of each layer per distribution, unzipped and (estimated) zipped, is in
+        <construct>.size_reports[<layer_id>] and written to <unpack_dir>/<id>.sizes.json.
+
+        * :param plan: resolve all requirement files together and ship every distribution
+        only once. Distributions used by the same set of layer ids are installed together
+        (with --no-deps) in one layer; e.g. numpy used by both "data" and "ml" ends up in
+        a layer "shared_data_ml". idlayers[<layer_id>] then is a LayerGroup, a list of the
+        layers making up <layer_id>, which Function accepts in its layers and add_layers.
+        layers holds all built layers. The plan is in <construct>.plan and written to
+        <unpack_dir>/_plan/<id>.json. When the architectures resolve to different
+        distributions, the layers are built without a plan and plan is None. Defaults to False.
+
+        * :param plan_max_layers: maximum number of layers per layer id and per
+        plan_combinations entry. Layers are merged (shipping some distributions to
+        functions that do not need them) until this holds. Defaults to the Lambda limit of 5.
+
+        * :param plan_combinations: layer ids attached together to one function,
+        e.g. [["utils", "data"]], so their combined layers are kept within plan_max_layers.
+        Layer ids of a combination that resolve a distribution to different versions raise
+        ValueError. Sizes and conflicting versions are checked per function when synthesizing,
+        see Function.
+
+        * :param fingerprint_assets: package each layer as a deterministic zip in ./.alabcdk.out
+        and give CDK its content hash, which is only recomputed when the layer's files change
+        (see alabcdk.fingerprints). Otherwise CDK hashes every layer on every synth.
+        This changes the asset hashes once. Defaults to False.
+
+        * :param architectures: architectures to build each layer for, e.g.
+        [aws_lambda.Architecture.ARM_64] for Graviton (manylinux2014_aarch64 wheels).
+        Defaults to compatible_architectures if passed, otherwise [X86_64]. Every layer is
+        built and cached per architecture; builds for other than x86_64 go to
+        <unpack_dir>/<layer_id>_<architecture>. layers and idlayers hold the layers for the
+        first architecture, layers_for(architecture) and idlayers_for(architecture) those
+        for any of them.
+
+        * :param shared: publish each distinct layer only once per account and region.
+        The ARN of a published layer is kept in the SSM parameter
+        /<shared_namespace>/layers/<hash of content, runtimes and architecture>, which is
+        looked up with StringParameter.value_from_lookup (cached in cdk.context.json).
+        Other stacks find it there and import the layer by ARN instead of uploading it; the
+        stack that published it keeps it. Within one app, the first stack publishes the layer
+        and later stacks depend on it and read the ARN from the parameter when deploying, so
+        their templates do not change once the layer is found. The parameter is written only
+        if it does not exist, so stacks deploying at the same time do not conflict. Published
+        layers and their parameters are retained when the stack is deleted. Stacks without a
+        concrete account and region always publish. Defaults to False.
+
+        * :param shared_namespace: first part of the SSM parameter names. Defaults to "alabcdk".
+
         * :raises FileExistsError: Raised if a requirements-file does not exist.
+        * :raises ValueError: if an architecture is not supported, or if plan=True and the
+        layers cannot be split within plan_max_layers.
         """
         super().__init__(scope, id)
+        compatible_architectures = kwargs.pop("compatible_architectures", None)
+        self.architectures = architectures or compatible_architectures or [aws_lambda.Architecture.X86_64]
+        for architecture in self.architectures:
+            if architecture.name not in _PIP_PLATFORMS:
+                raise ValueError(f"Architecture '{architecture.name}' is not supported.")
+
         if not compatible_runtimes:
             compatible_runtimes = [
                 aws_lambda.Runtime.PYTHON_3_11,
@@ -165,74 +800,525 @@ class PipLayers(Construct):
 
         self.force_exclude_packages = force_exclude_packages or []
 
-        preexisting_packages = None
+        self.layer_cache = layer_cache
+        self.wheelhouse = wheelhouse
+        self.slim_rules = (DEFAULT_SLIM_RULES if slim_rules is None else slim_rules) if slim else []
+        self.slim_keep = slim_keep or {}
+        self.slim_report = {}
+        self.compile_bytecode = compile_bytecode and can_compile_for(
+            compatible_runtimes, on_mismatch=bytecode_mismatch
+        )
+        preexisting_packages = self.get_preinstalled_packages(compatible_runtimes)
+        self.preinstalled_distributions = self.get_preinstalled_distributions(compatible_runtimes)
+        self.version_conflicts = {}
+        self.pip_args = []
+        self._abort = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
 
-        self.layers = []
-        self.idlayers = {}
         for layer_id, requirements_file in layers.items():
-            logger.info(f"Creating layer '{layer_id}'.")
             if not os.path.exists(requirements_file):
                 raise FileExistsError(
                     f"Layer {layer_id}: '{requirements_file}' does not exist."
                 )
+            record_input(scope, requirements_file)
 
-            layer_unpack_dir = unpack_dir / layer_id
-            unpack_to_dir = layer_unpack_dir / "python"
-            with open(requirements_file) as f:
-                req_md5 = hashlib.md5(f.read().encode()).hexdigest()
-            prev_md5 = None
-            if layer_unpack_dir.exists() and (layer_unpack_dir / "md5sum").exists():
-                with open(layer_unpack_dir / "md5sum") as f:
-                    prev_md5 = f.read()
-
-            if req_md5 != prev_md5:
-                preexisting_packages = (
-                    preexisting_packages
-                    or self.get_preinstalled_packages(compatible_runtimes)
-                )
+        # Synths running in other processes (see alabcdk.synth_driver) share unpack_dir.
+        with file_lock(unpack_dir / ".lock"):
+            self.plan = None
+            if plan:
+                with span("PipLayers: plan", id=id):
+                    self.plan = self.make_plan(
+                        id,
+                        layers,
+                        plan_dir=unpack_dir / _PLAN_DIR,
+                        max_layers=plan_max_layers,
+                        combinations=plan_combinations,
+                    )
+            if self.plan:
+                layers = self.plan.write_requirements(unpack_dir / _PLAN_DIR / id)
+                # Every chunk lists all distributions it needs, its dependencies live in other chunks.
+                self.pip_args = ["--no-deps"]
 
-                tempname = self.cleaned_requirements(requirements_file)
+            # build id (layer id, with the architecture unless x86_64) -> (layer id, architecture)
+            builds = {}
+            stale_layers = {}
+            for layer_id, requirements_file in layers.items():
+                for architecture in self.architectures:
+                    build_id = _build_id(layer_id, architecture)
+                    builds[build_id] = (layer_id, architecture)
+                    logger.info(f"Creating layer '{build_id}'.")
+                    layer_unpack_dir = unpack_dir / build_id
+                    platform = _PIP_PLATFORMS[architecture.name]
+                    key = self.build_key(
+                        requirements_file,
+                        layer_id=layer_id,
+                        compatible_runtimes=compatible_runtimes,
+                        preexisting_packages=preexisting_packages,
+                        platform=platform,
+                    )
+                    prev_key = None
+                    if (layer_unpack_dir / _BUILD_KEY_FILE).exists():
+                        with open(layer_unpack_dir / _BUILD_KEY_FILE) as f:
+                            prev_key = f.read()
 
-                logger.info(f"Installing {layer_id} to {unpack_to_dir}")
-                layer_unpack_dir.mkdir(parents=True, exist_ok=True)
-                # Extracting to a subdirectory 'python' as per
-                # https://docs.aws.amazon.com/lambda/latest/dg/configuration-layers.html
-                pipcommand = f"pip install -r {tempname} -t {unpack_to_dir} --platform manylinux2014_x86_64 --only-binary=:all: --quiet"  # noqa e501
-                logger.debug(pipcommand)
-                logger.debug(open(tempname).readlines())
+                    if key == prev_key:
+                        logger.info(f"Using cached layer image for {build_id}.")
+                    elif layer_cache and self._fetch_cached(layer_cache, key, layer_unpack_dir, build_id):
+                        logger.info(f"Using shared layer cache entry {key[:12]} for {build_id}.")
+                        (layer_unpack_dir / _SIZE_FILE).unlink(missing_ok=True)
+                        with open(layer_unpack_dir / _BUILD_KEY_FILE, "w") as f:
+                            f.write(key)
+                    else:
+                        stale_layers[build_id] = (requirements_file, layer_unpack_dir, key, platform)
+            self._layer_ids = {build_id: layer_id for build_id, (layer_id, _) in builds.items()}
 
-                try:
-                    subprocess.check_output(pipcommand.split())
-                except subprocess.CalledProcessError as e:
-                    logger.error("oops", e)
-                    raise
-
-                self.remove_preinstalled_packages(
-                    preexisting_packages=preexisting_packages, root_dir=unpack_to_dir
+            if stale_layers:
+                self.build_layers(
+                    stale_layers,
+                    preexisting_packages=preexisting_packages,
+                    parallel=parallel,
+                    max_workers=max_workers,
                 )
 
-                with open(layer_unpack_dir / "md5sum", "w") as f:
-                    f.write(req_md5)
-
-                if tempname != requirements_file and os.path.exists(tempname):
-                    os.remove(tempname)
-            else:
-                logger.info(f"Using cached layer image for {layer_id}.")
-            code = aws_lambda.Code.from_asset(str(layer_unpack_dir))
-            logger.debug(f"Asset path: {code.path}")
+            self.size_reports = {
+                build_id: self.layer_size_report(unpack_dir / build_id) for build_id in builds
+            }
+            write_report(unpack_dir / f"{id}.sizes.json", self.size_reports)
 
-            version_id = f"{id}_{layer_id}"
-            layer = aws_lambda.LayerVersion(
+        # architecture name -> {layer id: layer}
+        built = {architecture.name: {} for architecture in self.architectures}
+        for build_id, (layer_id, architecture) in builds.items():
+            layer = self.create_layer(
                 scope,
-                version_id,
-                code=code,
+                f"{id}_{build_id}",
+                unpack_dir / build_id,
+                architecture=architecture,
                 compatible_runtimes=compatible_runtimes,
-                layer_version_name=gen_name(scope, version_id),
+                fingerprint_assets=fingerprint_assets,
+                shared=shared,
+                shared_namespace=shared_namespace,
                 **kwargs,
             )
 
-            self.idlayers[layer_id] = layer
-            self.layers.append(layer)
+            built[architecture.name][layer_id] = layer
+            report = self.size_reports[build_id]
+            record_layer(
+                layer,
+                str((unpack_dir / build_id / "python").absolute()),
+                size=report["size"],
+                architecture=architecture.name,
+                versions={
+                    name: entry["version"] for name, entry in report["distributions"].items() if entry["version"]
+                },
+            )
+            level, message = check_budget(
+                f"Layer '{build_id}'", report["size"], warn_mb=size_warn_mb, fail_mb=size_fail_mb
+            )
+            if level:
+                message += f" Largest: {top_distributions(report)}."
+                logger.warning(message)
+                if level == "error":
+                    cdk.Annotations.of(layer).add_error(message)
+                else:
+                    cdk.Annotations.of(layer).add_warning(message)
+
+        self._layers = {name: list(layers.values()) for name, layers in built.items()}
+        self._idlayers = built
+        if self.plan:
+            self.chunk_layers = built[self.architectures[0].name]
+            self._idlayers = {
+                name: {
+                    group_id: LayerGroup(layers[chunk_id] for chunk_id in chunk_ids)
+                    for group_id, chunk_ids in self.plan.groups.items()
+                }
+                for name, layers in built.items()
+            }
+        self.layers = self.layers_for(self.architectures[0])
+        self.idlayers = self.idlayers_for(self.architectures[0])
+
+    def create_layer(
+        self,
+        scope: Construct,
+        version_id: str,
+        layer_dir: pathlib.Path,
+        *,
+        architecture: aws_lambda.Architecture,
+        compatible_runtimes: list,
+        fingerprint_assets: bool,
+        shared: bool,
+        shared_namespace: str,
+        **kwargs,
+    ) -> aws_lambda.ILayerVersion:
+        """
+        LayerVersion for the layer built in layer_dir.
+
+        Shared layers published by another stack are imported by ARN, read from their SSM
+        parameter when that stack is in this app; otherwise the layer is published with
+        RemovalPolicy.RETAIN and its ARN is recorded in the parameter, unless it exists.
+        """
+        key = None
+        if shared:
+            key = shared_layer_key(
+                fingerprint_cache().fingerprint(str(layer_dir), exclude=_LAYER_BUILD_FILES),
+                compatible_runtimes=compatible_runtimes,
+                architecture=architecture,
+            )
+            name = parameter_name(key, namespace=shared_namespace)
+            stack = cdk.Stack.of(scope)
+            arn = lookup_shared_layer(scope, name)
+            published = None
+            if not (cdk.Token.is_unresolved(stack.account) or cdk.Token.is_unresolved(stack.region)):
+                published = published_layers(scope).get((name, stack.account, stack.region))
+            if published is not None:
+                if cdk.Stack.of(published) is stack:
+                    return published
+                # Another stack of the app publishes the layer. It is referenced through its parameter,
+                # a reference to the LayerVersion would become a cross-stack export, which blocks
+                # the publishing stack from dropping it once the lookup finds the layer.
+                logger.info(f"Using shared layer {published.node.path} for {version_id}, through {name}.")
+                stack.add_dependency(cdk.Stack.of(published), f"publishes the shared layer {name}")
+                return aws_lambda.LayerVersion.from_layer_version_arn(
+                    scope, version_id, aws_ssm.StringParameter.value_for_string_parameter(scope, name)
+                )
+            # The stack that published the layer keeps it, and its registration, in its template.
+            if arn and layer_name_of(arn) != gen_name(scope, version_id):
+                logger.info(f"Using shared layer {arn} for {version_id}.")
+                return aws_lambda.LayerVersion.from_layer_version_arn(scope, version_id, arn)
+
+        if fingerprint_assets:
+            code = fingerprint_cache().code(str(layer_dir), exclude=_LAYER_BUILD_FILES)
+        else:
+            code = aws_lambda.Code.from_asset(
+                str(layer_dir), exclude=_LAYER_BUILD_FILES, ignore_mode=cdk.IgnoreMode.GIT
+            )
+        logger.debug(f"Asset path: {code.path}")
+
+        if shared:
+            kwargs.setdefault("removal_policy", cdk.RemovalPolicy.RETAIN)
+        layer = aws_lambda.LayerVersion(
+            scope,
+            version_id,
+            code=code,
+            compatible_runtimes=compatible_runtimes,
+            compatible_architectures=[architecture],
+            layer_version_name=gen_name(scope, version_id),
+            **kwargs,
+        )
+        if shared:
+            logger.info(f"Publishing shared layer {version_id} as {name}.")
+            register_shared_layer(scope, f"{version_id}Register", name=name, layer=layer)
+            published_layers(scope)[(name, stack.account, stack.region)] = layer
+        return layer
+
+    def layers_for(self, architecture: aws_lambda.Architecture) -> List[aws_lambda.LayerVersion]:
+        """
+        All layers built for architecture, see layers.
+        """
+        return list(self._layers[architecture.name])
+
+    def idlayers_for(self, architecture: aws_lambda.Architecture) -> dict:
+        """
+        Layers built for architecture keyed on layer id, see idlayers.
+        """
+        return dict(self._idlayers[architecture.name])
+
+    def make_plan(
+        self,
+        id: str,
+        layers: dict,
+        *,
+        plan_dir: pathlib.Path,
+        max_layers: int,
+        combinations: List[List[str]] = None,
+    ):
+        """
+        Resolve the requirements of all layers and split them into shared and private chunks,
+        see alabcdk.layer_planner.plan_layers. Resolutions are kept in <plan_dir>/resolved,
+        keyed on the requirements, so unchanged requirements are not resolved again.
+
+        :return: the LayerPlan, also written to <plan_dir>/<id>.json. None if the
+            architectures resolve differently, the layers are then built unplanned.
+        """
+        log = _LayerLogAdapter(logger, {"layer": id})
+        plan_dir.mkdir(parents=True, exist_ok=True)
+        requirements = {}
+        for layer_id, requirements_file in layers.items():
+            with open(requirements_file) as f:
+                requirements[layer_id] = f.read()
+            if any(line.startswith("-e ") for line in requirements[layer_id].splitlines()):
+                raise ValueError(f"Layer {layer_id}: -e requirements cannot be planned, use plan=False.")
+
+        # Chunks are installed with --no-deps for every architecture, which is only right
+        # when all architectures resolve to the same distributions (platform_machine markers
+        # and architecture specific wheels can make them differ).
+        resolutions = {}
+        for architecture in self.architectures:
+            platform = _PIP_PLATFORMS[architecture.name]
+            resolved = {}
+            for layer_id, requirements_file in layers.items():
+                pip_args = []
+                if self.wheelhouse:
+                    self.wheelhouse.ensure(
+                        requirements_file,
+                        platform=platform,
+                        run=lambda cmd: self._run(cmd, log=log, logfile=plan_dir / "pip-download.log"),
+                    )
+                    pip_args = self.wheelhouse.install_args()
+
+                key = build_key(requirements=requirements[layer_id], platform=platform)
+                cached = plan_dir / "resolved" / f"{key}.json"
+                if cached.exists():
+                    with open(cached) as f:
+                        resolution = json.load(f)
+                else:
+                    log.info(f"Resolving '{layer_id}' for {architecture.name}.")
+                    resolution = resolve(
+                        requirements_file,
+                        platform=platform,
+                        pip_args=pip_args,
+                        run=lambda cmd: self._run(cmd, log=log, logfile=plan_dir / "pip-resolve.log"),
+                    )
+                    cached.parent.mkdir(exist_ok=True)
+                    write_report(cached, resolution)
+
+                resolved[layer_id] = drop_preinstalled(
+                    resolution,
+                    preinstalled_distributions=self.preinstalled_distributions,
+                    pinned=pinned_requirements(requirements_file),
+                )
+            resolutions[architecture.name] = resolved
+
+        resolved = resolutions[self.architectures[0].name]
+        differing = {
+            layer_id
+            for other in list(resolutions.values())[1:]
+            for layer_id in layers
+            if other[layer_id] != resolved[layer_id]
+        }
+        if differing:
+            log.warning(
+                f"Layers {', '.join(sorted(differing))} resolve to different distributions per "
+                f"architecture ({', '.join(resolutions)}), building them without a plan."
+            )
+            return None
+
+        result = plan_layers(resolved, max_layers=max_layers, combinations=combinations)
+        for chunk_id, pins in result.chunks.items():
+            log.info(f"Layer '{chunk_id}': {len(pins)} distributions.")
+        write_report(plan_dir / f"{id}.json", result.to_dict())
+        return result
+
+    def _fetch_cached(self, layer_cache: LayerCache, key: str, layer_unpack_dir: pathlib.Path, build_id: str) -> bool:
+        with span("PipLayers: layer cache fetch", layer=build_id):
+            return layer_cache.fetch(key, layer_unpack_dir / "python")
+
+    def layer_size_report(self, layer_unpack_dir: pathlib.Path) -> dict:
+        """
+        Size report of a layer (see alabcdk.layer_size.analyze_layer), cached next to it.
+        """
+        size_file = layer_unpack_dir / _SIZE_FILE
+        if size_file.exists():
+            with open(size_file) as f:
+                return json.load(f)
+        with span("PipLayers: size walk", layer=layer_unpack_dir.name):
+            report = analyze_layer(layer_unpack_dir / "python")
+        write_report(size_file, report)
+        return report
+
+    def build_layers(
+        self,
+        stale_layers: dict,
+        *,
+        preexisting_packages: dict,
+        parallel: bool = False,
+        max_workers: int = None,
+    ):
+        """
+        Build all layers in stale_layers, either sequentially or in a bounded thread pool.
+
+        :param stale_layers: dict keyed by build id with
+            (requirements_file, layer_unpack_dir, key, platform) tuples.
+        :param preexisting_packages: see remove_preinstalled_packages.
+        :param parallel: build the layers concurrently.
+        :param max_workers: maximum number of concurrent builds.
+        :raises subprocess.CalledProcessError: if pip fails for any layer.
+        """
+        if not parallel or len(stale_layers) == 1:
+            for layer_id, job in stale_layers.items():
+                self.build_layer(layer_id, *job, preexisting_packages=preexisting_packages)
+            return
+
+        # pip is mostly waiting on the network, so allow more workers than CPUs.
+        max_workers = min(max_workers or (os.cpu_count() or 1) + 4, len(stale_layers))
+        logger.info(f"Building {len(stale_layers)} layers using {max_workers} workers.")
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="piplayer"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.build_layer,
+                    layer_id,
+                    *job,
+                    preexisting_packages=preexisting_packages,
+                ): layer_id
+                for layer_id, job in stale_layers.items()
+            }
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_EXCEPTION
+            )
+            failed = [f for f in done if f.exception() is not None]
+            if failed:
+                self._abort.set()
+                for future in futures:
+                    future.cancel()
+                with self._running_lock:
+                    for proc in self._running:
+                        proc.terminate()
+                layer_id = futures[failed[0]]
+                logger.error(f"Building layer '{layer_id}' failed, aborted remaining builds.")
+                raise failed[0].exception()
+
+    def build_layer(
+        self,
+        layer_id: str,
+        requirements_file: str,
+        layer_unpack_dir: pathlib.Path,
+        key: str,
+        platform: str = _PIP_PLATFORMS["x86_64"],
+        *,
+        preexisting_packages: dict,
+    ):
+        """
+        Install the requirements of a single layer into <layer_unpack_dir>/python
+        and remove packages that are already present in the runtimes.
+
+        The build key file is only written when the layer was built successfully.
+        """
+        log = _LayerLogAdapter(logger, {"layer": layer_id})
+        # Extracting to a subdirectory 'python' as per
+        # https://docs.aws.amazon.com/lambda/latest/dg/configuration-layers.html
+        unpack_to_dir = layer_unpack_dir / "python"
+        tempname = self.cleaned_requirements(requirements_file)
+
+        log.info(f"Installing {layer_id} to {unpack_to_dir}")
+        layer_unpack_dir.mkdir(parents=True, exist_ok=True)
+        (layer_unpack_dir / _BUILD_KEY_FILE).unlink(missing_ok=True)
+        # pip refuses to replace packages already present in the target directory.
+        shutil.rmtree(unpack_to_dir, ignore_errors=True)
+        pipcommand = f"pip install -r {tempname} -t {unpack_to_dir} --platform {platform} --only-binary=:all: --quiet"  # noqa e501
+        pipcommand = pipcommand.split()
+        with open(tempname) as f:
+            log.debug(f.readlines())
+
+        pinned = pinned_requirements(tempname)
+        try:
+            if self.wheelhouse:
+                with span("PipLayers: pip download", "subprocess", layer=layer_id):
+                    self.wheelhouse.ensure(
+                        tempname,
+                        platform=platform,
+                        run=lambda cmd: self._run(
+                            cmd, log=log, logfile=layer_unpack_dir / "pip-download.log"
+                        ),
+                    )
+                pipcommand += self.wheelhouse.install_args()
+            pipcommand += self.pip_args
+            log.debug(" ".join(pipcommand))
+            with span("PipLayers: pip install", "subprocess", layer=layer_id):
+                self._run(pipcommand, log=log, logfile=layer_unpack_dir / "pip.log")
+        finally:
+            if tempname != requirements_file and os.path.exists(tempname):
+                os.remove(tempname)
+
+        with span("PipLayers: prune", layer=layer_id):
+            self.version_conflicts[layer_id] = self.remove_preinstalled_packages(
+                preexisting_packages=preexisting_packages,
+                root_dir=unpack_to_dir,
+                log=log,
+                preinstalled_distributions=self.preinstalled_distributions,
+                pinned=pinned,
+            )
+
+        if self.slim_rules:
+            with span("PipLayers: slim", layer=layer_id):
+                self.slim_report[layer_id] = slim_layer(
+                    unpack_to_dir,
+                    rules=self.slim_rules,
+                    keep=self.slim_keep.get(self._layer_ids.get(layer_id, layer_id)),
+                    log=log,
+                )
+
+        if self.compile_bytecode:
+            log.info("Compiling bytecode.")
+            with span("PipLayers: compile bytecode", layer=layer_id):
+                compile_tree(unpack_to_dir, log=log)
+
+        (layer_unpack_dir / _SIZE_FILE).unlink(missing_ok=True)
+        report = self.layer_size_report(layer_unpack_dir)
+        log.info(
+            f"Final layer size {report['size']//(1024*1024)}MB "
+            f"({report['compressed']//(1024*1024)}MB zipped). Largest: {top_distributions(report)}."
+        )
+
+        if self.layer_cache:
+            with span("PipLayers: layer cache store", layer=layer_id):
+                self.layer_cache.store(key, unpack_to_dir)
+
+        with open(layer_unpack_dir / _BUILD_KEY_FILE, "w") as f:
+            f.write(key)
+
+    def build_key(
+        self,
+        requirements_file: str,
+        *,
+        layer_id: str,
+        compatible_runtimes: list,
+        preexisting_packages: dict,
+        platform: str = _PIP_PLATFORMS["x86_64"],
+    ) -> str:
+        """
+        Key identifying the result of building a layer from requirements_file.
+        Any change to an input of the build yields a different key.
+        """
+        with open(requirements_file) as f:
+            requirements = f.read()
+        return build_key(
+            recipe=_BUILD_RECIPE_VERSION,
+            requirements=requirements,
+            platform=platform,
+            runtimes=sorted(runtime.name for runtime in compatible_runtimes),
+            force_exclude_packages=sorted(self.force_exclude_packages),
+            preexisting_packages={k: sorted(v) for k, v in preexisting_packages.items()},
+            preinstalled_distributions=self.preinstalled_distributions,
+            slim_rules=[repr(rule) for rule in self.slim_rules],
+            slim_keep=self.slim_keep.get(layer_id, []) if self.slim_rules else [],
+            bytecode=sys.version_info[:2] if self.compile_bytecode else None,
+            pip_args=self.pip_args,
+        )
+
+    def _run(self, cmd: List[str], *, log: logging.LoggerAdapter, logfile: pathlib.Path):
+        """
+        Run cmd, writing its combined output to logfile. Running commands are
+        terminated if another layer build fails.
+        """
+        if self._abort.is_set():
+            raise RuntimeError("Layer build aborted.")
+        with open(logfile, "w") as out:
+            proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT)
+            with self._running_lock:
+                self._running.add(proc)
+            try:
+                returncode = proc.wait()
+            finally:
+                with self._running_lock:
+                    self._running.discard(proc)
+
+        if returncode != 0:
+            if not self._abort.is_set():
+                with open(logfile) as f:
+                    log.error(f"'{cmd[0]}' failed with exit code {returncode}:\n{f.read()}")
+            raise subprocess.CalledProcessError(returncode, cmd)
 
     def get_dir_size(self, root_dir: str) -> int:
         """
@@ -241,67 +1327,122 @@ class PipLayers(Construct):
         :param root_dir: Directory node to check size of
         :return: Content under root_dir in bytes.
         """
-        total_size = 0
-        for path, dirs, files in os.walk(root_dir):
-            for f in files:
-                fp = os.path.join(path, f)
-                total_size += os.path.getsize(fp)
-        return total_size
+        return dir_size(root_dir)
 
     def remove_preinstalled_packages(
-        self, *, preexisting_packages: dict, root_dir: str
-    ):
+        self,
+        *,
+        preexisting_packages: dict,
+        root_dir: str,
+        log: logging.LoggerAdapter = None,
+        preinstalled_distributions: dict = None,
+        pinned: dict = None,
+    ) -> List[str]:
         """
-        Remove directories containing pre-existing packages.
+        Remove distributions that are already present in all runtimes the layer is for.
+
+        A distribution is pre-installed in a runtime if it is listed in the runtime's
+        distribution manifest, or if all of its top level modules are in the runtime's
+        module list (this catches import names that differ from the distribution name).
+        Only the files listed in the distribution's RECORD are removed.
+
+        A distribution with a version specifier in the requirements (==, >=, ~=, ...) is
+        kept unless the version of every runtime is known and satisfies it. Such conflicts
+        are logged and returned.
+
+        Top level entries that belong to no distribution are removed if their name is
+        pre-installed, as before.
 
         :param preexisting_packages: dict of pre-existing packages keyed by
             runtime name and vaklue is a list of packages.
         :param root_dir: Where to delete directories from.
+        :param log: Logger to report to. Defaults to the module logger.
+        :param preinstalled_distributions: dict keyed by runtime name with
+            {distribution: version or None} dicts, see get_preinstalled_distributions.
+        :param pinned: {distribution: version specifier} from the requirements, see pinned_requirements.
+        :return: Descriptions of version conflicts.
         """
-        orgsize = self.get_dir_size(root_dir)
-        dirs = os.listdir(root_dir)
-        for d in dirs:
-            # Delete the package directory of it is pre-installed in
-            # all runtimes we make the layer for.
-            count = 0
-            for runtime, packages in preexisting_packages.items():
-                if d in packages:
-                    # logger.debug(f">> {d} found in {runtime}")
-                    count += 1
-                # else:
-                #     logger.debug(f"-- {d} NOT found in {runtime}")
-
-            if count == len(preexisting_packages) or d in self.force_exclude_packages:
-                fullname = os.path.join(root_dir, d)
-                try:
+        log = log or logger
+        preinstalled_distributions = preinstalled_distributions or {}
+        pinned = pinned or {}
+        runtimes = sorted(set(preexisting_packages) | set(preinstalled_distributions))
+        runtime_modules = {r: set(preexisting_packages.get(r, [])) for r in runtimes}
+        runtime_dists = {r: preinstalled_distributions.get(r, {}) for r in runtimes}
+        force_excluded = set(self.force_exclude_packages) | {
+            normalize_name(_) for _ in self.force_exclude_packages
+        }
+
+        removed = 0
+        conflicts = []
+        owned = set()
+        redundant = {}
+        kept = []
+        distributions = installed_distributions(root_dir)
+        for dist in distributions:
+            owned.add(dist.dist_info.name)
+            owned.update(f.relative_to(dist.root_dir).parts[0] for f in dist.files)
+
+            if dist.name in force_excluded or dist.top_level & force_excluded:
+                redundant[dist.name] = (dist, "excluded by request")
+            elif runtimes and all(
+                dist.name in runtime_dists[r]
+                or (dist.top_level and dist.top_level <= runtime_modules[r])
+                for r in runtimes
+            ):
+                runtime_versions = {r: runtime_dists[r].get(dist.name) for r in runtimes}
+                if dist.name in pinned and not all(
+                    satisfies(v, pinned[dist.name]) for v in runtime_versions.values()
+                ):
+                    conflict = (
+                        f"{dist.name}{pinned[dist.name]} is required, but the runtimes have "
+                        + ", ".join(f"{r}: {v or 'unknown version'}" for r, v in runtime_versions.items())
+                        + ". Keeping it in the layer."
+                    )
+                    log.warning(conflict)
+                    conflicts.append(conflict)
+                    kept.append(dist)
+                    continue
+                redundant[dist.name] = (dist, "pre-installed")
+                for r, v in runtime_versions.items():
+                    if v and v != dist.version:
+                        log.info(f"{dist.name}: layer had {dist.version}, {r} provides {v}.")
+            else:
+                log.debug(f"Keeping {dist.name} {dist.version}.")
+
+        # The runtime versions of the dependencies of a pinned distribution
+        # may not match it, so those stay in the layer as well.
+        while kept:
+            dist = kept.pop()
+            for name in dist.requires:
+                if name in redundant and redundant[name][1] == "pre-installed":
+                    log.info(f"Keeping {name}, required by {dist.name} which stays in the layer.")
+                    kept.append(redundant.pop(name)[0])
+
+        for dist, reason in redundant.values():
+            removed += dist.remove()
+            log.info(f"Removing redundant package {dist.name} {dist.version} ({reason}).")
+
+        modules = set.intersection(*runtime_modules.values()) if runtimes else set()
+        for d in sorted(set(os.listdir(root_dir)) - owned):
+            name = d[:-3] if d.endswith(".py") else d
+            if name not in modules and d not in force_excluded:
+                continue
+            fullname = os.path.join(root_dir, d)
+            size = self.get_dir_size(fullname) if os.path.isdir(fullname) else os.path.getsize(fullname)
+            try:
+                if os.path.isdir(fullname):
                     shutil.rmtree(fullname)
-                except FileNotFoundError:
-                    logger.warning(f"Could not delete {fullname}.")
-                except NotADirectoryError:
-                    logger.warning(f"Could not delete {fullname}.")
-                # While we're at it, delete the dist-directory
-                auxdirs = glob.glob(f"{fullname}-*")
-                for auxdir in auxdirs:
-                    logger.debug(f"Deleting {auxdir}")
-                    try:
-                        shutil.rmtree(auxdir)
-                    except FileNotFoundError:
-                        logger.warning(f"Could not delete {auxdir}.")
-                if d in self.force_exclude_packages:
-                    reason = "excluded by request"
                 else:
-                    reason = "pre-installed"
-                logger.info(f"Removing redundant package {d} ({reason}).")
-            else:
-                logger.debug(
-                    f"Keeping {d}: preinstalled in {count}/{len(preexisting_packages)} runtimes."
-                )
-        newsize = self.get_dir_size(root_dir)
-        sizediff = orgsize - newsize
-        logger.info(
-            f"Layer size reduced by {sizediff//(1024*1024)}MB ({100*sizediff/orgsize:.0f}%)."
-        )
-        logger.info(f"Final layer size {(orgsize - sizediff)//(1024*1024)}MB")
+                    os.remove(fullname)
+            except OSError:
+                log.warning(f"Could not delete {fullname}.")
+                continue
+            removed += size
+            reason = "excluded by request" if d in force_excluded else "pre-installed"
+            log.info(f"Removing redundant package {d} ({reason}).")
+
+        log.info(f"Layer size reduced by {removed//(1024*1024)}MB.")
+        return conflicts
 
     def get_preinstalled_packages(self, runtimes: list) -> dict:
         # No need to add thinga already present,
@@ -326,3 +1467,19 @@ class PipLayers(Construct):
                 logger.warning(f"Could not find file '{preinstalled}'.")
 
         return res
+
+    def get_preinstalled_distributions(self, runtimes: list) -> dict:
+        """
+        Distributions installed in each runtime, read from preinstalled_dists_<runtime>.txt.
+
+        :return: dict keyed by runtime name with {distribution: version or None} dicts.
+        """
+        res = {}
+        curdir = os.path.dirname(__file__)
+        for runtime in runtimes:
+            manifest = os.path.join(curdir, f"preinstalled_dists_{runtime.name}.txt")
+            if os.path.exists(manifest):
+                res[runtime.name] = read_manifest(manifest)
+            else:
+                logger.warning(f"Could not find file '{manifest}'.")
+        return res
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import threading
+import time
+import uuid
+
+from .file_lock import file_lock
+
+logger = logging.getLogger("alabcdk")
+
+_DEFAULT_MAX_SIZE_MB = 5 * 1024
+_COMPLETE_MARKER = "complete"
+_SIZE_FILE = "size"
+_CONTENT_DIR = "content"
+
+
+def default_cache_dir() -> pathlib.Path:
+    """
+    Root of the machine-wide alabcdk cache.
+
+    Uses $ALABCDK_CACHE_DIR if set, otherwise $XDG_CACHE_HOME/alabcdk or ~/.cache/alabcdk.
+    """
+    if os.environ.get("ALABCDK_CACHE_DIR"):
+        return pathlib.Path(os.environ["ALABCDK_CACHE_DIR"])
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    base = pathlib.Path(xdg) if xdg else pathlib.Path.home() / ".cache"
+    return base / "alabcdk"
+
+
+def build_key(**inputs) -> str:
+    """
+    Content address of a build: sha256 over a canonical json dump of all inputs.
+    """
+    blob = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def link_or_copy(src: str, dst: str) -> str:
+    """
+    Hardlink src to dst, falling back to a copy (e.g. across file systems).
+    Usable as copy_function for shutil.copytree.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+class LayerCache:
+    """
+    Machine-wide, content-addressed cache of built layer directories.
+
+    Entries are keyed on the full build input (see build_key) and shared between
+    checkouts, CI workspaces and projects. Files are hardlinked into place when
+    possible, so consumers must replace files rather than modify them in place.
+
+    When the total size exceeds max_size_mb the least recently used entries are evicted.
+
+    Layout:
+        <root>/layers/<key[:2]>/<key>/content/...   the cached directory
+        <root>/layers/<key[:2]>/<key>/size          size of content in bytes
+        <root>/layers/<key[:2]>/<key>/complete      marker, mtime is last use
+    """
+
+    def __init__(self, root: str = None, *, max_size_mb: int = None):
+        """
+        :param root: cache directory. Defaults to default_cache_dir().
+        :param max_size_mb: disk budget for the cache. Defaults to $ALABCDK_CACHE_MAX_MB or 5 GB.
+        """
+        self.root = (pathlib.Path(root) if root else default_cache_dir()) / "layers"
+        if max_size_mb is None:
+            max_size_mb = int(os.environ.get("ALABCDK_CACHE_MAX_MB", _DEFAULT_MAX_SIZE_MB))
+        self.max_size = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+
+    def entry_dir(self, key: str) -> pathlib.Path:
+        return self.root / key[:2] / key
+
+    def contains(self, key: str) -> bool:
+        return (self.entry_dir(key) / _COMPLETE_MARKER).exists()
+
+    def fetch(self, key: str, dest: pathlib.Path) -> bool:
+        """
+        Materialize the entry for key at dest, replacing anything there. Holds the
+        cache lock while copying, so the entry cannot be evicted halfway.
+
+        :return: True on a cache hit, False otherwise.
+        """
+        entry = self.entry_dir(key)
+        if not self.contains(key):
+            return False
+        with file_lock(self.root / ".lock"):
+            shutil.rmtree(dest, ignore_errors=True)
+            try:
+                shutil.copytree(entry / _CONTENT_DIR, dest, copy_function=link_or_copy, symlinks=True)
+                # Touching the marker doubles as the check that the entry is still complete.
+                os.utime(entry / _COMPLETE_MARKER)
+            except (FileNotFoundError, shutil.Error):
+                logger.warning(f"Layer cache entry {key} disappeared while fetching it.")
+                shutil.rmtree(dest, ignore_errors=True)
+                return False
+        return True
+
+    def store(self, key: str, src: pathlib.Path) -> None:
+        """
+        Add the directory src to the cache under key and evict old entries if needed.
+        """
+        if self.contains(key):
+            os.utime(self.entry_dir(key) / _COMPLETE_MARKER)
+            return
+
+        staging = self.root / "tmp" / uuid.uuid4().hex
+        staging.mkdir(parents=True)
+        try:
+            shutil.copytree(src, staging / _CONTENT_DIR, copy_function=link_or_copy, symlinks=True)
+            size = _tree_size(staging / _CONTENT_DIR)
+            (staging / _SIZE_FILE).write_text(str(size))
+            (staging / _COMPLETE_MARKER).touch()
+
+            entry = self.entry_dir(key)
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.root / ".lock"):
+                if self.contains(key):
+                    logger.debug(f"Layer cache entry {key} already stored.")
+                else:
+                    # Left behind by an interrupted eviction, it would block the rename forever.
+                    shutil.rmtree(entry, ignore_errors=True)
+                    os.rename(staging, entry)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        logger.debug(f"Stored layer {key} ({size // (1024 * 1024)}MB) in {self.root}.")
+        self.evict()
+
+    def entries(self) -> list:
+        """
+        All complete entries as (last_used, size, key) tuples, oldest first.
+        """
+        result = []
+        for marker in self.root.glob(f"*/*/{_COMPLETE_MARKER}"):
+            entry = marker.parent
+            try:
+                last_used = marker.stat().st_mtime
+                size = int((entry / _SIZE_FILE).read_text())
+            except (OSError, ValueError):
+                continue
+            result.append((last_used, size, entry.name))
+        return sorted(result)
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_size.
+        The most recently used entry is always kept. Synths running in other processes
+        wait for each other (see alabcdk.file_lock).
+
+        :return: Number of bytes freed.
+        """
+        freed = 0
+        with self._lock, file_lock(self.root / ".lock"):
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for last_used, size, key in entries[:-1]:
+                if total <= self.max_size:
+                    break
+                logger.info(
+                    f"Evicting layer cache entry {key} ({size // (1024 * 1024)}MB, "
+                    f"last used {time.ctime(last_used)})."
+                )
+                entry = self.entry_dir(key)
+                # Hide the entry from readers before deleting it.
+                (entry / _COMPLETE_MARKER).unlink(missing_ok=True)
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                freed += size
+        return freed
+
+
+def _tree_size(root: pathlib.Path) -> int:
+    total = 0
+    for path, dirs, files in os.walk(root):
+        for f in files:
+            total += os.path.getsize(os.path.join(path, f))
+    return total
@@ -0,0 +1,249 @@
+import hashlib
+import itertools
+import json
+import logging
+import pathlib
+import re
+import tempfile
+from typing import Callable, Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+from .distributions import normalize_name, satisfies
+
+logger = logging.getLogger("alabcdk")
+
+# https://docs.aws.amazon.com/lambda/latest/dg/gettingstarted-limits.html
+LAMBDA_MAX_LAYERS = 5
+
+# A distribution at a specific version, the unit the planner moves around.
+Pin = Tuple[str, str]
+
+
+class LayerGroup(list):
+    """
+    The layers that together replace one entry of PipLayers(layers=...) in planner mode.
+
+    It is a list of LayerVersions; Function accepts it wherever a single layer is
+    accepted and removes layers that appear in several groups.
+    """
+
+
+class LayerPlan:
+    """
+    Result of planning: the layers ("chunks") to build and which chunks make up each
+    requested layer ("group").
+    """
+
+    def __init__(self, chunks: Dict[str, List[Pin]], groups: Dict[str, List[str]]):
+        self.chunks = chunks
+        self.groups = groups
+
+    def to_dict(self) -> dict:
+        return {
+            "chunks": {k: [f"{n}=={v}" for n, v in pins] for k, pins in self.chunks.items()},
+            "groups": self.groups,
+        }
+
+    def write_requirements(self, directory: pathlib.Path) -> Dict[str, pathlib.Path]:
+        """
+        Write a pinned requirements file per chunk.
+
+        :return: {chunk id: requirements file}
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        result = {}
+        for chunk_id, pins in self.chunks.items():
+            filename = directory / f"{chunk_id}.txt"
+            content = "".join(f"{name}=={version}\n" for name, version in pins)
+            if not filename.exists() or filename.read_text() != content:
+                filename.write_text(content)
+            result[chunk_id] = filename
+        return result
+
+
+def resolve(
+    requirements_file: str,
+    *,
+    platform: str,
+    pip_args: Sequence[str] = (),
+    run: Callable[[List[str]], None],
+) -> Dict[str, dict]:
+    """
+    Resolve the full set of distributions requirements_file installs, without installing.
+
+    :param requirements_file: pip requirements file.
+    :param platform: pip --platform to resolve for.
+    :param pip_args: extra pip arguments, e.g. to resolve from a wheelhouse.
+    :param run: callable executing a command line, raising on failure.
+    :return: {distribution: {"version": version, "requires": [distribution, ...]}}
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report = pathlib.Path(tmpdir) / "report.json"
+        run([
+            "pip", "install",
+            "--dry-run",
+            "--ignore-installed",
+            "--report", str(report),
+            "-r", str(requirements_file),
+            "--target", str(pathlib.Path(tmpdir) / "target"),
+            "--platform", platform,
+            "--only-binary=:all:",
+            "--quiet",
+            *pip_args,
+        ])
+        with open(report) as f:
+            installs = json.load(f)["install"]
+    result = {}
+    for item in installs:
+        metadata = item["metadata"]
+        requires = [
+            normalize_name(re.match(r"[A-Za-z0-9._-]+", r).group(0))
+            for r in metadata.get("requires_dist", [])
+            if "extra ==" not in r
+        ]
+        result[normalize_name(metadata["name"])] = {"version": metadata["version"], "requires": requires}
+    return result
+
+
+def drop_preinstalled(
+    resolved: Dict[str, dict],
+    *,
+    preinstalled_distributions: Dict[str, Dict[str, str]],
+    pinned: Dict[str, str],
+) -> Dict[str, str]:
+    """
+    Leave out distributions every runtime already has, following the rules of
+    PipLayers.remove_preinstalled_packages: a distribution whose version specifier the
+    runtimes are not known to satisfy is kept, and so is everything it requires.
+
+    :param resolved: result of resolve().
+    :param preinstalled_distributions: {runtime: {distribution: version or None}}
+    :param pinned: {distribution: version specifier} from the requirements.
+    :return: {distribution: version} of the distributions to ship.
+    """
+    manifests = list(preinstalled_distributions.values())
+
+    def provided(name):
+        if not manifests or not all(name in m for m in manifests):
+            return False
+        return name not in pinned or all(satisfies(m[name], pinned[name]) for m in manifests)
+
+    keep = {name for name in resolved if not provided(name)}
+    # Kept for their version, so the runtime versions of what they require may not fit either.
+    todo = [name for name in keep if name in pinned and manifests and all(name in m for m in manifests)]
+    while todo:
+        for name in resolved.get(todo.pop(), {}).get("requires", []):
+            if name in resolved and name not in keep:
+                keep.add(name)
+                todo.append(name)
+    return {name: resolved[name]["version"] for name in sorted(keep)}
+
+
+def plan_layers(
+    resolved: Dict[str, Dict[str, str]],
+    *,
+    max_layers: int = LAMBDA_MAX_LAYERS,
+    combinations: Iterable[Sequence[str]] = None,
+) -> LayerPlan:
+    """
+    Split the resolved distributions of several layers so no distribution is shipped twice.
+
+    Every distribution goes into a chunk together with the distributions needed by
+    exactly the same set of groups; a distribution used by one group only stays in that
+    group's own chunk. When a group (or a combination of groups used together by a
+    function) would need more than max_layers chunks, the two chunks whose merge ships
+    the fewest unneeded distributions are merged, until everything fits.
+
+    :param resolved: {group id: {distribution: version}}
+    :param max_layers: maximum number of chunks per group or combination.
+    :param combinations: group ids attached together to one function, e.g. [["data", "ml"]].
+        Each group is always checked on its own as well.
+    :return: the plan.
+    :raises ValueError: if groups of a combination install different versions of a distribution,
+        or a group or combination cannot be fit into max_layers.
+    """
+    users: Dict[Pin, set] = {}
+    for group_id, dists in resolved.items():
+        for pin in dists.items():
+            users.setdefault(pin, set()).add(group_id)
+
+    # signature (set of groups using it) -> pins
+    chunks: Dict[FrozenSet[str], List[Pin]] = {}
+    for pin, groups in users.items():
+        chunks.setdefault(frozenset(groups), []).append(pin)
+
+    constraints = [frozenset([g]) for g in resolved]
+    constraints += [frozenset(c) for c in combinations or []]
+    for combination in constraints[len(resolved):]:
+        conflicts = _conflicts({group_id: resolved[group_id] for group_id in sorted(combination)})
+        if conflicts:
+            raise ValueError(
+                f"The layers {sorted(combination)}, attached together to one function, install different "
+                f"versions of {', '.join(conflicts)}. Pin the same versions in their requirements."
+            )
+
+    while True:
+        crowded = [c for c in constraints if len(_chunks_for(chunks, c)) > max_layers]
+        if not crowded:
+            break
+        candidates = _chunks_for(chunks, crowded[0])
+        best = None
+        for a, b in itertools.combinations(candidates, 2):
+            if not _compatible(chunks[a], chunks[b]):
+                continue
+            merged = a | b
+            cost = len(merged - a) * len(chunks[a]) + len(merged - b) * len(chunks[b])
+            if best is None or cost < best[0]:
+                best = (cost, a, b)
+        if best is None:
+            raise ValueError(
+                f"Cannot fit the layers {sorted(crowded[0])} into {max_layers} layers "
+                "without installing conflicting versions together."
+            )
+        _, a, b = best
+        logger.debug(f"Merging layer chunks {sorted(a)} and {sorted(b)}.")
+        pins = chunks.pop(a) + chunks.pop(b)
+        chunks.setdefault(a | b, []).extend(pins)
+
+    named = {}
+    for signature, pins in sorted(chunks.items(), key=lambda item: sorted(item[0])):
+        named[_chunk_name(signature)] = sorted(set(pins))
+    groups = {
+        group_id: [
+            _chunk_name(signature) for signature in sorted(chunks, key=sorted) if group_id in signature
+        ]
+        for group_id in resolved
+    }
+    return LayerPlan(named, groups)
+
+
+def _conflicts(resolved: Dict[str, Dict[str, str]]) -> List[str]:
+    """
+    The distributions the groups in resolved install at different versions, e.g. ["urllib3 (a: 1.26.19, b: 2.2.2)"].
+    """
+    versions: Dict[str, Dict[str, str]] = {}
+    for group_id, dists in resolved.items():
+        for name, version in dists.items():
+            versions.setdefault(name, {})[group_id] = version
+    return [
+        f"{name} ({', '.join(f'{group_id}: {version}' for group_id, version in by_group.items())})"
+        for name, by_group in sorted(versions.items())
+        if len(set(by_group.values())) > 1
+    ]
+
+
+def _chunks_for(chunks: Dict[FrozenSet[str], List[Pin]], groups: FrozenSet[str]) -> List[FrozenSet[str]]:
+    return [signature for signature in chunks if signature & groups]
+
+
+def _compatible(a: List[Pin], b: List[Pin]) -> bool:
+    versions = dict(a)
+    return all(versions.get(name, version) == version for name, version in b)
+
+
+def _chunk_name(signature: FrozenSet[str]) -> str:
+    if len(signature) == 1:
+        return next(iter(signature))
+    name = "shared_" + "_".join(sorted(signature))
+    if len(name) > 48:
+        name = "shared_" + hashlib.sha256(name.encode()).hexdigest()[:12]
+    return name
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import pathlib
+import zlib
+from typing import Dict, Optional, Tuple
+
+from .distributions import installed_distributions
+
+logger = logging.getLogger("alabcdk")
+
+# https://docs.aws.amazon.com/lambda/latest/dg/gettingstarted-limits.html
+LAMBDA_UNZIPPED_LIMIT_MB = 250
+DEFAULT_SIZE_WARN_MB = 200
+DEFAULT_SIZE_FAIL_MB = LAMBDA_UNZIPPED_LIMIT_MB
+
+_CHUNK = 1024 * 1024
+_UNOWNED = "<no distribution>"
+
+
+def analyze_layer(root_dir: str, *, compressed: bool = True) -> dict:
+    """
+    Size of the content of root_dir per distribution, collected in a single walk.
+
+    Files are attributed to distributions through their RECORD. Files that belong
+    to no distribution are reported per top level entry.
+
+    :param root_dir: Directory to analyze (e.g. <layer>/python).
+    :param compressed: also estimate the zipped size (deflate), which reads all content.
+    :return: {"size": bytes, "compressed": bytes, "files": n,
+              "distributions": {name: {"version": ..., "size": ..., "compressed": ..., "files": n}}}
+    """
+    root_dir = os.path.abspath(root_dir)
+    owner = {}
+    result = {"size": 0, "compressed": 0, "files": 0, "distributions": {}}
+    for dist in installed_distributions(root_dir):
+        result["distributions"][dist.name] = {
+            "version": dist.version, "size": 0, "compressed": 0, "files": 0}
+        owner[str(dist.dist_info)] = dist.name
+        for f in dist.files:
+            owner[str(f)] = dist.name
+
+    for path, dirs, files in os.walk(root_dir):
+        dist_info_owner = owner.get(path) if path.endswith(".dist-info") else None
+        if dist_info_owner:
+            # Anything in the dist-info belongs to it, also files missing in RECORD.
+            for d in dirs:
+                owner[os.path.join(path, d)] = dist_info_owner
+        for f in files:
+            fp = os.path.join(path, f)
+            if os.path.islink(fp):
+                continue
+            name = owner.get(fp) or owner.get(path) or _unowned_name(fp, root_dir)
+            entry = result["distributions"].setdefault(
+                name, {"version": None, "size": 0, "compressed": 0, "files": 0})
+            size = os.path.getsize(fp)
+            entry["size"] += size
+            entry["files"] += 1
+            if compressed:
+                entry["compressed"] += _deflated_size(fp)
+
+    for entry in result["distributions"].values():
+        result["size"] += entry["size"]
+        result["compressed"] += entry["compressed"]
+        result["files"] += entry["files"]
+    return result
+
+
+def check_budget(
+    what: str, size: int, *, warn_mb: float = DEFAULT_SIZE_WARN_MB, fail_mb: float = DEFAULT_SIZE_FAIL_MB
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Compare an uncompressed size against the thresholds.
+
+    :return: (level, message) where level is None, "warning" or "error".
+    """
+    size_mb = size / (1024 * 1024)
+    if fail_mb is not None and size_mb > fail_mb:
+        return "error", f"{what} is {size_mb:.1f}MB unzipped, more than the limit of {fail_mb}MB."
+    if warn_mb is not None and size_mb > warn_mb:
+        return "warning", f"{what} is {size_mb:.1f}MB unzipped, more than the warning threshold of {warn_mb}MB."
+    return None, None
+
+
+def top_distributions(report: dict, n: int = 5) -> str:
+    """
+    One line summary of the n largest distributions in a report.
+    """
+    largest = sorted(report["distributions"].items(), key=lambda item: item[1]["size"], reverse=True)[:n]
+    return ", ".join(f"{name} {entry['size'] / (1024 * 1024):.1f}MB" for name, entry in largest)
+
+
+def write_report(filename: pathlib.Path, reports: Dict[str, dict]) -> None:
+    """
+    Write size reports as json, sorted for stable diffs between builds.
+    """
+    with open(filename, "w") as f:
+        json.dump(reports, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def built_layers(scope) -> Dict[str, dict]:
+    """
+    Layers built locally in the app of scope, keyed on node path: {"dir": python/ directory,
+    "size": uncompressed bytes, "architecture": name or None, "versions": {distribution: version}}.
+
+    Kept on the app, so apps synthesized in the same process (tests, stages) do not see
+    each other's layers.
+    """
+    root = scope.node.root
+    layers = getattr(root, "_alabcdk_built_layers", None)
+    if layers is None:
+        layers = root._alabcdk_built_layers = {}
+    return layers
+
+
+def record_layer(
+    layer,
+    directory: str,
+    *,
+    size: Optional[int] = None,
+    architecture: Optional[str] = None,
+    versions: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Record a layer built from directory in built_layers.
+
+    :param size: uncompressed size, the size of directory by default.
+    :param versions: {distribution: version} installed in the layer.
+    """
+    built_layers(layer)[layer.node.path] = {
+        "dir": str(directory),
+        "size": dir_size(str(directory)) if size is None else size,
+        "architecture": architecture,
+        "versions": versions or {},
+    }
+
+
+def dir_size(root_dir: str) -> int:
+    """
+    Uncompressed size of all files under root_dir.
+    """
+    total = 0
+    for path, dirs, files in os.walk(root_dir):
+        for f in files:
+            fp = os.path.join(path, f)
+            if not os.path.islink(fp):
+                total += os.path.getsize(fp)
+    return total
+
+
+def _unowned_name(path: str, root_dir: str) -> str:
+    return f"{_UNOWNED} {pathlib.PurePath(os.path.relpath(path, root_dir)).parts[0]}"
+
+
+def _deflated_size(path: str) -> int:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    total = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            total += len(compressor.compress(chunk))
+    return total + len(compressor.flush())
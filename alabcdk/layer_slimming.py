@@ -0,0 +1,193 @@
+import fnmatch
+import logging
+import os
+import pathlib
+import shutil
+import subprocess
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger("alabcdk")
+
+
+class SlimRule:
+    """
+    Named set of patterns for content that is not needed at runtime.
+
+    Directories whose name matches one of dirs and files whose name matches one
+    of files are deleted. Patterns are fnmatch patterns on the base name. With
+    keep_packages, matching directories that are Python packages (have an
+    __init__.py) are left alone, since they can be imported.
+    """
+
+    def __init__(
+        self, name: str, *, dirs: Sequence[str] = (), files: Sequence[str] = (), keep_packages: bool = False
+    ):
+        self.name = name
+        self.dirs = list(dirs)
+        self.files = list(files)
+        self.keep_packages = keep_packages
+
+    def __repr__(self):
+        packages = ", keep_packages=True" if self.keep_packages else ""
+        return f"{type(self).__name__}({self.name!r}, dirs={self.dirs!r}, files={self.files!r}{packages})"
+
+    def apply(self, root_dir: pathlib.Path, *, keep: Sequence[str] = (), log=logger) -> int:
+        """
+        Delete matching content under root_dir, except paths matched by keep.
+
+        :return: number of bytes removed.
+        """
+        removed = 0
+        for path, dirs, files in os.walk(root_dir):
+            for d in list(dirs):
+                if not _matches(d, self.dirs):
+                    continue
+                full = os.path.join(path, d)
+                if _is_kept(_relative(full, root_dir), keep):
+                    continue
+                if self.keep_packages and os.path.exists(os.path.join(full, "__init__.py")):
+                    continue
+                dirs.remove(d)
+                removed += _tree_size(full)
+                shutil.rmtree(full, ignore_errors=True)
+            for f in files:
+                if not _matches(f, self.files):
+                    continue
+                full = os.path.join(path, f)
+                if _is_kept(_relative(full, root_dir), keep) or os.path.islink(full):
+                    continue
+                removed += os.path.getsize(full)
+                os.remove(full)
+        return removed
+
+
+class StripRule(SlimRule):
+    """
+    Strip symbols from native extensions using binutils' strip.
+
+    Skipped (with a log line) when strip is not available, and files strip cannot
+    handle (e.g. built for another architecture) are left as they are.
+    """
+
+    def __init__(
+        self,
+        name: str = "strip",
+        *,
+        files: Sequence[str] = ("*.so", "*.so.*"),
+        args: Sequence[str] = ("--strip-debug",),
+    ):
+        super().__init__(name, files=files)
+        self.args = list(args)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, files={self.files!r}, args={self.args!r})"
+
+    def apply(self, root_dir: pathlib.Path, *, keep: Sequence[str] = (), log=logger) -> int:
+        strip = shutil.which("strip")
+        if not strip:
+            log.info("'strip' not found, native extensions are not stripped.")
+            return 0
+
+        saved = 0
+        for path, dirs, files in os.walk(root_dir):
+            for f in files:
+                full = os.path.join(path, f)
+                if (
+                    not _matches(f, self.files)
+                    or os.path.islink(full)
+                    or _is_kept(_relative(full, root_dir), keep)
+                ):
+                    continue
+                before = os.path.getsize(full)
+                result = subprocess.run(
+                    [strip, *self.args, full], stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+                )
+                if result.returncode != 0:
+                    log.debug(f"Could not strip {full}: {result.stdout.decode().strip()}")
+                    continue
+                saved += before - os.path.getsize(full)
+        return saved
+
+
+# Content the interpreter never imports: bytecode caches (rebuilt from the sources),
+# type stubs, debug symbols, and tests directories that are not importable packages.
+# Packages can still read any file as data; use keep for those.
+DEFAULT_SLIM_RULES = [
+    SlimRule("pycache", dirs=["__pycache__"], files=["*.pyc", "*.pyo"]),
+    SlimRule("tests", dirs=["tests"], keep_packages=True),
+    SlimRule("stubs", files=["*.pyi"]),
+    StripRule(),
+]
+
+# Not enabled by default, add to slim_rules explicitly. Some packages read these at
+# runtime: docs and examples as data, C sources and headers compiled by cffi or
+# numpy's include directories used by build steps.
+DOCS_SLIM_RULE = SlimRule("docs", dirs=["docs", "doc", "examples"], keep_packages=True)
+SOURCES_SLIM_RULE = SlimRule("sources", files=["*.c", "*.cpp", "*.h", "*.hpp", "*.pyx", "*.pxd"])
+METADATA_SLIM_RULE = SlimRule(
+    "metadata", files=["RECORD", "INSTALLER", "REQUESTED", "direct_url.json"]
+)
+
+
+def slim_layer(
+    root_dir: pathlib.Path,
+    *,
+    rules: List[SlimRule] = None,
+    keep: Sequence[str] = None,
+    log: logging.LoggerAdapter = None,
+) -> Dict[str, int]:
+    """
+    Apply all rules to the installed packages in root_dir.
+
+    :param root_dir: Directory pip installed the layer into.
+    :param rules: Rules to apply, in order. Defaults to DEFAULT_SLIM_RULES.
+    :param keep: fnmatch patterns of paths (relative to root_dir, using '/') that
+        must never be removed, e.g. ["botocore/data/*", "*/tests/conftest.py"].
+    :param log: Logger to report to. Defaults to the module logger.
+    :return: Bytes saved per rule name.
+    """
+    log = log or logger
+    rules = DEFAULT_SLIM_RULES if rules is None else rules
+    keep = keep or []
+    report = {}
+    for rule in rules:
+        report[rule.name] = rule.apply(pathlib.Path(root_dir), keep=keep, log=log)
+        log.info(f"Slimming rule '{rule.name}' saved {report[rule.name] / (1024 * 1024):.1f}MB.")
+    total = sum(report.values())
+    log.info(f"Slimming saved {total / (1024 * 1024):.1f}MB in total.")
+    return report
+
+
+def _matches(name: str, patterns: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def _relative(path: str, root_dir: pathlib.Path) -> str:
+    return pathlib.PurePath(os.path.relpath(path, root_dir)).as_posix()
+
+
+def _is_kept(relpath: str, keep: Sequence[str]) -> bool:
+    """
+    relpath is kept if it matches a keep pattern, or if a keep pattern can match
+    something inside it (then a directory cannot be removed as a whole).
+    """
+    parts = relpath.split("/")
+    for pattern in keep:
+        if fnmatch.fnmatch(relpath, pattern):
+            return True
+        pattern_parts = pattern.split("/")
+        if len(pattern_parts) > len(parts) and all(
+            fnmatch.fnmatch(part, pattern_part) for part, pattern_part in zip(parts, pattern_parts)
+        ):
+            return True
+    return False
+
+
+def _tree_size(root: str) -> int:
+    total = 0
+    for path, dirs, files in os.walk(root):
+        for f in files:
+            fp = os.path.join(path, f)
+            if not os.path.islink(fp):
+                total += os.path.getsize(fp)
+    return total
@@ -0,0 +1,347 @@
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Sequence
+
+import aws_cdk as cdk
+import jsii
+from constructs import Construct, IConstruct, IValidation
+
+from .profiling import span
+
+logger = logging.getLogger("alabcdk")
+
+# Set to true (cdk synth -c alabcdk:perf-lint=true) to lint every AlabStack.
+PERF_LINT_CONTEXT_KEY = "alabcdk:perf-lint"
+# Node metadata recording suppressed rules, see suppress().
+SUPPRESS_METADATA = "alabcdk:perf-lint:suppress"
+# Written to the cloud assembly directory per stack: <artifact id>.perf-lint.json.
+REPORT_SUFFIX = ".perf-lint.json"
+LEVELS = ("error", "warning", "info", "off")
+
+# Lambda defaults, when the properties are not set.
+_LAMBDA_DEFAULT_MEMORY_MB = 128
+_LAMBDA_DEFAULT_TIMEOUT = 3
+_SQS_DEFAULT_VISIBILITY_TIMEOUT = 30
+
+
+class PerfRule:
+    """
+    A performance anti-pattern for PerfLint.
+
+    check(resource, properties, lint) gets the resolved CloudFormation properties
+    (camelCase keys, property overrides not included) of every resource of resource_type
+    and returns a message per finding.
+    """
+
+    def __init__(
+            self,
+            id: str,
+            resource_type: str,
+            check: Callable[[cdk.CfnResource, dict, "PerfLint"], List[str]],
+            *,
+            level: str = "warning",
+            description: str = ""):
+        self.id = id
+        self.resource_type = resource_type
+        self.check = check
+        self.level = level
+        self.description = description
+
+
+def _lambda_memory(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    memory = properties.get("memorySize", _LAMBDA_DEFAULT_MEMORY_MB)
+    if isinstance(memory, int) and memory <= lint.min_memory_mb:
+        return [
+            f"Function has {memory} MB memory. CPU is allocated in proportion to memory, "
+            f"so cold starts and CPU bound work are slow; set memory_size above {lint.min_memory_mb}."
+        ]
+    return []
+
+
+def _lambda_timeout(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    if properties.get("timeout", _LAMBDA_DEFAULT_TIMEOUT) == _LAMBDA_DEFAULT_TIMEOUT:
+        return [
+            f"Function has the default timeout of {_LAMBDA_DEFAULT_TIMEOUT} seconds, "
+            "which a cold start with large layers can exceed; set timeout explicitly."
+        ]
+    return []
+
+
+def _apigateway_cache(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    if properties.get("cacheClusterEnabled") is not True:
+        return ["RestApi stage without a cache, every request reaches the backend; "
+                "set deploy_options with cache_cluster_enabled=True."]
+    return []
+
+
+def _apigateway_compression(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    if properties.get("minimumCompressionSize") is None:
+        return ["RestApi without compression; set min_compression_size, e.g. Size.kibibytes(1)."]
+    return []
+
+
+def _cloudfront_behaviors(properties: dict) -> Dict[str, dict]:
+    config = properties.get("distributionConfig") or {}
+    behaviors = {"default behavior": config.get("defaultCacheBehavior") or {}}
+    for behavior in config.get("cacheBehaviors") or []:
+        behaviors[f"behavior {behavior.get('pathPattern')}"] = behavior
+    return behaviors
+
+
+def _cloudfront_cache_policy(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    return [
+        f"Distribution {name} has no cache policy; set cache_policy, e.g. CachePolicy.CACHING_OPTIMIZED."
+        for name, behavior in _cloudfront_behaviors(properties).items()
+        if not behavior.get("cachePolicyId")
+    ]
+
+
+def _cloudfront_compression(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    return [
+        f"Distribution {name} does not compress; set compress=True."
+        for name, behavior in _cloudfront_behaviors(properties).items()
+        if behavior.get("compress") is False
+    ]
+
+
+def _dynamodb_autoscaling(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    if properties.get("billingMode") == "PAY_PER_REQUEST" or not properties.get("provisionedThroughput"):
+        return []
+    logical_id = cdk.Stack.of(resource).get_logical_id(resource)
+    if any(
+        logical_id in json.dumps(target.get("resourceId"))
+        for target in lint.index(resource).properties("AWS::ApplicationAutoScaling::ScalableTarget")
+    ):
+        return []
+    return ["Table has provisioned capacity without autoscaling; use billing_mode=PAY_PER_REQUEST "
+            "or auto_scale_read_capacity()/auto_scale_write_capacity()."]
+
+
+def _sqs_visibility_timeout(resource: cdk.CfnResource, properties: dict, lint: "PerfLint") -> List[str]:
+    visibility = properties.get("visibilityTimeout", _SQS_DEFAULT_VISIBILITY_TIMEOUT)
+    if not isinstance(visibility, int):
+        return []
+    index = lint.index(resource)
+    logical_id = cdk.Stack.of(resource).get_logical_id(resource)
+    consumers = {}
+    # Event source mappings reading the queue.
+    for mapping in index.properties("AWS::Lambda::EventSourceMapping"):
+        if logical_id in json.dumps(mapping.get("eventSourceArn")):
+            function = index.by_reference(mapping.get("functionName"))
+            if function is not None:
+                consumers[function.node.path] = function
+    # Queue(consumers=[...]) polling it themselves.
+    for consumer in getattr(resource.node.scope, "consumers", []):
+        function = getattr(getattr(consumer, "node", None), "default_child", None)
+        if isinstance(function, cdk.CfnResource) and function.cfn_resource_type == "AWS::Lambda::Function":
+            consumers[function.node.path] = function
+    messages = []
+    for path, function in sorted(consumers.items()):
+        timeout = index.properties_of(function).get("timeout", _LAMBDA_DEFAULT_TIMEOUT)
+        if isinstance(timeout, int) and visibility < lint.visibility_timeout_factor * timeout:
+            messages.append(
+                f"Queue visibility timeout {visibility}s is less than {lint.visibility_timeout_factor} times "
+                f"the timeout {timeout}s of consumer {path}; messages are redelivered while still being processed."
+            )
+    return messages
+
+
+DEFAULT_RULES: List[PerfRule] = [
+    PerfRule("lambda-memory", "AWS::Lambda::Function", _lambda_memory,
+             description="Lambda at the minimum memory size, and thus the minimum CPU"),
+    PerfRule("lambda-timeout", "AWS::Lambda::Function", _lambda_timeout,
+             description="Lambda with the default 3 second timeout"),
+    PerfRule("apigateway-cache", "AWS::ApiGateway::Stage", _apigateway_cache, level="info",
+             description="REST API stage without a cache cluster"),
+    PerfRule("apigateway-compression", "AWS::ApiGateway::RestApi", _apigateway_compression,
+             description="REST API without response compression"),
+    PerfRule("cloudfront-cache-policy", "AWS::CloudFront::Distribution", _cloudfront_cache_policy,
+             description="CloudFront behavior without a cache policy"),
+    PerfRule("cloudfront-compression", "AWS::CloudFront::Distribution", _cloudfront_compression,
+             description="CloudFront behavior without compression"),
+    PerfRule("dynamodb-autoscaling", "AWS::DynamoDB::Table", _dynamodb_autoscaling,
+             description="Provisioned DynamoDB table without autoscaling"),
+    PerfRule("sqs-visibility-timeout", "AWS::SQS::Queue", _sqs_visibility_timeout,
+             description="SQS visibility timeout too short for the consuming Lambdas"),
+]
+
+
+def suppress(scope: IConstruct, *rules: str, reason: str) -> None:
+    """
+    Suppress PerfLint rules for scope and everything below it.
+
+    Example:
+    >>>suppress(my_function, "lambda-memory", reason="Only forwards a message.")
+
+    :param rules: rule ids, or "*" for all rules.
+    :param reason: why; it is part of the report.
+    """
+    if not reason:
+        raise ValueError("A reason is required to suppress perf lint rules.")
+    scope.node.add_metadata(SUPPRESS_METADATA, {"rules": list(rules), "reason": reason})
+
+
+def _suppression(node: IConstruct, rule: str) -> Optional[str]:
+    """
+    The reason rule is suppressed for node, None if it is not.
+    """
+    for scope in reversed(node.node.scopes):
+        for entry in scope.node.metadata:
+            if entry.type == SUPPRESS_METADATA and (rule in entry.data["rules"] or "*" in entry.data["rules"]):
+                return entry.data["reason"]
+    return None
+
+
+class _StackIndex:
+    """
+    The resources of a stack by logical id and type, with their properties resolved once.
+    """
+
+    def __init__(self, stack: cdk.Stack):
+        self.stack = stack
+        self.resources: Dict[str, cdk.CfnResource] = {}
+        self._properties: Dict[str, dict] = {}
+        for construct in stack.node.find_all():
+            if isinstance(construct, cdk.CfnResource) and cdk.Stack.of(construct) is stack:
+                self.resources[stack.get_logical_id(construct)] = construct
+
+    def properties_of(self, resource: cdk.CfnResource) -> dict:
+        logical_id = self.stack.get_logical_id(resource)
+        if logical_id not in self._properties:
+            # The L1 attributes fail on lazily produced structs, the resolved properties do not.
+            self._properties[logical_id] = self.stack.resolve(resource._cfn_properties) or {}
+        return self._properties[logical_id]
+
+    def properties(self, resource_type: str) -> List[dict]:
+        return [
+            self.properties_of(resource)
+            for resource in self.resources.values()
+            if resource.cfn_resource_type == resource_type
+        ]
+
+    def by_reference(self, reference) -> Optional[cdk.CfnResource]:
+        """
+        The resource {"Ref": ...} or {"Fn::GetAtt": [...]} points to.
+        """
+        if isinstance(reference, dict):
+            logical_id = reference.get("Ref") or (reference.get("Fn::GetAtt") or [None])[0]
+            return self.resources.get(logical_id)
+        return None
+
+
+@jsii.implements(cdk.IAspect)
+class PerfLint:
+    """
+    Aspect checking the resources of a stack for performance anti-patterns.
+
+    Findings are annotations on the resources, so warnings show in cdk synth and errors
+    fail it, and are written per stack to <outdir>/<artifact id>.perf-lint.json,
+    together with the suppressed findings. Attach it with AlabStack.add_perf_lint() or
+    Aspects.of(scope).add(PerfLint()), and suppress rules per construct with suppress().
+    """
+
+    def __init__(
+            self,
+            *,
+            rules: Sequence[PerfRule] = None,
+            levels: Dict[str, str] = None,
+            min_memory_mb: int = _LAMBDA_DEFAULT_MEMORY_MB,
+            visibility_timeout_factor: int = 6):
+        """
+        :param rules: the rules to apply. Defaults to DEFAULT_RULES.
+        :param levels: {rule id: "error", "warning", "info" or "off"}, overriding the level of rules.
+        :param min_memory_mb: lambda-memory reports functions with at most this memory.
+        :param visibility_timeout_factor: sqs-visibility-timeout reports queues with a visibility
+            timeout below this many times the timeout of their consumers. AWS advises 6.
+        """
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.levels = {rule.id: rule.level for rule in self.rules}
+        for id, level in (levels or {}).items():
+            if id not in self.levels:
+                raise ValueError(f"Unknown perf lint rule '{id}', use one of {', '.join(sorted(self.levels))}.")
+            if level not in LEVELS:
+                raise ValueError(f"Level of perf lint rule '{id}' must be one of {', '.join(LEVELS)}, not '{level}'.")
+            self.levels[id] = level
+        self.min_memory_mb = min_memory_mb
+        self.visibility_timeout_factor = visibility_timeout_factor
+        # Findings per stack path.
+        self.findings: Dict[str, List[dict]] = {}
+        self._indexes: Dict[str, _StackIndex] = {}
+
+    def index(self, construct: IConstruct) -> _StackIndex:
+        stack = cdk.Stack.of(construct)
+        if stack.node.path not in self._indexes:
+            self._indexes[stack.node.path] = _StackIndex(stack)
+        return self._indexes[stack.node.path]
+
+    def visit(self, node: IConstruct) -> None:
+        if isinstance(node, cdk.Stack) and node.node.path not in self.findings:
+            self.findings[node.node.path] = []
+            node.node.add_validation(_PerfLintReport(self, node))
+        if not isinstance(node, cdk.CfnResource):
+            return
+        rules = [
+            rule for rule in self.rules
+            if rule.resource_type == node.cfn_resource_type and self.levels[rule.id] != "off"
+        ]
+        if not rules:
+            return
+        with span("PerfLint", path=node.node.path):
+            properties = self.index(node).properties_of(node)
+            for rule in rules:
+                for message in rule.check(node, properties, self):
+                    self._report(node, rule, message)
+
+    def _report(self, node: cdk.CfnResource, rule: PerfRule, message: str) -> None:
+        level = self.levels[rule.id]
+        reason = _suppression(node, rule.id)
+        self.findings.setdefault(cdk.Stack.of(node).node.path, []).append({
+            "rule": rule.id,
+            "level": level,
+            "path": node.node.path,
+            "message": message,
+            "suppressed": reason,
+        })
+        if reason is not None:
+            return
+        message = f"[{rule.id}] {message}"
+        if level == "error":
+            cdk.Annotations.of(node).add_error(message)
+        elif level == "warning":
+            cdk.Annotations.of(node).add_warning(message)
+        else:
+            cdk.Annotations.of(node).add_info(message)
+
+
+@jsii.implements(IValidation)
+class _PerfLintReport:
+    """
+    Writes the findings for a stack when the app is synthesized, after the aspects ran.
+    """
+
+    def __init__(self, lint: PerfLint, stack: cdk.Stack):
+        self.lint = lint
+        self.stack = stack
+
+    def validate(self) -> List[str]:
+        outdir = getattr(self.stack.node.root, "outdir", None)
+        if outdir:
+            findings = self.lint.findings.get(self.stack.node.path, [])
+            os.makedirs(outdir, exist_ok=True)
+            report = {"stack": self.stack.node.path, "levels": self.lint.levels, "findings": findings}
+            with open(os.path.join(outdir, self.stack.artifact_id + REPORT_SUFFIX), "w") as f:
+                json.dump(report, f, indent=2)
+            active = [finding for finding in findings if finding["suppressed"] is None]
+            if active:
+                logger.info(f"Perf lint of {self.stack.node.path}: {len(active)} findings, see {f.name}.")
+        return []
+
+
+def enable_from_context(stack: Construct) -> None:
+    """
+    Attach PerfLint to stack if the context key alabcdk:perf-lint is set. Called by AlabStack.
+    """
+    value = stack.node.try_get_context(PERF_LINT_CONTEXT_KEY)
+    if value is not None and str(value).strip().lower() not in ("", "0", "false", "no", "off"):
+        stack.add_perf_lint()
@@ -0,0 +1,218 @@
+import logging
+from typing import Dict, List, Optional, Union
+
+import aws_cdk as cdk
+from aws_cdk import Duration, Size, aws_applicationautoscaling, aws_lambda
+from constructs import Construct
+
+logger = logging.getLogger("alabcdk")
+
+# Name of the alias created for provisioned concurrency and SnapStart.
+ALIAS_NAME = "live"
+# Without it, current_version only changes with the function itself, not with its layers.
+RECOGNIZE_LAYER_VERSION = "@aws-cdk/aws-lambda:recognizeLayerVersion"
+
+_FIELDS = (
+    "memory_size",
+    "ephemeral_storage_mb",
+    "architecture",
+    "timeout_seconds",
+    "provisioned_concurrency",
+    "autoscaling_max",
+    "autoscaling_utilization",
+    "scaling_schedules",
+    "snap_start",
+)
+
+
+class ScalingSchedule:
+    """
+    Provisioned concurrency between min_capacity and max_capacity from a cron schedule on,
+    e.g. ScalingSchedule("morning", "cron(0 6 ? * MON-FRI *)", min_capacity=10).
+    """
+
+    def __init__(self, id: str, expression: str, *, min_capacity: int = None, max_capacity: int = None):
+        self.id = id
+        self.expression = expression
+        self.min_capacity = min_capacity
+        self.max_capacity = max_capacity
+
+
+class PerformanceProfile:
+    """
+    Declarative performance settings of a Function, with overrides per stage.
+
+    Example:
+    >>>PerformanceProfile(memory_size=1024, timeout_seconds=10,
+    ...                   stages={"PROD": {"provisioned_concurrency": 5, "autoscaling_max": 20}})
+
+    Settings that are None are left to the Function (and its defaults).
+    """
+
+    def __init__(
+            self,
+            *,
+            memory_size: int = None,
+            ephemeral_storage_mb: int = None,
+            architecture: aws_lambda.Architecture = None,
+            timeout_seconds: int = None,
+            provisioned_concurrency: int = 0,
+            autoscaling_max: int = None,
+            autoscaling_utilization: float = 0.7,
+            scaling_schedules: List[ScalingSchedule] = None,
+            snap_start: bool = False,
+            stages: Dict[str, dict] = None):
+        """
+        :param memory_size: memory in MB. CPU is allocated in proportion, a full vCPU at 1769 MB.
+        :param ephemeral_storage_mb: size of /tmp in MB, 512 to 10240.
+        :param architecture: aws_lambda.Architecture. Layers must be built for it,
+            see PipLayers(architectures=[...]).
+        :param timeout_seconds: timeout.
+        :param provisioned_concurrency: initialized environments kept on the alias "live".
+            0 means none.
+        :param autoscaling_max: scale provisioned concurrency up to this on utilization,
+            starting at provisioned_concurrency.
+        :param autoscaling_utilization: target utilization of the provisioned concurrency.
+        :param scaling_schedules: scheduled changes of the autoscaling capacity.
+        :param snap_start: publish versions with SnapStart, where the runtime supports it
+            and there is no provisioned concurrency.
+        :param stages: {stage: {setting: value}} overriding the settings above for a stage.
+        """
+        self.memory_size = memory_size
+        self.ephemeral_storage_mb = ephemeral_storage_mb
+        self.architecture = architecture
+        self.timeout_seconds = timeout_seconds
+        self.provisioned_concurrency = provisioned_concurrency
+        self.autoscaling_max = autoscaling_max
+        self.autoscaling_utilization = autoscaling_utilization
+        self.scaling_schedules = list(scaling_schedules or [])
+        self.snap_start = snap_start
+        self.stages = stages or {}
+        for stage, overrides in self.stages.items():
+            unknown = set(overrides) - set(_FIELDS)
+            if unknown:
+                raise ValueError(
+                    f"Unknown settings for stage {stage}: {', '.join(sorted(unknown))}. "
+                    f"Use any of {', '.join(_FIELDS)}."
+                )
+
+    def for_stage(self, stage: str) -> "PerformanceProfile":
+        """
+        This profile with the overrides of stage applied.
+        """
+        settings = {field: getattr(self, field) for field in _FIELDS}
+        settings.update(self.stages.get(stage, {}))
+        return PerformanceProfile(**settings)
+
+    def function_kwargs(self, runtime: aws_lambda.Runtime) -> dict:
+        """
+        The Function arguments for this profile (without stage overrides).
+        """
+        kwargs = {}
+        if self.memory_size is not None:
+            kwargs["memory_size"] = self.memory_size
+        if self.ephemeral_storage_mb is not None:
+            kwargs["ephemeral_storage_size"] = Size.mebibytes(self.ephemeral_storage_mb)
+        if self.architecture is not None:
+            kwargs["architecture"] = self.architecture
+        if self.timeout_seconds is not None:
+            kwargs["timeout"] = Duration.seconds(self.timeout_seconds)
+        # Lambda does not combine SnapStart with provisioned concurrency, which avoids cold starts anyway.
+        if self.snap_start and not self.provisioned_concurrency and supports_snap_start(runtime):
+            kwargs["snap_start"] = aws_lambda.SnapStartConf.ON_PUBLISHED_VERSIONS
+        return kwargs
+
+    @property
+    def needs_alias(self) -> bool:
+        return bool(self.provisioned_concurrency or self.snap_start)
+
+
+PROFILES: Dict[str, PerformanceProfile] = {
+    # Synchronous APIs: a full vCPU, no cold starts in PROD, faster ones in TEST; DEV stays cheap.
+    "latency-critical": PerformanceProfile(
+        memory_size=1769,
+        timeout_seconds=10,
+        stages={
+            "TEST": {"snap_start": True},
+            "PROD": {"provisioned_concurrency": 2, "autoscaling_max": 20},
+        },
+    ),
+    # Queue and scheduled work: more CPU, /tmp and time, cold starts do not matter.
+    "batch": PerformanceProfile(
+        memory_size=3008,
+        ephemeral_storage_mb=4096,
+        timeout_seconds=900,
+    ),
+    # Rarely called helpers.
+    "cheap": PerformanceProfile(
+        memory_size=256,
+        timeout_seconds=10,
+    ),
+}
+
+
+def supports_snap_start(runtime: aws_lambda.Runtime) -> bool:
+    # Older aws-cdk-lib versions have neither.
+    return bool(getattr(runtime, "supports_snap_start", False)) and hasattr(aws_lambda, "SnapStartConf")
+
+
+def resolve_profile(
+        profile: Union[str, PerformanceProfile, Dict[str, Union[str, PerformanceProfile]]],
+        stage: str) -> Optional[PerformanceProfile]:
+    """
+    The profile for stage, with its stage overrides applied.
+
+    :param profile: a name in PROFILES, a PerformanceProfile, or {stage: either of those}
+        with "*" for the other stages.
+    :return: None if profile has nothing for stage.
+    """
+    if isinstance(profile, dict):
+        profile = profile.get(stage, profile.get("*"))
+    if profile is None:
+        return None
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown performance profile '{profile}', use one of {', '.join(sorted(PROFILES))}.")
+        profile = PROFILES[profile]
+    return profile.for_stage(stage)
+
+
+def add_alias(function: aws_lambda.Function, profile: PerformanceProfile) -> aws_lambda.Alias:
+    """
+    Publish a version of function with the alias "live", with the provisioned
+    concurrency and its autoscaling of profile.
+
+    alabcdk.Function mixes its layers into the version, so the alias does not keep
+    running old layers when only a layer changed.
+    """
+    if profile.snap_start and not profile.provisioned_concurrency and not supports_snap_start(function.runtime):
+        cdk.Annotations.of(function).add_info(f"SnapStart is not supported for {function.runtime.name}, skipped.")
+    alias = aws_lambda.Alias(
+        function,
+        "Alias",
+        alias_name=ALIAS_NAME,
+        version=function.current_version,
+        provisioned_concurrent_executions=profile.provisioned_concurrency or None,
+    )
+    if profile.provisioned_concurrency and (profile.autoscaling_max or profile.scaling_schedules):
+        scaling = alias.add_auto_scaling(
+            min_capacity=profile.provisioned_concurrency,
+            max_capacity=max(profile.autoscaling_max or 0, profile.provisioned_concurrency),
+        )
+        if profile.autoscaling_max:
+            scaling.scale_on_utilization(utilization_target=profile.autoscaling_utilization)
+        for schedule in profile.scaling_schedules:
+            scaling.scale_on_schedule(
+                schedule.id,
+                schedule=aws_applicationautoscaling.Schedule.expression(schedule.expression),
+                min_capacity=schedule.min_capacity,
+                max_capacity=schedule.max_capacity,
+            )
+    return alias
+
+
+def stage_of(scope: Construct) -> str:
+    """
+    The stage of the AlabStack of scope, DEV for other stacks.
+    """
+    return getattr(cdk.Stack.of(scope), "stage", None) or "DEV"
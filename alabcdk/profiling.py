@@ -0,0 +1,252 @@
+import atexit
+import contextlib
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from constructs import Construct
+
+logger = logging.getLogger("alabcdk")
+
+# Enables profiling, e.g. ALABCDK_PROFILE=1 cdk synth, or cdk synth -c alabcdk:profile=1.
+# The value is "1"/"true", the number of report rows, or "time" to skip allocation tracing.
+PROFILE_ENV = "ALABCDK_PROFILE"
+PROFILE_CONTEXT_KEY = "alabcdk:profile"
+# Written to the cloud assembly directory: Chrome trace events (chrome://tracing, Perfetto,
+# speedscope) and folded stacks (flamegraph.pl, speedscope).
+TRACE_FILE = "alabcdk-profile.trace.json"
+FOLDED_FILE = "alabcdk-profile.folded"
+DEFAULT_TOP = 20
+
+_OFF = ("", "0", "false", "no", "off")
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Collects timed spans (construct __init__s, PipLayers stages, asset hashing, git and
+    other subprocesses) while an app is synthesized.
+
+    Spans nest per thread. For each span the wall time, the time not spent in nested
+    spans (self time) and, when allocations are traced, the net memory allocated are
+    recorded. Allocation tracing uses tracemalloc, which is process wide: spans running
+    in parallel (PipLayers(parallel=True)) get each other's allocations too.
+    """
+
+    def __init__(self, *, top: int = DEFAULT_TOP, trace_allocations: bool = True):
+        self.top = top
+        self.trace_allocations = trace_allocations
+        self.outdir: Optional[str] = None
+        self.events: List[dict] = []
+        self.folded: Dict[str, float] = {}
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._finished = False
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "alabcdk", **args):
+        stack = self._stack()
+        # [name, nested span time]
+        frame = [name, 0.0]
+        stack.append(frame)
+        allocated = tracemalloc.get_traced_memory()[0] if self.trace_allocations else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if self.trace_allocations:
+                allocated = tracemalloc.get_traced_memory()[0] - allocated
+            path = ";".join(f[0] for f in stack)
+            stack.pop()
+            if stack:
+                stack[-1][1] += duration
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {**{k: str(v) for k, v in args.items()}, "self_us": (duration - frame[1]) * 1e6},
+            }
+            if self.trace_allocations:
+                event["args"]["allocated_bytes"] = allocated
+            with self._lock:
+                self.events.append(event)
+                self.folded[path] = self.folded.get(path, 0.0) + (duration - frame[1]) * 1e6
+
+    def summary(self) -> List[dict]:
+        """
+        Spans aggregated by name: count, total and self time in seconds, net allocated bytes.
+        Sorted on self time, largest first.
+        """
+        rows = {}
+        for event in self.events:
+            row = rows.setdefault(
+                event["name"], {"name": event["name"], "count": 0, "total": 0.0, "self": 0.0, "allocated": 0}
+            )
+            row["count"] += 1
+            row["total"] += event["dur"] / 1e6
+            row["self"] += event["args"]["self_us"] / 1e6
+            row["allocated"] += event["args"].get("allocated_bytes", 0)
+        return sorted(rows.values(), key=lambda row: row["self"], reverse=True)
+
+    def report(self, top: int = None) -> str:
+        """
+        The top rows of summary(), and with allocation tracing the largest allocation
+        sites still alive, as text.
+        """
+        top = top or self.top
+        lines = [f"{'self s':>8} {'total s':>8} {'count':>6} {'alloc MB':>9}  span"]
+        for row in self.summary()[:top]:
+            allocated = row["allocated"] / 2**20
+            lines.append(f"{row['self']:8.3f} {row['total']:8.3f} {row['count']:6} {allocated:9.2f}  {row['name']}")
+        if self.trace_allocations and tracemalloc.is_tracing():
+            lines.append("")
+            lines.append(f"{'live MB':>8} {'blocks':>8}  allocated at")
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:top]:
+                frame = stat.traceback[0]
+                lines.append(f"{stat.size / 2**20:8.2f} {stat.count:8}  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines)
+
+    def write(self, outdir: str) -> List[str]:
+        """
+        Write the trace and folded stacks to outdir.
+
+        :return: the files written.
+        """
+        os.makedirs(outdir, exist_ok=True)
+        trace_file = os.path.join(outdir, TRACE_FILE)
+        with open(trace_file, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        folded_file = os.path.join(outdir, FOLDED_FILE)
+        with open(folded_file, "w") as f:
+            for path, self_us in sorted(self.folded.items()):
+                f.write(f"{path} {round(self_us)}\n")
+        return [trace_file, folded_file]
+
+    def finish(self) -> None:
+        """
+        Print the report to stderr and write the trace files, once.
+        Called at exit of the process when profiling was enabled.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        outdir = self.outdir or os.environ.get("CDK_OUTDIR") or "cdk.out"
+        print(f"alabcdk profile:\n{self.report()}", file=sys.stderr)
+        files = self.write(outdir)
+        print(f"alabcdk profile written to {', '.join(files)}", file=sys.stderr)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def profiler() -> Optional[Profiler]:
+    """
+    The active Profiler, None when profiling is not enabled.
+    """
+    return _profiler
+
+
+def enable(*, top: int = DEFAULT_TOP, trace_allocations: bool = True, outdir: str = None) -> Profiler:
+    """
+    Start profiling this process. The report and trace files are produced at exit.
+    Enabling again returns the active Profiler.
+
+    :param top: number of rows in the report.
+    :param trace_allocations: attribute allocations to spans with tracemalloc.
+    :param outdir: where to write the trace files. Defaults to the outdir of the app
+        of the first AlabStack, $CDK_OUTDIR or cdk.out.
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(top=top, trace_allocations=trace_allocations)
+        atexit.register(_profiler.finish)
+        logger.info("Profiling enabled.")
+    if outdir:
+        _profiler.outdir = outdir
+    return _profiler
+
+
+def _enable_from(value) -> Optional[Profiler]:
+    value = str(value).strip().lower()
+    if value in _OFF:
+        return None
+    if value == "time":
+        return enable(trace_allocations=False)
+    return enable(top=int(value) if value.isdigit() and int(value) > 1 else DEFAULT_TOP)
+
+
+def enable_from_context(scope: "Construct") -> Optional[Profiler]:
+    """
+    Enable profiling if the context key alabcdk:profile of scope is set, and have the
+    trace files written to the outdir of its app. Called by AlabStack.
+    """
+    value = scope.node.try_get_context(PROFILE_CONTEXT_KEY)
+    if value is not None:
+        _enable_from(value)
+    if _profiler is not None and _profiler.outdir is None:
+        # The App; its outdir is the cloud assembly directory.
+        _profiler.outdir = getattr(scope.node.root, "outdir", None)
+    return _profiler
+
+
+def span(name: str, category: str = "alabcdk", **args):
+    """
+    Context manager timing the enclosed block as name; does nothing when profiling is off.
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.span(name, category, **args)
+
+
+def timed_init(init):
+    """
+    Decorator for construct __init__s, timing each construction as <class> with the id
+    as argument.
+    """
+    name = init.__qualname__.rsplit(".", 1)[0]
+
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        if _profiler is None:
+            return init(self, *args, **kwargs)
+        id = args[1] if len(args) > 1 else kwargs.get("id", kwargs.get("construct_id", ""))
+        with _profiler.span(name, "construct", id=id):
+            return init(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _enable_from_environment() -> None:
+    if os.environ.get(PROFILE_ENV):
+        _enable_from(os.environ[PROFILE_ENV])
+        return
+    # The cdk CLI passes the context (cdk.json, -c) in CDK_CONTEXT_JSON.
+    try:
+        context = json.loads(os.environ.get("CDK_CONTEXT_JSON") or "{}")
+    except ValueError:
+        return
+    if context.get(PROFILE_CONTEXT_KEY) is not None:
+        _enable_from(context[PROFILE_CONTEXT_KEY])
+
+
+_enable_from_environment()
@@ -13,10 +13,12 @@ from aws_cdk import (
 from constructs import Construct
 
 from .aws_cloud_resources import redshift_port_number
+from .profiling import timed_init
 from .utils import gen_name, generate_output
 
 
 class RedshiftBase(Construct):
+    @timed_init
     def __init__(
         self,
         scope: Construct,
@@ -72,12 +74,14 @@ class RedshiftBase(Construct):
             secret_string_template=json.dumps(secret_structure),
             generate_string_key="password",
         )
-        set_secret = {
-            "engine": SecretValue.unsafe_plain_text("redshift"),
-            "host": SecretValue.unsafe_plain_text(host),
-            "username": SecretValue.unsafe_plain_text(username),
-            "password": SecretValue.unsafe_plain_text(password),
-        }
+        set_secret = None
+        if password is not None:
+            set_secret = {
+                "engine": SecretValue.unsafe_plain_text("redshift"),
+                "host": SecretValue.unsafe_plain_text(host),
+                "username": SecretValue.unsafe_plain_text(username),
+                "password": SecretValue.unsafe_plain_text(password),
+            }
         cluster_secret = aws_secretsmanager.Secret(
             self,
             gen_name(self, name),
@@ -85,7 +89,7 @@ class RedshiftBase(Construct):
             removal_policy=cdk.RemovalPolicy.DESTROY,
             secret_name=name,
             generate_secret_string=gen_secret if password is None else None,
-            secret_object_value=set_secret if password is not None else None,
+            secret_object_value=set_secret,
         )
         return cluster_secret
 
@@ -155,6 +159,7 @@ class RedshiftCluster(RedshiftBase):
             ],
         )
 
+    @timed_init
     def __init__(
         self,
         scope: Construct,
@@ -229,6 +234,7 @@ class RedshiftServerless(RedshiftBase):
             ],
         )
 
+    @timed_init
     def __init__(
         self,
         scope: Construct,
@@ -0,0 +1,9 @@
+"""
+Code that runs inside the Lambda functions rather than at synth time.
+
+These modules use only the standard library and the boto3 of the Lambda runtime.
+alabcdk ships them to the functions itself, in layers:
+
+- config: alabcdk_config, in the config layer of Function(config_bundle=True)
+- warm_cache: alabcdk_warm_cache, in the runtime layer of Function(warm_cache=True)
+"""
@@ -0,0 +1,80 @@
+"""
+Reader of the config compiled by Function(config_bundle=True), shipped in the function's
+config layer as the module alabcdk_config:
+
+    import alabcdk_config
+    table_name = alabcdk_config.get("orders")
+
+The values are read from the file next to this module on first use, with no network
+calls. Values only known at deploy time are environment variables, so get() falls back
+to os.environ, and code using get() works the same without a config bundle.
+"""
+import json
+import os
+import re
+from typing import Dict, Optional
+
+CONFIG_FILE = "alabcdk-config.json"
+FORMAT_VERSION = 1
+# Set on the function when a value depends on the account.
+ACCOUNT_ENV = "ALABCDK_ACCOUNT"
+
+_PSEUDO = re.compile(r"\$\{AWS::(AccountId|Region|Partition|URLSuffix)\}")
+_config: Optional[dict] = None
+
+
+def _pseudo(name: str) -> str:
+    region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION", "")
+    if name == "Region":
+        return region
+    if name == "AccountId":
+        return os.environ.get(ACCOUNT_ENV, "")
+    china = region.startswith("cn-")
+    if name == "Partition":
+        return "aws-cn" if china else "aws-us-gov" if region.startswith("us-gov-") else "aws"
+    return "amazonaws.com.cn" if china else "amazonaws.com"
+
+
+def load(filename: str = None) -> dict:
+    """
+    The compiled config, {"version": 1, "values": {...}, "parameters": {...}}, read once.
+    An empty config if there is no config file.
+    """
+    global _config
+    if _config is None or filename:
+        filename = filename or os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG_FILE)
+        try:
+            with open(filename) as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {"version": FORMAT_VERSION, "values": {}, "parameters": {}}
+        if config.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{filename} has config version {config.get('version')}, expected {FORMAT_VERSION}.")
+        substitute = (lambda value: _PSEUDO.sub(lambda m: _pseudo(m.group(1)), value))
+        config["values"] = {k: substitute(v) for k, v in config.get("values", {}).items()}
+        _config = config
+    return _config
+
+
+def get(key: str, default: str = None) -> Optional[str]:
+    """
+    The value of key, from the compiled config or else the environment.
+    """
+    values = load()["values"]
+    if key in values:
+        return values[key]
+    return os.environ.get(key, default)
+
+
+def parameter(name: str) -> Optional[str]:
+    """
+    The value of the SSM parameter name if it was known at synth time, else None (read it from SSM).
+    """
+    return load().get("parameters", {}).get(name)
+
+
+def values() -> Dict[str, str]:
+    """
+    All compiled values.
+    """
+    return dict(load()["values"])
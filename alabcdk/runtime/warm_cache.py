@@ -0,0 +1,313 @@
+"""
+Caches that survive warm invocations of a Lambda function, shipped to Function(warm_cache=True)
+as the module alabcdk_warm_cache:
+
+    import alabcdk_warm_cache as warm_cache
+
+    def main(event, context):
+        dynamodb = warm_cache.client("dynamodb")
+        prices = warm_cache.s3_cache().load(os.environ["files"], "prices.json", parse_prices)
+        ...
+        logger.info(warm_cache.stats())
+
+- client(): boto3 clients, created once per container.
+- memoize: results of a function by its arguments, for the life of the container.
+- S3Cache: S3 objects as files in /tmp, revalidated with their ETag (a GET answered
+  with 304 Not Modified when unchanged) and evicted least recently used first, within a
+  share of the ephemeral storage of the function that all S3Caches of the container use
+  together. S3Cache.load() keeps what is computed
+  from an object until the object changes.
+
+boto3 is imported on first use of client(). S3Cache takes any client with get_object, so
+it can be tested against a local S3 (moto, MinIO, with client("s3", endpoint_url=...) or
+the AWS_ENDPOINT_URL_S3 environment variable) or a stand-in object.
+"""
+import collections
+import functools
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "alabcdk-s3-cache")
+# Share of /tmp, which is the configured ephemeral storage, the S3 caches may use together.
+DEFAULT_STORAGE_FRACTION = 0.5
+_CHUNK_SIZE = 1024 * 1024
+
+_counters: Dict[str, int] = collections.Counter()
+_clients: Dict[Tuple, Any] = {}
+# Reentrant: s3_cache() creates an S3Cache while holding it.
+_lock = threading.RLock()
+_default_s3_cache: Optional["S3Cache"] = None
+# Cache directories emptied by this process, and numbers for the subdirectories of its caches.
+_cleared = set()
+_instances = itertools.count()
+# The budgets of the S3Caches without max_bytes, per file system (st_dev).
+_budgets: Dict[int, "_Budget"] = {}
+
+
+def stats() -> Dict[str, int]:
+    """
+    Hit and miss counts since the container started, e.g. {"s3.hits": 3, "s3.misses": 1, ...}.
+    """
+    return dict(sorted(_counters.items()))
+
+
+def reset_stats() -> None:
+    _counters.clear()
+
+
+def client(service: str, **kwargs):
+    """
+    A boto3 client for service, created once per container for the same arguments.
+    """
+    key = (service, tuple(sorted(kwargs.items())))
+    with _lock:
+        if key in _clients:
+            _counters["client.hits"] += 1
+        else:
+            _counters["client.misses"] += 1
+            import boto3
+            _clients[key] = boto3.client(service, **kwargs)
+        return _clients[key]
+
+
+def memoize(function: Callable) -> Callable:
+    """
+    Decorator caching the results of function by its (hashable) arguments in the container.
+    Counted as "memoize.hits" and "memoize.misses".
+    """
+    results: Dict[Tuple, Any] = {}
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        if key in results:
+            _counters["memoize.hits"] += 1
+            return results[key]
+        _counters["memoize.misses"] += 1
+        result = results[key] = function(*args, **kwargs)
+        return result
+
+    wrapper.cache_clear = results.clear
+    return wrapper
+
+
+class _Entry:
+    def __init__(self, path: str, etag: str, size: int):
+        self.path = path
+        self.etag = etag
+        self.size = size
+        self.validated = self.used = time.monotonic()
+
+
+class _Budget:
+    """
+    Storage shared by S3Caches: at most max_bytes for their objects together, evicted least
+    recently used first over all of them. The caches share its lock.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.caches = []
+        self.lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return sum(cache.size for cache in self.caches)
+
+    def evict(self, incoming: int) -> None:
+        """
+        Remove the least recently used objects until incoming more bytes fit.
+        """
+        total = self.size
+        while total + incoming > self.max_bytes:
+            caches = [cache for cache in self.caches if cache._entries]
+            if not caches:
+                return
+            cache = min(caches, key=lambda cache: next(iter(cache._entries.values())).used)
+            bucket, key = next(iter(cache._entries))
+            total -= cache._entries[(bucket, key)].size
+            cache._discard(bucket, key)
+            _counters["s3.evictions"] += 1
+
+
+class S3Cache:
+    """
+    S3 objects cached as files, see the module documentation.
+
+    Counted as "s3.hits" (served from /tmp, unchanged or within max_age), "s3.misses"
+    (downloaded), "s3.evictions", "s3.bytes_downloaded", and "load.hits" and "load.misses".
+    """
+
+    def __init__(
+            self,
+            *,
+            directory: str = DEFAULT_DIRECTORY,
+            max_bytes: int = None,
+            max_age: float = 0,
+            client=None):
+        """
+        :param directory: where the objects are stored, in a subdirectory per S3Cache.
+            Files there from before this process are removed when the first S3Cache of the
+            process uses directory.
+        :param max_bytes: the most the cached objects of this cache may take together. By
+            default the caches on the same file system share DEFAULT_STORAGE_FRACTION of its
+            size, which for /tmp is the ephemeral storage configured for the function.
+        :param max_age: seconds an object is served without revalidating its ETag. With 0
+            every read checks S3, which transfers no data when the object is unchanged.
+        :param client: the S3 client, defaults to client("s3").
+        """
+        with _lock:
+            if directory not in _cleared:
+                shutil.rmtree(directory, ignore_errors=True)
+                _cleared.add(directory)
+            self.directory = os.path.join(directory, f"{os.getpid()}-{next(_instances)}")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_age = max_age
+        self._client = client
+        self._entries: "collections.OrderedDict[Tuple[str, str], _Entry]" = collections.OrderedDict()
+        self._loaded: Dict[Tuple[str, str, Callable], Tuple[str, Any]] = {}
+        if max_bytes is None:
+            with _lock:
+                device = os.stat(directory).st_dev
+                if device not in _budgets:
+                    _budgets[device] = _Budget(int(shutil.disk_usage(directory).total * DEFAULT_STORAGE_FRACTION))
+                self._budget = _budgets[device]
+        else:
+            self._budget = _Budget(max_bytes)
+        self._lock = self._budget.lock
+        with self._lock:
+            self._budget.caches.append(self)
+
+    @property
+    def max_bytes(self) -> int:
+        return self._budget.max_bytes
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = client("s3")
+        return self._client
+
+    @property
+    def size(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def path(self, bucket: str, key: str) -> str:
+        """
+        The local file with the current content of s3://bucket/key. Valid until the next call
+        of this cache, which may evict it; copy it if it must stay.
+        """
+        with self._lock:
+            return self._get(bucket, key).path
+
+    def read_bytes(self, bucket: str, key: str) -> bytes:
+        with self._lock:
+            with open(self._get(bucket, key).path, "rb") as f:
+                return f.read()
+
+    def etag(self, bucket: str, key: str) -> str:
+        """
+        The ETag of the current content of s3://bucket/key, e.g. to memoize what is computed from it.
+        """
+        with self._lock:
+            return self._get(bucket, key).etag
+
+    def load(self, bucket: str, key: str, loader: Callable[[str], Any]) -> Any:
+        """
+        loader(path of s3://bucket/key), computed again only when the object changed.
+        """
+        with self._lock:
+            entry = self._get(bucket, key)
+            loaded = self._loaded.get((bucket, key, loader))
+            if loaded is not None and loaded[0] == entry.etag:
+                _counters["load.hits"] += 1
+                return loaded[1]
+            _counters["load.misses"] += 1
+            value = loader(entry.path)
+            self._loaded[(bucket, key, loader)] = (entry.etag, value)
+            return value
+
+    def _get(self, bucket: str, key: str) -> _Entry:
+        entry = self._entries.get((bucket, key))
+        if entry is not None and not os.path.exists(entry.path):
+            # Removed behind the cache's back, e.g. by cleaning /tmp.
+            self._discard(bucket, key)
+            entry = None
+        if entry is not None and time.monotonic() - entry.validated < self.max_age:
+            return self._hit(bucket, key, entry)
+        kwargs = {"Bucket": bucket, "Key": key}
+        if entry is not None:
+            kwargs["IfNoneMatch"] = entry.etag
+        try:
+            response = self.client.get_object(**kwargs)
+        except Exception as e:
+            if entry is None or not _not_modified(e):
+                raise
+            entry.validated = time.monotonic()
+            return self._hit(bucket, key, entry)
+        _counters["s3.misses"] += 1
+        self._discard(bucket, key)
+        size = response.get("ContentLength") or 0
+        if size > self.max_bytes:
+            response["Body"].close()
+            raise ValueError(f"s3://{bucket}/{key} is {size} bytes, larger than the cache ({self.max_bytes} bytes).")
+        self._evict(size)
+        path = os.path.join(self.directory, hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest())
+        # Downloaded next to its place, so a failed download never leaves a partial file behind.
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+            try:
+                shutil.copyfileobj(response["Body"], f, _CHUNK_SIZE)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+        entry = _Entry(path, response["ETag"], os.path.getsize(path))
+        _counters["s3.bytes_downloaded"] += entry.size
+        # Again, in case the object had no ContentLength.
+        self._evict(entry.size)
+        self._entries[(bucket, key)] = entry
+        return entry
+
+    def _hit(self, bucket: str, key: str, entry: _Entry) -> _Entry:
+        _counters["s3.hits"] += 1
+        entry.used = time.monotonic()
+        self._entries.move_to_end((bucket, key))
+        return entry
+
+    def _discard(self, bucket: str, key: str) -> None:
+        for loaded in [k for k in self._loaded if k[:2] == (bucket, key)]:
+            del self._loaded[loaded]
+        entry = self._entries.pop((bucket, key), None)
+        if entry is not None and os.path.exists(entry.path):
+            os.unlink(entry.path)
+
+    def _evict(self, incoming: int) -> None:
+        self._budget.evict(incoming)
+
+    def clear(self) -> None:
+        with self._lock:
+            for bucket, key in list(self._entries):
+                self._discard(bucket, key)
+
+
+def _not_modified(error: Exception) -> bool:
+    # botocore.exceptions.ClientError, without importing botocore.
+    code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+    return code in ("304", "NotModified")
+
+
+def s3_cache() -> S3Cache:
+    """
+    The S3Cache of the container, with the defaults.
+    """
+    global _default_s3_cache
+    with _lock:
+        if _default_s3_cache is None:
+            _default_s3_cache = S3Cache()
+        return _default_s3_cache
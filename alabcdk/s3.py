@@ -1,4 +1,5 @@
 from typing import Sequence
+from .profiling import timed_init
 from .utils import (
     gen_name,
     get_params,
@@ -19,6 +20,7 @@ class Bucket(aws_s3.Bucket):
             if isinstance(grantee, aws_lambda.Function):
                 grantee.add_environment(env_var_name, self.bucket_name)
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+from aws_cdk import aws_lambda, aws_ssm, custom_resources
+from constructs import Construct
+
+logger = logging.getLogger("alabcdk")
+
+DEFAULT_NAMESPACE = "alabcdk"
+# value_from_lookup returns this when the parameter does not exist.
+_NOT_PUBLISHED = "not-published"
+
+
+def shared_layer_key(
+    content_hash: str, *, compatible_runtimes: List[aws_lambda.Runtime], architecture: aws_lambda.Architecture
+) -> str:
+    """
+    Identity of a shared layer: its content and the LayerVersion properties that go with it.
+    """
+    blob = json.dumps(
+        [content_hash, sorted(r.name for r in compatible_runtimes), architecture.name], sort_keys=True
+    )
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def parameter_name(key: str, *, namespace: str = DEFAULT_NAMESPACE) -> str:
+    """
+    SSM parameter holding the ARN of the shared layer with key, e.g. /alabcdk/layers/<key>.
+    """
+    return f"/{namespace}/layers/{key}"
+
+
+def lookup_shared_layer(scope: Construct, name: str) -> Optional[str]:
+    """
+    ARN of a published shared layer, read from the SSM parameter name with CDK's context
+    provider, so the result is kept in cdk.context.json and later synths do not depend on
+    the account (cdk context --reset <key> looks again).
+
+    :return: the layer ARN, or None if it is not published, not looked up yet (the cdk CLI
+        looks it up and synthesizes again) or the stack has no concrete account and region.
+    """
+    stack = cdk.Stack.of(scope)
+    if cdk.Token.is_unresolved(stack.account) or cdk.Token.is_unresolved(stack.region):
+        logger.info(f"Stack {stack.stack_name} has no account and region, shared layers are not looked up.")
+        return None
+    try:
+        value = aws_ssm.StringParameter.value_from_lookup(scope, name, _NOT_PUBLISHED)
+    except TypeError:
+        # aws-cdk-lib without default_value fails the synth when the parameter does not exist.
+        logger.warning("Shared layers need aws-cdk-lib with StringParameter.value_from_lookup(default_value).")
+        return None
+    # A dummy value until the cdk CLI has done the lookup.
+    return value if value.startswith("arn:") else None
+
+
+def layer_name_of(arn: str) -> str:
+    """
+    The layer name of arn:<partition>:lambda:<region>:<account>:layer:<name>:<version>.
+    """
+    return arn.split(":")[6]
+
+
+def published_layers(scope: Construct) -> Dict[tuple, aws_lambda.ILayerVersion]:
+    """
+    Layers published by the app of scope that are not deployed yet, keyed on
+    (parameter name, account, region), so other stacks reference them instead of publishing again.
+    """
+    root = scope.node.root
+    layers = getattr(root, "_alabcdk_published_layers", None)
+    if layers is None:
+        layers = root._alabcdk_published_layers = {}
+    return layers
+
+
+def register_shared_layer(scope: Construct, id: str, *, name: str, layer: aws_lambda.ILayerVersion) -> None:
+    """
+    Write the ARN of layer to the SSM parameter name, unless the parameter exists.
+
+    Stacks deploying the same layer at the same time (e.g. two stages) both publish it;
+    the first one to deploy registers its ARN and the other keeps using its own layer
+    until it is synthesized again. The parameter is left in place when the stack is deleted.
+    """
+    stack = cdk.Stack.of(scope)
+    custom_resources.AwsCustomResource(
+        scope,
+        id,
+        on_create=custom_resources.AwsSdkCall(
+            service="SSM",
+            action="putParameter",
+            parameters={
+                "Name": name,
+                "Value": layer.layer_version_arn,
+                "Type": "String",
+                "Overwrite": False,
+                "Description": f"Shared layer, published by {stack.stack_name}",
+            },
+            physical_resource_id=custom_resources.PhysicalResourceId.of(name),
+            ignore_error_codes_matching="ParameterAlreadyExists",
+        ),
+        policy=custom_resources.AwsCustomResourcePolicy.from_sdk_calls(
+            resources=[
+                stack.format_arn(service="ssm", resource="parameter", resource_name=name.lstrip("/"))
+            ]
+        ),
+        install_latest_aws_sdk=False,
+    )
@@ -1,4 +1,5 @@
 from typing import Sequence, List
+from .profiling import timed_init
 from .utils import (gen_name, generate_output)
 from constructs import Construct
 from aws_cdk import (
@@ -14,6 +15,7 @@ class Topic(aws_sns.Topic):
             if isinstance(receiver, aws_lambda.Function):
                 receiver.add_environment(env_var_name, self.topic_arn)
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
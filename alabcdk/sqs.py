@@ -1,4 +1,5 @@
 from typing import Sequence
+from .profiling import timed_init
 from .utils import (gen_name)
 from constructs import Construct
 from aws_cdk import (
@@ -12,8 +13,9 @@ class Queue(aws_sqs.Queue):
         for grantee in grantees:
             grantfunc(grantee)
             if isinstance(grantee, aws_lambda.Function):
-                grantee.add_environment(env_var_name, self.table_name)
+                grantee.add_environment(env_var_name, self.queue_url)
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -27,10 +29,14 @@ class Queue(aws_sqs.Queue):
 
         defaults:
         - queue_name - defaults to gen_name(scope, id) if not set.
+        - env_var_name - defaults to id. Lambda senders and consumers get the queue URL in it.
         """
         kwargs.setdefault('queue_name', gen_name(scope, id))
 
         super().__init__(scope, id, **kwargs)
+        env_var_name = env_var_name or id
+        # Checked against the visibility timeout by alabcdk.perf_lint.
+        self.consumers = list(consumers or [])
 
         self.grant_access(
             grantees=senders or [],
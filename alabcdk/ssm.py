@@ -4,12 +4,15 @@ from constructs import Construct
 from aws_cdk import (
     aws_ssm,
     aws_iam,
+    aws_lambda,
 )
 import aws_cdk as cdk
+from .profiling import timed_init
 from .utils import (gen_name, get_params, generate_output, remove_params)
 
 
 class StringParameter(aws_ssm.StringParameter):
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -47,5 +50,8 @@ class StringParameter(aws_ssm.StringParameter):
 
         for reader in readers + readers_writers:
             self.grant_read(reader)
+            if isinstance(reader, aws_lambda.Function):
+                # With Function(config_bundle=True) the value is bundled as well, see alabcdk_config.parameter().
+                reader.add_environment(env_var_name, self.parameter_name)
         for writer in writers + readers_writers:
             self.grant_write(writer)
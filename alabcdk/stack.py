@@ -1,6 +1,10 @@
+from .gitinfo import git_info
+from . import perf_lint
+from .profiling import enable_from_context, span, timed_init
 from .utils import (generate_output)
 from constructs import Construct
 from aws_cdk import (
+    Aspects,
     Stack)
 import subprocess
 from typing import List
@@ -8,22 +12,24 @@ from typing import List
 
 class AlabStack(Stack):
     def execute(self, cmd: str) -> str:
-        with subprocess.Popen(cmd.split(), stdout=subprocess.PIPE) as proc:
+        with span("AlabStack.execute", "subprocess", cmd=cmd), \
+                subprocess.Popen(cmd.split(), stdout=subprocess.PIPE) as proc:
             res = proc.stdout.read().decode().strip().replace("\t", " ").split("\n")
         return res
 
+    # Git information is read from .git once per process and shared by all stacks,
+    # see alabcdk.gitinfo.
     def git_commit_id(self) -> str:
-        return self.execute("git log --format='%H' -n 1")[0][1:-1]
+        return git_info().commit_id
 
     def git_remotes(self) -> List[str]:
-        res = self.execute("git remote -v")
-        return res
+        return git_info().remotes
 
     def git_tag(self) -> str:
-        return self.execute("git describe --always")[0][1:-1]
+        return git_info().tag
 
     def git_branch(self) -> str:
-        return self.execute("git branch --show-current")[0]
+        return git_info().branch
 
     def add_deploy_info(self, add_git_info: bool) -> None:
         generate_output(self, "STAGE", self.stage)
@@ -35,6 +41,7 @@ class AlabStack(Stack):
             for i, remote in enumerate(self.git_remotes()):
                 generate_output(self, f"git_remote_{i}", remote)
 
+    @timed_init
     def __init__(
             self,
             scope: Construct,
@@ -47,11 +54,28 @@ class AlabStack(Stack):
             add_git_info: bool = True,
             **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
+        # Profiling (see alabcdk.profiling) can be switched on with the context key alabcdk:profile.
+        enable_from_context(self)
         self.stage = stage or "DEV"
         self.user = user or "None"
         self.domain_name = domain_name
         self.hosted_zone = hosted_zone
         self.add_deploy_info(add_git_info)
+        self._perf_lint = None
+        # Perf lint for every stack with the context key alabcdk:perf-lint, see add_perf_lint.
+        perf_lint.enable_from_context(self)
+
+    def add_perf_lint(self, **kwargs) -> perf_lint.PerfLint:
+        """
+        Check the resources of this stack for performance anti-patterns when it is
+        synthesized, see alabcdk.perf_lint. Adding it again returns the PerfLint added first.
+
+        :param kwargs: passed to PerfLint, e.g. levels={"lambda-timeout": "off"}.
+        """
+        if self._perf_lint is None:
+            self._perf_lint = perf_lint.PerfLint(**kwargs)
+            Aspects.of(self).add(self._perf_lint)
+        return self._perf_lint
 
     @property
     def _hosted_zone(self):
@@ -0,0 +1,205 @@
+"""
+Synthesize an app for several stages (and/or stacks) at once, one process per job.
+
+Each job runs the app like the cdk CLI does, with the stage in the context (the app
+passes it on, e.g. AlabStack(stage=app.node.try_get_context("stage"))) and its own
+cloud assembly directory <outdir>/<stage>[-<stack>]. The layer cache, wheelhouse and
+fingerprints are shared between the jobs; they are guarded by file locks. Stacks
+selected with --stacks must be added with IncrementalSynth, which skips the others.
+
+    python -m alabcdk.synth_driver --stages DEV,TEST,PROD
+    python -m alabcdk.synth_driver --stages DEV --stacks Api,Web --jobs 2
+
+Deploy a synthesized stage with cdk deploy --app <outdir>/<stage>.
+"""
+import argparse
+import json
+import logging
+import os
+import pathlib
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .fingerprints import default_out_dir
+from .incremental import CACHE_CONTEXT_KEY, STACKS_CONTEXT_KEY
+
+logger = logging.getLogger("alabcdk")
+
+REPORT_FILE = "synth-report.json"
+DEFAULT_OUTDIR = "cdk.out.stages"
+
+
+class SynthJob:
+    """
+    One synth of the app: a stage and optionally a stack.
+    """
+
+    def __init__(self, stage: str, stack: str = None):
+        self.stage = stage
+        self.stack = stack
+        self.name = f"{stage}-{stack}" if stack else stage
+        self.returncode: Optional[int] = None
+        self.seconds = 0.0
+        self.max_rss_mb = 0.0
+
+    def context(self, base: dict, stage_key: str) -> dict:
+        context = {**base, stage_key: self.stage}
+        # Separate incremental caches, so concurrent jobs never write the same entries.
+        context[CACHE_CONTEXT_KEY] = str(default_out_dir() / "incremental" / self.name)
+        if self.stack:
+            context[STACKS_CONTEXT_KEY] = [self.stack]
+        return context
+
+    def report(self) -> dict:
+        return {
+            "stage": self.stage,
+            "stack": self.stack,
+            "returncode": self.returncode,
+            "seconds": round(self.seconds, 3),
+            "max_rss_mb": round(self.max_rss_mb, 1),
+        }
+
+
+def load_context(directory: pathlib.Path) -> dict:
+    """
+    The context the cdk CLI would pass: cdk.json "context" updated with cdk.context.json.
+    """
+    context = {}
+    cdk_json = directory / "cdk.json"
+    if cdk_json.exists():
+        context.update(json.loads(cdk_json.read_text()).get("context", {}))
+    cdk_context_json = directory / "cdk.context.json"
+    if cdk_context_json.exists():
+        context.update(json.loads(cdk_context_json.read_text()))
+    return context
+
+
+def default_app(directory: pathlib.Path) -> Optional[str]:
+    """
+    The "app" command from cdk.json in directory, None if there is none.
+    """
+    cdk_json = directory / "cdk.json"
+    if cdk_json.exists():
+        return json.loads(cdk_json.read_text()).get("app")
+    return None
+
+
+def run_job(job: SynthJob, *, app: str, context: dict, outdir: pathlib.Path) -> SynthJob:
+    """
+    Run app for job, with its output in outdir/<job.name> and its log in outdir/<job.name>.log.
+    """
+    job_outdir = outdir / job.name
+    job_outdir.mkdir(parents=True, exist_ok=True)
+    log_file = outdir / f"{job.name}.log"
+    env = dict(os.environ, CDK_CONTEXT_JSON=json.dumps(context), CDK_OUTDIR=str(job_outdir))
+    start = time.perf_counter()
+    with open(log_file, "w") as log:
+        process = subprocess.Popen(shlex.split(app), env=env, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # The rusage of the app and the processes it waited for (the jsii runtime); kilobytes on Linux.
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            job.max_rss_mb = rusage.ru_maxrss / 1024
+        else:
+            process.wait()
+    job.seconds = time.perf_counter() - start
+    job.returncode = process.returncode
+    failed = f", exit code {job.returncode}" if job.returncode else ""
+    logger.info(f"Synthesized {job.name} in {job.seconds:.1f}s{failed}.")
+    return job
+
+
+def synth(
+        *,
+        app: str,
+        stages: List[str],
+        stacks: List[str] = None,
+        jobs: int = None,
+        stage_key: str = "stage",
+        context: Dict[str, str] = None,
+        outdir: str = DEFAULT_OUTDIR) -> List[SynthJob]:
+    """
+    Synthesize app once per stage, or once per stage and stack, in parallel processes.
+
+    :param app: command running the app, as "app" in cdk.json.
+    :param stages: the stages to synthesize.
+    :param stacks: IncrementalSynth stack ids to synthesize separately. Defaults to all stacks in one job per stage.
+    :param jobs: number of concurrent synths. Defaults to the number of CPUs.
+    :param stage_key: context key the app reads the stage from.
+    :param context: extra context, on top of cdk.json and cdk.context.json.
+    :param outdir: directory for the cloud assemblies, logs and the report.
+    :return: the jobs, in order, with their exit codes and timings.
+    """
+    base = {**load_context(pathlib.Path.cwd()), **(context or {})}
+    outdir = pathlib.Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    synth_jobs = [SynthJob(stage, stack) for stage in stages for stack in (stacks or [None])]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(run_job, job, app=app, context=job.context(base, stage_key), outdir=outdir)
+            for job in synth_jobs
+        ]
+        for future in futures:
+            future.result()
+    seconds = time.perf_counter() - start
+    with open(outdir / REPORT_FILE, "w") as f:
+        json.dump({"seconds": round(seconds, 3), "jobs": [job.report() for job in synth_jobs]}, f, indent=2)
+    return synth_jobs
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m alabcdk.synth_driver", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--app", help="command running the app, default: \"app\" from cdk.json")
+    parser.add_argument("--stages", required=True, help="comma separated stages, e.g. DEV,TEST,PROD")
+    parser.add_argument("--stacks", help="comma separated stack ids, each synthesized in its own job")
+    parser.add_argument("--jobs", "-j", type=int, help="concurrent synths, default: number of CPUs")
+    parser.add_argument("--stage-key", default="stage", help="context key the app reads the stage from")
+    parser.add_argument("--context", "-c", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--outdir", "-o", default=DEFAULT_OUTDIR)
+    args = parser.parse_args(argv)
+
+    app = args.app or default_app(pathlib.Path.cwd())
+    if not app:
+        parser.error("no --app and no \"app\" in cdk.json")
+    context = {}
+    for item in args.context:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"context must be KEY=VALUE, not '{item}'")
+        context[key] = value
+
+    start = time.perf_counter()
+    synth_jobs = synth(
+        app=app,
+        stages=_split(args.stages),
+        stacks=_split(args.stacks),
+        jobs=args.jobs,
+        stage_key=args.stage_key,
+        context=context,
+        outdir=args.outdir,
+    )
+    total = time.perf_counter() - start
+
+    print(f"{'job':24} {'seconds':>8} {'rss MB':>8}  result")
+    for job in synth_jobs:
+        result = "ok" if job.returncode == 0 else f"failed ({job.returncode}), see {args.outdir}/{job.name}.log"
+        print(f"{job.name:24} {job.seconds:8.1f} {job.max_rss_mb:8.0f}  {result}")
+    busy = sum(job.seconds for job in synth_jobs)
+    print(f"{len(synth_jobs)} synths in {total:.1f}s ({busy:.1f}s one after another)")
+    return 0 if all(job.returncode == 0 for job in synth_jobs) else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(main())
@@ -1,17 +1,26 @@
 import sys
 import os
-import uuid
+import re
+import difflib
+import functools
 import logging
 from inspect import signature
-from typing import Sequence
+from typing import Dict, Sequence, Tuple
 import aws_cdk as cdk
+import jsii
 from constructs import Construct
 from aws_cdk import (
-    Stack
+    Stack,
+    aws_ssm,
 )
 
 _DEFAULT_LOGLEVEL = "INFO"
 
+# Context key selecting how generate_output publishes values: "individual" (default),
+# "manifest" (one CfnOutput per stack) or "ssm" (one SSM parameter per stack).
+OUTPUTS_CONTEXT_KEY = "alabcdk:outputs"
+_OUTPUT_MODES = ("individual", "manifest", "ssm")
+
 
 def gen_name(
         scope: Construct,
@@ -39,7 +48,80 @@ def gen_name(
 
 
 def generate_output(scope, name: str, value):
-    cdk.CfnOutput(scope, "X"+str(uuid.uuid4()), value=f"{name}={value}")
+    """
+    Publish name=value for scope.
+
+    By default this is a CfnOutput with an id derived from name, so the template
+    does not change between synths. With the context value "alabcdk:outputs" set to
+    "manifest" or "ssm", all values of a stack are collected in one JSON document
+    instead, published as the CfnOutput AlabOutputs or as the SSM parameter
+    gen_name(stack, "outputs"). This keeps large stacks below the output limit.
+    """
+    mode = scope.node.try_get_context(OUTPUTS_CONTEXT_KEY) or "individual"
+    if mode not in _OUTPUT_MODES:
+        raise ValueError(f"Context '{OUTPUTS_CONTEXT_KEY}' must be one of {', '.join(_OUTPUT_MODES)}, not '{mode}'.")
+    if mode == "individual":
+        output_id = _unique_id(scope, "Output" + re.sub(r"[^A-Za-z0-9]", "", name))
+        cdk.CfnOutput(scope, output_id, value=f"{name}={value}")
+    else:
+        _OutputManifest.of(scope, mode=mode).add(name, value)
+
+
+def _unique_id(scope: Construct, id: str) -> str:
+    result = id
+    n = 1
+    while scope.node.try_find_child(result) is not None:
+        n += 1
+        result = f"{id}{n}"
+    return result
+
+
+class _OutputManifest(Construct):
+    """
+    Collects the values of generate_output for a stack into a single JSON document.
+    """
+
+    @classmethod
+    def of(cls, scope: Construct, *, mode: str) -> "_OutputManifest":
+        stack = Stack.of(scope)
+        return stack.node.try_find_child("AlabOutputs") or cls(stack, "AlabOutputs", mode=mode)
+
+    def __init__(self, scope: Construct, id: str, *, mode: str):
+        super().__init__(scope, id)
+        self.values = {}
+        value = cdk.Lazy.string(_ManifestProducer(self))
+        if mode == "ssm":
+            aws_ssm.CfnParameter(
+                self,
+                "Parameter",
+                type="String",
+                name=gen_name(scope, "outputs"),
+                value=value,
+                tier="Intelligent-Tiering",
+            )
+        else:
+            cdk.CfnOutput(self, "Manifest", value=value)
+
+    def add(self, name: str, value) -> None:
+        """
+        Add name=value. A name added again with another value gets a #<n> suffix.
+        """
+        key = name
+        n = 1
+        while key in self.values and self.values[key] != value:
+            n += 1
+            key = f"{name}#{n}"
+        self.values[key] = value
+
+
+@jsii.implements(cdk.IStableStringProducer)
+class _ManifestProducer:
+    def __init__(self, manifest: _OutputManifest):
+        self.manifest = manifest
+
+    def produce(self) -> str:
+        values = {k: str(v) for k, v in sorted(self.manifest.values.items())}
+        return Stack.of(self.manifest).to_json_string(values)
 
 
 def stage_based_removal_policy(scope) -> cdk.RemovalPolicy:
@@ -75,11 +157,17 @@ def get_params(allvars: dict) -> dict:
     assert ("kwargs" in allvars)
     kwargs = allvars.get("kwargs")
     kwargs = kwargs or {}
-    cls = type(allvars["self"])
+    names = _keyword_only_params(type(allvars["self"]))
+    return {**{k: allvars[k] for k in names if k in allvars}, **kwargs}
+
+
+@functools.lru_cache(maxsize=None)
+def _keyword_only_params(cls: type) -> Tuple[str, ...]:
+    """
+    Names of the keyword-only parameters of cls.__init__, inspected once per class.
+    """
     parameters = signature(cls.__init__).parameters
-    return {**{k: v for (k, v) in allvars.items()
-            if parameters.get(k)
-            and parameters[k].kind == parameters[k].KEYWORD_ONLY}, **kwargs}
+    return tuple(k for k, p in parameters.items() if p.kind == p.KEYWORD_ONLY)
 
 
 def filter_kwargs(kwargs: dict, filter: str) -> dict:
@@ -101,6 +189,78 @@ def filter_kwargs(kwargs: dict, filter: str) -> dict:
     return {k.replace(filter, "", 1): v for (k, v) in kwargs.items() if k.startswith(filter)}
 
 
+class RoutingPlan:
+    """
+    How the kwargs of a construct class are split between the parts it creates.
+
+    A plan is made once per class and set of prefixes (see routing_plan), after which
+    route() sorts a kwargs dict in a single pass.
+    """
+
+    def __init__(self, cls: type, prefixes: Sequence[str]):
+        self.cls = cls
+        # Longest first, so a prefix that starts with another prefix wins.
+        self.prefixes = tuple(sorted(prefixes, key=len, reverse=True))
+        self.own = frozenset(_keyword_only_params(cls))
+
+    def route(self, kwargs: dict) -> Tuple[Dict[str, dict], Dict[str, str]]:
+        """
+        Split kwargs (e.g. from get_params) by prefix, removing the prefix from the keys.
+
+        :return: ({prefix: {key: value}}, {unrouted key: message}). Keys starting with a
+            prefix are routed, keyword-only parameters of the class included (as with
+            filter_kwargs); other keys that are not such parameters are unrouted.
+        """
+        routed = {prefix: {} for prefix in self.prefixes}
+        unrouted = {}
+        for k, v in kwargs.items():
+            for prefix in self.prefixes:
+                if k.startswith(prefix):
+                    routed[prefix][k[len(prefix):]] = v
+                    break
+            else:
+                if k not in self.own:
+                    unrouted[k] = self.explain(k)
+        return routed, unrouted
+
+    def explain(self, key: str) -> str:
+        message = f"{self.cls.__name__}: ignoring unknown argument '{key}'"
+        head, sep, tail = key.partition("_")
+        close = difflib.get_close_matches(head + sep, self.prefixes, n=1, cutoff=0.6) if sep else []
+        if close:
+            message += f", did you mean '{close[0]}{tail}'?"
+        else:
+            message += f". Arguments for the parts must start with one of {', '.join(sorted(self.prefixes))}."
+        return message
+
+
+@functools.lru_cache(maxsize=None)
+def routing_plan(cls: type, prefixes: Tuple[str, ...]) -> RoutingPlan:
+    """
+    The (cached) RoutingPlan for cls and prefixes.
+    """
+    return RoutingPlan(cls, prefixes)
+
+
+def route_kwargs(construct: Construct, kwargs: dict, prefixes: Sequence[str]) -> Dict[str, dict]:
+    """
+    Split kwargs (from get_params) of construct by prefix in a single pass, using the
+    cached RoutingPlan of its class. Unknown or misspelled arguments are reported as
+    warnings on construct when the app is synthesized, instead of being dropped silently.
+
+    Example:
+    >>>route_kwargs(self, {"lambda_memory_size": 256, "lamda_timeout": 3}, ["lambda_", "method_"])
+    {'lambda_': {'memory_size': 256}, 'method_': {}}
+    and a warning: ignoring unknown argument 'lamda_timeout', did you mean 'lambda_timeout'?
+
+    :return: {prefix: {key without prefix: value}}, in the order of prefixes.
+    """
+    routed, unrouted = routing_plan(type(construct), tuple(prefixes)).route(kwargs)
+    for message in unrouted.values():
+        cdk.Annotations.of(construct).add_warning(message)
+    return {prefix: routed[prefix] for prefix in prefixes}
+
+
 def remove_params(kwargs: dict, params: Sequence[str]):
     """
     Remove entries from a dictionary
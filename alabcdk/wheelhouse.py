@@ -0,0 +1,108 @@
+import logging
+import pathlib
+import shutil
+import threading
+from typing import Callable, List
+
+from .file_lock import file_lock
+from .layer_cache import build_key, default_cache_dir, link_or_copy
+
+logger = logging.getLogger("alabcdk")
+
+
+class Wheelhouse:
+    """
+    Local directory of wheels that layers are installed from without index access.
+
+    Every requirement set is downloaded into the wheelhouse once (per target platform),
+    after which pip only reads from the wheelhouse. Wheels already present are not
+    downloaded again, so related requirement sets mostly share their downloads.
+
+    In offline mode nothing is downloaded at all; the wheelhouse must have been filled
+    beforehand, e.g. by seeding it from a directory of wheels shipped with the project:
+
+        wheelhouse = alabcdk.Wheelhouse(seed_dirs=["vendor/wheels"], offline=True)
+        alabcdk.PipLayers(self, "layers", layers={...}, wheelhouse=wheelhouse)
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        *,
+        offline: bool = False,
+        seed_dirs: List[str] = None,
+    ):
+        """
+        :param path: wheelhouse directory. Defaults to <default_cache_dir()>/wheelhouse.
+        :param offline: never contact a package index.
+        :param seed_dirs: directories with *.whl files to copy into the wheelhouse.
+        """
+        self.path = pathlib.Path(path) if path else default_cache_dir() / "wheelhouse"
+        self.offline = offline
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        for seed_dir in seed_dirs or []:
+            self.seed(seed_dir)
+
+    def seed(self, directory: str) -> int:
+        """
+        Copy (hardlink when possible) all wheels in directory that are not already present.
+
+        :return: number of wheels added.
+        """
+        added = 0
+        for wheel in sorted(pathlib.Path(directory).glob("*.whl")):
+            target = self.path / wheel.name
+            if not target.exists():
+                link_or_copy(str(wheel), str(target))
+                added += 1
+        logger.info(f"Seeded wheelhouse {self.path} with {added} wheels from '{directory}'.")
+        return added
+
+    def install_args(self) -> List[str]:
+        """
+        Arguments that make pip install exclusively from the wheelhouse.
+        """
+        return ["--no-index", "--find-links", str(self.path)]
+
+    def ensure(
+        self,
+        requirements_file: str,
+        *,
+        platform: str,
+        run: Callable[[List[str]], None],
+    ) -> None:
+        """
+        Make sure all wheels needed for requirements_file are in the wheelhouse.
+
+        :param requirements_file: pip requirements file.
+        :param platform: pip --platform the wheels are for.
+        :param run: callable executing a command line, raising on failure.
+        """
+        with open(requirements_file) as f:
+            key = build_key(requirements=f.read(), platform=platform)
+        stamp = self.path / ".resolved" / key
+        if stamp.exists() or self.offline:
+            return
+
+        # Parallel layer builds and synths share the directory; let pip download one set at a time.
+        with self._lock, file_lock(self.path / ".lock"):
+            if stamp.exists():
+                return
+            run([
+                "pip", "download",
+                "-r", requirements_file,
+                "-d", str(self.path),
+                "--platform", platform,
+                "--only-binary=:all:",
+                "--quiet",
+            ])
+            stamp.parent.mkdir(exist_ok=True)
+            stamp.touch()
+
+    def clear(self) -> None:
+        """
+        Remove all wheels and resolution stamps.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True, exist_ok=True)
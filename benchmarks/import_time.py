@@ -0,0 +1,74 @@
+"""
+Import time of alabcdk, lazy versus loading every construct.
+
+Each scenario runs in a fresh interpreter, several times, and the median wall
+time is reported. The "-X importtime" breakdown of one run shows the slowest
+modules of a scenario.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --json import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = {
+    "import alabcdk": "import alabcdk",
+    "Function and Table": "import alabcdk; alabcdk.Function; alabcdk.Table",
+    "all constructs": "import alabcdk; [getattr(alabcdk, name) for name in alabcdk.__all__]",
+}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code: str) -> float:
+    env = dict(os.environ, PYTHONPATH=ROOT, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def slowest_modules(code: str, n: int = 5) -> list:
+    env = dict(os.environ, PYTHONPATH=ROOT, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], env=env, check=True, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        # import time: self [us] | cumulative | imported package
+        self_us, _, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            rows.append((int(self_us), name.strip()))
+    return [f"{name} {us / 1e6:.2f}s" for us, name in sorted(rows, reverse=True)[:n]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        times = [run(code) for _ in range(args.repeat)]
+        results[name] = {
+            "median": statistics.median(times),
+            "min": min(times),
+            "slowest_modules": slowest_modules(code),
+        }
+        print(f"{name:20} median {results[name]['median']:.2f}s  min {results[name]['min']:.2f}s")
+        print(f"{'':20} {', '.join(results[name]['slowest_modules'])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Synth time and memory of alabcdk apps.
+
+Each scenario builds a parameterized app and synthesizes it offline (no account, no
+lookups, layers installed from an offline wheelhouse) in a fresh interpreter. The wheels
+of the pinned layer requirements are downloaded into --wheelhouse once, before measuring.
+Per scenario the median over --repeat runs is reported of:
+
+- wall: wall time of the whole interpreter, including starting the jsii runtime
+- import, construct, synth: time spent importing alabcdk, building the construct
+  tree and in app.synth()
+- rss_python_mb, rss_node_mb: peak RSS of the interpreter and of the jsii node process
+
+    python benchmarks/synth_bench.py --size 10 --json synth.json
+    python benchmarks/synth_bench.py --size 10 --baseline synth.json --tolerance 0.15
+
+With --baseline the results are compared against an earlier --json file and the exit
+status is 1 if a metric got more than --tolerance (relative) worse.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METRICS = ["wall", "import", "construct", "synth", "rss_python_mb", "rss_node_mb"]
+DEFAULT_WHEELHOUSE = os.path.join(tempfile.gettempdir(), "alabcdk-synth-bench-wheelhouse")
+# Layers of the functions scenario: pinned, pure Python and without dependencies, so the
+# same wheels install for every platform and the layers do not change between runs.
+REQUIREMENTS = {
+    "utils": ["attrs==23.2.0", "tabulate==0.9.0"],
+    "data": ["idna==3.7", "pytz==2024.1"],
+}
+
+
+def functions(app, size: int, workdir: str):
+    """
+    size Functions sharing two PipLayers layers, see REQUIREMENTS.
+    """
+    import alabcdk
+
+    stack = alabcdk.AlabStack(app, "Functions", add_git_info=False)
+    layers = alabcdk.PipLayers(
+        stack,
+        "layers",
+        layers={id: _requirements(workdir, id) for id in REQUIREMENTS},
+        wheelhouse=alabcdk.Wheelhouse(os.environ["SYNTH_BENCH_WHEELHOUSE"], offline=True),
+    )
+    for i in range(size):
+        _handler(workdir, f"fn{i}")
+        alabcdk.Function(stack, f"fn{i}", layers=layers.layers)
+
+
+def resources(app, size: int, workdir: str):
+    """
+    size each of Table, Bucket, Queue and Topic, all granted to one Function.
+    """
+    import alabcdk
+
+    stack = alabcdk.AlabStack(app, "Resources", add_git_info=False)
+    _handler(workdir, "worker")
+    worker = alabcdk.Function(stack, "worker")
+    for i in range(size):
+        alabcdk.Table(stack, f"table{i}", readers_writers=[worker])
+        alabcdk.Bucket(stack, f"bucket{i}", readers=[worker])
+        alabcdk.Queue(stack, f"queue{i}", senders=[worker])
+        alabcdk.Topic(stack, f"topic{i}", publishers=[worker])
+
+
+def website(app, size: int, workdir: str):
+    """
+    size Websites behind CloudFront, with an existing certificate.
+    """
+    import alabcdk
+    from aws_cdk import aws_certificatemanager
+
+    stack = alabcdk.AlabStack(app, "Website", add_git_info=False)
+    certificate = aws_certificatemanager.Certificate.from_certificate_arn(
+        stack, "certificate", "arn:aws:acm:us-east-1:123456789012:certificate/bench"
+    )
+    for i in range(size):
+        alabcdk.Website(
+            stack,
+            f"site{i}",
+            domain_name=f"site{i}.example.com",
+            hosted_zone_id="Z0000000BENCH",
+            certificate=certificate,
+            web_bucket_name=f"webcontent{i}",
+        )
+
+
+def redshift(app, size: int, workdir: str):
+    """
+    size RedshiftServerless, each in its own stack (names are fixed per stack).
+    """
+    import alabcdk
+
+    for i in range(size):
+        stack = alabcdk.AlabStack(app, f"Redshift{i}", add_git_info=False)
+        alabcdk.RedshiftServerless(
+            stack, "redshift", db_name="bench", master_username="bench", aws_region="eu-west-1"
+        )
+
+
+def stacks(app, size: int, workdir: str):
+    """
+    size AlabStacks with git deploy info, a Function and a Table each.
+    """
+    import alabcdk
+
+    _handler(workdir, "fn")
+    for i in range(size):
+        stack = alabcdk.AlabStack(app, f"Stack{i}")
+        alabcdk.Table(stack, "table", readers=[alabcdk.Function(stack, "fn")])
+
+
+SCENARIOS = {f.__name__: f for f in [functions, resources, website, redshift, stacks]}
+
+
+def _handler(workdir: str, id: str) -> None:
+    os.makedirs(os.path.join(workdir, id), exist_ok=True)
+    with open(os.path.join(workdir, id, f"{id}.py"), "w") as f:
+        f.write("def main(event, context):\n    return event\n")
+
+
+def _requirements(workdir: str, id: str) -> str:
+    filename = os.path.join(workdir, f"requirements_{id}.txt")
+    with open(filename, "w") as f:
+        f.write("".join(f"{requirement}\n" for requirement in REQUIREMENTS[id]))
+    return filename
+
+
+def download_wheels(wheelhouse: str) -> None:
+    """
+    Download the wheels of REQUIREMENTS into wheelhouse, unless they are there already.
+    """
+    requirements = [requirement for layer in REQUIREMENTS.values() for requirement in layer]
+    os.makedirs(wheelhouse, exist_ok=True)
+    present = {name.lower() for name in os.listdir(wheelhouse)}
+    missing = [r for r in requirements if not any(n.startswith(r.replace("==", "-").lower()) for n in present)]
+    if missing:
+        subprocess.run(
+            [sys.executable, "-m", "pip", "download", "--quiet", "--only-binary=:all:", "--no-deps",
+             "-d", wheelhouse, *missing],
+            check=True,
+        )
+
+
+def _node_peak_rss_mb() -> float:
+    """
+    Peak RSS of all descendant processes still running (the jsii node runtime, which
+    runs in a second node process), from /proc.
+    """
+    children = {}
+    peak = {}
+    for pid in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        children.setdefault(int(status["PPid"]), []).append(int(pid))
+        peak[int(pid)] = int(status.get("VmHWM", "0 kB").split()[0])
+    result = 0
+    todo = list(children.get(os.getpid(), []))
+    while todo:
+        pid = todo.pop()
+        result += peak[pid]
+        todo.extend(children.get(pid, []))
+    return result / 1024
+
+
+def run_scenario(name: str, size: int, workdir: str) -> dict:
+    """
+    Build and synthesize scenario name in this interpreter; meant to run in a fresh one.
+    """
+    os.chdir(workdir)
+    start = time.perf_counter()
+    import aws_cdk as cdk
+    import alabcdk  # noqa: F401
+    imported = time.perf_counter()
+    app = cdk.App(outdir=os.path.join(workdir, "cdk.out"))
+    SCENARIOS[name](app, size, workdir)
+    constructed = time.perf_counter()
+    app.synth()
+    synthesized = time.perf_counter()
+    return {
+        "import": imported - start,
+        "construct": constructed - imported,
+        "synth": synthesized - constructed,
+        "constructs": len(app.node.find_all()),
+        # kilobytes on Linux
+        "rss_python_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_node_mb": _node_peak_rss_mb(),
+    }
+
+
+def measure(name: str, size: int, wheelhouse: str) -> dict:
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1",
+        SYNTH_BENCH_WHEELHOUSE=wheelhouse,
+    )
+    env.pop("CDK_CONTEXT_JSON", None)
+    with tempfile.TemporaryDirectory(prefix="synth_bench_") as workdir:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run", name, "--size", str(size), "--workdir", workdir],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{result.stderr}")
+    return {"wall": wall, **json.loads(result.stdout.splitlines()[-1])}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    :return: descriptions of the metrics that are more than tolerance worse than baseline.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if before.get("size") != metrics["size"]:
+            print(f"{name}: baseline has size {before.get('size')}, not comparing")
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), metrics[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change > tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+            print(f"{name:10} {metric:14} {old:9.2f} -> {new:9.2f} {change:+6.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)}, default: all")
+    parser.add_argument("--size", type=int, default=10, help="number of constructs per scenario")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against the results in this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument(
+        "--wheelhouse", default=DEFAULT_WHEELHOUSE, help="where the wheels of the functions scenario are kept"
+    )
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.run:
+        print(json.dumps(run_scenario(args.run, args.size, args.workdir)))
+        return
+
+    scenarios = args.scenarios or list(SCENARIOS)
+    if "functions" in scenarios:
+        download_wheels(args.wheelhouse)
+
+    results = {}
+    for name in scenarios:
+        runs = [measure(name, args.size, args.wheelhouse) for _ in range(args.repeat)]
+        results[name] = {
+            "size": args.size,
+            "constructs": runs[0]["constructs"],
+            **{metric: statistics.median(run[metric] for run in runs) for metric in METRICS},
+        }
+        r = results[name]
+        print(
+            f"{name:10} {r['constructs']:5} constructs  wall {r['wall']:.2f}s  import {r['import']:.2f}s"
+            f"  construct {r['construct']:.2f}s  synth {r['synth']:.2f}s"
+            f"  rss python {r['rss_python_mb']:.0f}MB node {r['rss_node_mb']:.0f}MB"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "scenarios": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
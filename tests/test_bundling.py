@@ -0,0 +1,137 @@
+import pytest
+
+from alabcdk.bundling import bundle_modules, extension_suffixes
+
+SUFFIXES = extension_suffixes("python3.12", "x86_64")
+
+
+def write(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def install(layer, name, files):
+    """
+    Write files into layer as pip install -t would, with a .dist-info listing them.
+    """
+    write(layer, files)
+    dist_info = layer / f"{name}-1.0.dist-info"
+    write(dist_info, {"METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n"})
+    record = [*files, f"{dist_info.name}/METADATA", f"{dist_info.name}/RECORD"]
+    (dist_info / "RECORD").write_text("".join(f"{path},,\n" for path in record))
+
+
+def bundle(tmp_path, handler, **kwargs):
+    write(tmp_path / "code", {"handler.py": handler})
+    target = tmp_path / "bundle"
+    report = bundle_modules(
+        "handler",
+        code_dir=str(tmp_path / "code"),
+        layer_dirs=[str(tmp_path / "layer")],
+        target_dir=target,
+        suffixes=SUFFIXES,
+        **kwargs,
+    )
+    files = sorted(str(path.relative_to(target)) for path in target.rglob("*") if path.is_file())
+    return report, files
+
+
+def test_extension_suffixes():
+    assert extension_suffixes("python3.12", "arm64") == [".cpython-312-aarch64-linux-gnu.so", ".abi3.so", ".so"]
+    assert SUFFIXES[0] == ".cpython-312-x86_64-linux-gnu.so"
+
+
+def test_only_imported_modules_are_bundled_with_their_distribution_files(tmp_path):
+    install(tmp_path / "layer", "pkg", {
+        "pkg/__init__.py": "from . import used\n",
+        "pkg/used.py": "import json\n",
+        "pkg/unused.py": "",
+        "pkg/data/schema.json": "{}",
+        "pkg.libs/libfast.so.1": "",
+    })
+    install(tmp_path / "layer", "other", {"other/__init__.py": ""})
+
+    report, files = bundle(tmp_path, "import os\nimport boto3\nimport pkg\n")
+
+    assert report["modules"] == ["pkg", "pkg.used"]
+    assert report["missing"] == []
+    assert files == [
+        "pkg-1.0.dist-info/METADATA",
+        "pkg-1.0.dist-info/RECORD",
+        "pkg.libs/libfast.so.1",
+        "pkg/__init__.py",
+        "pkg/data/schema.json",
+        "pkg/used.py",
+    ]
+    assert report["files"] == len(files)
+    assert report["size"] < report["layer_size"]
+
+
+def test_namespace_packages(tmp_path):
+    write(tmp_path / "layer", {"ns/a/mod.py": "from ns.b import other\n", "ns/b/other.py": "", "ns/c/skip.py": ""})
+
+    report, files = bundle(tmp_path, "import ns.a.mod\n")
+
+    assert files == ["ns/a/mod.py", "ns/b/other.py"]
+    assert "ns.a.mod" in report["modules"]
+
+
+def test_extension_modules_of_the_runtime(tmp_path):
+    write(tmp_path / "layer", {
+        "fast.cpython-312-x86_64-linux-gnu.so": "",
+        "fast.cpython-312-aarch64-linux-gnu.so": "",
+    })
+
+    report, files = bundle(tmp_path, "import fast\n")
+
+    assert files == ["fast.cpython-312-x86_64-linux-gnu.so"]
+
+
+def test_extension_module_for_another_runtime_raises(tmp_path):
+    write(tmp_path / "layer", {"fast.cpython-39-x86_64-linux-gnu.so": ""})
+
+    with pytest.raises(ValueError, match="in the layers but cannot be bundled: fast"):
+        bundle(tmp_path, "import fast\n")
+
+
+def test_imports_found_nowhere_are_reported(tmp_path):
+    write(tmp_path / "layer", {})
+
+    report, files = bundle(tmp_path, "try:\n    import optional_speedups\nexcept ImportError:\n    pass\n")
+
+    assert report["missing"] == ["optional_speedups"]
+    assert files == []
+
+
+def test_include_copies_dynamically_imported_packages_whole(tmp_path):
+    write(tmp_path / "layer", {
+        "plugins/__init__.py": "",
+        "plugins/csv.py": "import helpers\n",
+        "plugins/data.txt": "",
+        "helpers.py": "",
+        "unrelated.py": "",
+    })
+    handler = "import importlib\nplugin = importlib.import_module('plugins.' + 'csv')\n"
+
+    assert bundle(tmp_path, handler)[1] == []
+    report, files = bundle(tmp_path, handler, include=["plugins"])
+
+    assert files == ["helpers.py", "plugins/__init__.py", "plugins/csv.py", "plugins/data.txt"]
+    assert report["modules"] == ["helpers", "plugins", "plugins.csv"]
+
+
+def test_include_of_an_unknown_module_raises(tmp_path):
+    write(tmp_path / "layer", {})
+
+    with pytest.raises(ValueError, match="'plugins' to include"):
+        bundle(tmp_path, "", include=["plugins"])
+
+
+def test_unknown_handler_module_raises(tmp_path):
+    write(tmp_path / "layer", {})
+
+    with pytest.raises(ValueError, match="Cannot analyze handler module 'missing'"):
+        bundle_modules(
+            "missing", code_dir=str(tmp_path), layer_dirs=[str(tmp_path / "layer")], target_dir=tmp_path / "bundle")
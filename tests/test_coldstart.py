@@ -0,0 +1,44 @@
+import pathlib
+
+import aws_cdk as cdk
+from aws_cdk import aws_lambda, aws_sqs
+
+import alabcdk
+from alabcdk.coldstart import incomplete, load_functions
+from alabcdk.config_bundle import CONFIG_BUNDLE_CONTEXT_KEY, READER_MODULE
+
+
+def synth(tmp_path, monkeypatch, environment):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "fn").mkdir()
+    (tmp_path / "fn" / "fn.py").write_text("def main(event, context):\n    pass\n")
+    outdir = tmp_path / "cdk.out"
+    app = cdk.App(outdir=str(outdir), context={CONFIG_BUNDLE_CONTEXT_KEY: "true"})
+    stack = alabcdk.AlabStack(app, "S", add_git_info=False)
+    queue = aws_sqs.Queue(stack, "Queue")
+    alabcdk.Function(
+        stack, "fn", code=aws_lambda.Code.from_asset(str(tmp_path / "fn")), environment=environment(queue))
+    app.synth()
+    return load_functions(str(outdir))["S/fn"]
+
+
+def test_config_layer_is_on_the_path(tmp_path, monkeypatch):
+    function = synth(tmp_path, monkeypatch, lambda queue: {"A": "1"})
+
+    [layer] = function["layers"]
+    assert layer.startswith(str(tmp_path / ".functions.out" / "config"))
+    assert (pathlib.Path(layer) / f"{READER_MODULE}.py").exists()
+    assert incomplete(function) == []
+
+
+def test_references_to_other_resources_make_a_function_incomplete(tmp_path, monkeypatch):
+    function = synth(tmp_path, monkeypatch, lambda queue: {"A": "1", "QUEUE": queue.queue_url})
+
+    assert function["unresolved_environment"] == ["QUEUE"]
+    assert incomplete(function) == ["environment variables QUEUE refer to other resources and are not set"]
+
+
+def test_layers_not_built_by_alabcdk_make_a_function_incomplete():
+    function = {"layers": ["/layers/a/python", None], "unresolved_environment": []}
+
+    assert incomplete(function) == ["1 layer(s) not built by alabcdk are left out"]
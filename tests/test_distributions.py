@@ -0,0 +1,114 @@
+import types
+
+from alabcdk.distributions import (
+    installed_distributions,
+    pinned_requirements,
+    read_manifest,
+    satisfies,
+)
+from alabcdk.lambdas import PipLayers
+from alabcdk.layer_size import dir_size
+
+
+def install(root, name, version, files, requires=()):
+    """
+    A distribution as pip installs it: its files and a .dist-info with METADATA and RECORD.
+    """
+    for path, content in files.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(content)
+    dist_info = root / f"{name.replace('-', '_')}-{version}.dist-info"
+    dist_info.mkdir(parents=True)
+    metadata = [f"Name: {name}", f"Version: {version}"] + [f"Requires-Dist: {r}" for r in requires]
+    (dist_info / "METADATA").write_text("\n".join(metadata) + "\n\n")
+    record = list(files) + [f"{dist_info.name}/METADATA", f"{dist_info.name}/RECORD"]
+    (dist_info / "RECORD").write_text("".join(f"{path},,\n" for path in record))
+
+
+def remove_preinstalled(root, pinned, manifest):
+    piplayers = types.SimpleNamespace(force_exclude_packages=[], get_dir_size=dir_size)
+    return PipLayers.remove_preinstalled_packages(
+        piplayers,
+        preexisting_packages={"python3.12": []},
+        root_dir=str(root),
+        preinstalled_distributions={"python3.12": manifest},
+        pinned=pinned,
+    )
+
+
+def test_pinned_requirements(tmp_path):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text(
+        "# comment\n"
+        "boto3==1.34.145\n"
+        "Requests[socks] >=2.28, <3  # inline comment\n"
+        "urllib3<2; python_version < '3.10'\n"
+        "attrs\n"
+        "-r other.txt\n"
+        "--index-url https://example.com/simple\n"
+    )
+    assert pinned_requirements(str(requirements)) == {"boto3": "==1.34.145", "requests": "<3,>=2.28", "urllib3": "<2"}
+
+
+def test_satisfies():
+    assert satisfies("1.34.145", "==1.34.145")
+    assert satisfies("1.34.145", ">=1.34,<2")
+    assert satisfies("1.34.145", "~=1.33") is True
+    assert satisfies("1.34.145", "==1.35.0") is False
+    assert satisfies(None, "==1.0") is None
+    assert satisfies("not a version", "==1.0") is None
+
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# header\nboto3==1.34.145\nPython_Dateutil\n\n")
+    assert read_manifest(str(manifest)) == {"boto3": "1.34.145", "python-dateutil": None}
+
+
+def test_shipped_manifests_have_versions():
+    import alabcdk
+
+    manifest = read_manifest(f"{alabcdk.__path__[0]}/preinstalled_dists_python3.12.txt")
+    assert manifest["boto3"] and manifest["botocore"]
+    assert "six" not in manifest
+
+
+def test_remove_deletes_exactly_the_recorded_files(tmp_path):
+    install(tmp_path, "mypkg", "1.0", {"mypkg/__init__.py": "", "mypkg/sub/data.json": "{}"})
+    (tmp_path / "mypkg" / "local.txt").write_text("not in RECORD")
+    (tmp_path / "other.py").write_text("")
+
+    [dist] = installed_distributions(str(tmp_path))
+    assert dist.top_level == {"mypkg"}
+    dist.remove()
+
+    assert sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*")) == [
+        "mypkg", "mypkg/local.txt", "other.py"
+    ]
+
+
+def test_pinned_distribution_the_runtime_satisfies_is_removed(tmp_path):
+    install(tmp_path, "boto3", "1.34.145", {"boto3/__init__.py": ""})
+    conflicts = remove_preinstalled(tmp_path, {"boto3": ">=1.34"}, {"boto3": "1.34.145"})
+    assert conflicts == []
+    assert not (tmp_path / "boto3").exists()
+
+
+def test_pinned_distribution_with_another_version_is_kept_with_its_requirements(tmp_path):
+    install(tmp_path, "boto3", "1.35.0", {"boto3/__init__.py": ""}, requires=["botocore (<1.36,>=1.35.0)"])
+    install(tmp_path, "botocore", "1.35.0", {"botocore/__init__.py": ""})
+    install(tmp_path, "jmespath", "1.0.1", {"jmespath/__init__.py": ""})
+    manifest = {"boto3": "1.34.145", "botocore": "1.34.145", "jmespath": "1.0.1"}
+
+    conflicts = remove_preinstalled(tmp_path, {"boto3": "==1.35.0"}, manifest)
+
+    assert len(conflicts) == 1 and "python3.12: 1.34.145" in conflicts[0]
+    assert (tmp_path / "boto3").exists() and (tmp_path / "botocore").exists()
+    assert not (tmp_path / "jmespath").exists()
+
+
+def test_pinned_distribution_with_unknown_runtime_version_is_kept(tmp_path):
+    install(tmp_path, "six", "1.16.0", {"six.py": ""})
+    conflicts = remove_preinstalled(tmp_path, {"six": "==1.16.0"}, {"six": None})
+    assert "unknown version" in conflicts[0]
+    assert (tmp_path / "six.py").exists()
@@ -0,0 +1,110 @@
+import os
+import stat
+import time
+import zipfile
+
+from alabcdk import fingerprints
+from alabcdk.fingerprints import FingerprintCache, list_files, staged_dir
+
+
+def make_tree(root):
+    (root / "pkg").mkdir()
+    (root / "pkg" / "__init__.py").write_text("x = 1\n")
+    (root / "bin").write_text("#!/bin/sh\n")
+    os.chmod(root / "bin", 0o755)
+    os.symlink("pkg/__init__.py", root / "link.py")
+    os.symlink("pkg", root / "pkglink")
+
+
+def test_list_files_keeps_symlinks_and_modes(tmp_path):
+    make_tree(tmp_path)
+    files = {relpath: mode for relpath, _, _, mode in list_files(str(tmp_path))}
+    assert files == {
+        "bin": stat.S_IFREG | 0o111,
+        "link.py": stat.S_IFLNK,
+        "pkg/__init__.py": stat.S_IFREG,
+        "pkglink": stat.S_IFLNK,
+    }
+
+
+def test_list_files_excludes(tmp_path):
+    make_tree(tmp_path)
+    (tmp_path / "pkg" / "bin").write_text("")
+    files = [relpath for relpath, _, _, _ in list_files(str(tmp_path), exclude=["/bin", "*.py"])]
+    assert files == ["pkg/bin", "pkglink"]
+
+
+def test_zip_stores_symlinks_and_exec_bit(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    make_tree(source)
+    zip_file, _ = FingerprintCache(str(tmp_path / "out")).zip(str(source))
+
+    with zipfile.ZipFile(zip_file) as z:
+        modes = {info.filename: info.external_attr >> 16 for info in z.infolist()}
+        assert z.read("link.py") == b"pkg/__init__.py"
+    assert modes == {
+        "bin": stat.S_IFREG | 0o755,
+        "link.py": stat.S_IFLNK | 0o777,
+        "pkg/__init__.py": stat.S_IFREG | 0o644,
+        "pkglink": stat.S_IFLNK | 0o777,
+    }
+
+
+def test_fingerprint_changes_with_exec_bit_and_link_target(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    make_tree(source)
+    cache = FingerprintCache(str(tmp_path / "out"))
+    fingerprints = [cache.fingerprint(str(source))]
+
+    os.chmod(source / "bin", 0o644)
+    fingerprints.append(cache.fingerprint(str(source)))
+    os.unlink(source / "link.py")
+    os.symlink("bin", source / "link.py")
+    fingerprints.append(cache.fingerprint(str(source)))
+
+    assert len(set(fingerprints)) == 3
+    assert FingerprintCache(str(tmp_path / "out")).fingerprint(str(source)) == fingerprints[-1]
+
+
+def test_staged_dir_is_built_once_per_key(tmp_path):
+    builds = []
+
+    def build(directory):
+        builds.append(directory)
+        directory.mkdir()
+        (directory / "module.py").write_text(str(len(builds)))
+
+    first = staged_dir(tmp_path, "a", build)
+    assert staged_dir(tmp_path, "a", build) == first == tmp_path / "a"
+    other = staged_dir(tmp_path, "b", build)
+
+    assert len(builds) == 2
+    assert (first / "module.py").read_text() == "1" and (other / "module.py").read_text() == "2"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "b"]
+
+
+def test_staged_dir_keeps_the_build_that_was_renamed_first(tmp_path):
+    def build(directory):
+        # Another synth finishes the same key while this one builds.
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "module.py").write_text("theirs")
+        directory.mkdir()
+        (directory / "module.py").write_text("ours")
+
+    assert (staged_dir(tmp_path, "a", build) / "module.py").read_text() == "theirs"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a"]
+
+
+def test_staged_dir_removes_unused_directories(tmp_path):
+    old = time.time() - fingerprints._STAGED_KEEP_SECONDS - 1
+    for name in ("stale", "recent"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "stale.lock").write_text("")
+    os.utime(tmp_path / "stale", (old, old))
+    os.utime(tmp_path / "stale.lock", (old, old))
+
+    staged_dir(tmp_path, "new", lambda directory: directory.mkdir())
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["new", "recent"]
@@ -0,0 +1,89 @@
+import os
+import subprocess
+
+import pytest
+
+from alabcdk.gitinfo import GitInfo, read_config
+
+
+def git(repo, *args, env=None):
+    return subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        cwd=repo, check=True, stdout=subprocess.PIPE, text=True, env={**os.environ, **(env or {})},
+    ).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    (tmp_path / "file").write_text("1")
+    git(tmp_path, "add", "file")
+    git(tmp_path, "commit", "-q", "-m", "first")
+    return tmp_path
+
+
+def test_head_branch_and_commit(repo):
+    info = GitInfo(str(repo))
+    assert info.branch == "main"
+    assert info.commit_id == git(repo, "rev-parse", "HEAD")
+
+    git(repo, "checkout", "-q", "--detach")
+    detached = GitInfo(str(repo))
+    assert detached.branch == ""
+    assert detached.commit_id == git(repo, "rev-parse", "HEAD")
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_annotated_tag_on_head(repo, packed):
+    git(repo, "tag", "lightweight")
+    git(repo, "tag", "-a", "v1.0", "-m", "release")
+    if packed:
+        git(repo, "pack-refs", "--all")
+    info = GitInfo(str(repo))
+
+    assert info.annotated_tags == {git(repo, "rev-parse", "HEAD"): ["v1.0"]}
+    assert info.tag == "v1.0"
+
+
+def test_several_tags_on_head_are_described_by_git(repo):
+    git(repo, "tag", "-a", "b-newest", "-m", "newest")
+    git(repo, "tag", "-a", "a-oldest", "-m", "oldest", env={"GIT_COMMITTER_DATE": "2001-01-01T00:00:00"})
+    assert GitInfo(str(repo)).tag == git(repo, "describe", "--always") == "b-newest"
+
+
+def test_untagged_head_is_described_by_git(repo):
+    assert GitInfo(str(repo)).tag == git(repo, "rev-parse", "--short", "HEAD")
+
+
+def test_remotes(repo):
+    git(repo, "remote", "add", "origin", "https://example.com/a.git")
+    git(repo, "remote", "set-url", "--add", "--push", "origin", "ssh://example.com/a.git")
+    git(repo, "remote", "add", "backup", "https://example.com/b.git")
+
+    expected = git(repo, "remote", "-v").replace("\t", " ").splitlines()
+    assert sorted(GitInfo(str(repo)).remotes) == sorted(expected)
+
+
+def test_no_remotes(repo):
+    assert GitInfo(str(repo)).remotes == []
+
+
+def test_worktree(repo, tmp_path_factory):
+    worktree = tmp_path_factory.mktemp("worktree") / "wt"
+    git(repo, "worktree", "add", "-q", "-b", "feature", str(worktree))
+    info = GitInfo(str(worktree))
+    assert info.branch == "feature"
+    assert info.commit_id == git(repo, "rev-parse", "main")
+    assert info.common_dir == repo / ".git"
+
+
+def test_read_config(tmp_path):
+    config = tmp_path / "config"
+    config.write_text(
+        '[core]\n\tbare = false\n; comment\n[remote "origin"]\n\turl = "https://example.com/a.git"\n'
+        "\tpushurl = one\n\tpushurl = two\n"
+    )
+    assert read_config(config) == {
+        ("core", None): {"bare": ["false"]},
+        ("remote", "origin"): {"url": ["https://example.com/a.git"], "pushurl": ["one", "two"]},
+    }
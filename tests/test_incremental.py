@@ -0,0 +1,61 @@
+import json
+
+import aws_cdk as cdk
+from aws_cdk import aws_lambda, aws_sqs
+
+import alabcdk
+from alabcdk.incremental import REPORT_FILE, IncrementalSynth
+from alabcdk.perf_lint import PERF_LINT_CONTEXT_KEY
+
+
+class AppStack(alabcdk.AlabStack):
+    def __init__(self, scope, id, *, code_dir, **kwargs):
+        super().__init__(scope, id, add_git_info=False, **kwargs)
+        queue = aws_sqs.Queue(self, "Queue")
+        function = alabcdk.Function(
+            self, "handler", code=aws_lambda.Code.from_asset(code_dir), environment={"QUEUE": queue.queue_url}
+        )
+        function.node.add_dependency(queue)
+
+
+def synth(tmp_path, outdir):
+    app = cdk.App(outdir=str(tmp_path / outdir), context={PERF_LINT_CONTEXT_KEY: "true"})
+    incremental = IncrementalSynth(app, cache_dir=str(tmp_path / "cache"))
+    incremental.add("Api", AppStack, code_dir=str(tmp_path / "handler"), stage="TEST")
+    assembly = incremental.synth()
+    return incremental, assembly
+
+
+def read(tmp_path, outdir, name):
+    return (tmp_path / outdir / name).read_bytes()
+
+
+def test_reused_stack_has_the_cloud_assembly_of_a_built_one(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "handler").mkdir()
+    (tmp_path / "handler" / "handler.py").write_text("def main(event, context):\n    pass\n")
+
+    built, _ = synth(tmp_path, "built")
+    reused, assembly = synth(tmp_path, "reused")
+
+    assert built.report["Api"]["action"] == "rebuilt"
+    assert reused.report["Api"] == {"action": "reused", "reasons": []}
+    for name in ["Api.template.json", "Api.assets.json", "Api.functions.json", "Api.perf-lint.json"]:
+        assert read(tmp_path, "reused", name) == read(tmp_path, "built", name), name
+    manifests = [json.loads(read(tmp_path, outdir, "manifest.json")) for outdir in ("built", "reused")]
+    assert manifests[0] == manifests[1]
+    assert assembly.get_stack_by_name("Api").template == json.loads(read(tmp_path, "built", "Api.template.json"))
+    assert json.loads(read(tmp_path, "reused", REPORT_FILE))["Api"]["action"] == "reused"
+
+
+def test_changed_code_rebuilds(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "handler").mkdir()
+    (tmp_path / "handler" / "handler.py").write_text("def main(event, context):\n    pass\n")
+    synth(tmp_path, "first")
+    (tmp_path / "handler" / "handler.py").write_text("def main(event, context):\n    return 1\n")
+
+    second, _ = synth(tmp_path, "second")
+
+    assert second.report["Api"]["action"] == "rebuilt"
+    assert any("assets changed" in reason for reason in second.report["Api"]["reasons"])
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+import aws_cdk
+import constructs
+
+import alabcdk
+
+
+def test_public_names_resolve():
+    for name in alabcdk.__all__:
+        assert getattr(alabcdk, name).__name__ == name
+
+
+def test_names_imported_before_lazy_loading_still_resolve():
+    assert alabcdk.Duration is aws_cdk.Duration
+    assert alabcdk.Construct is constructs.Construct
+    assert alabcdk.aws_cloudfront_origins is aws_cdk.aws_cloudfront_origins
+    assert "Duration" in dir(alabcdk) and "Duration" not in alabcdk.__all__
+
+
+def test_import_does_not_load_submodules():
+    code = "import sys, alabcdk; print(sorted(m for m in sys.modules if m.startswith('alabcdk.')))"
+    output = subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE, text=True).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,61 @@
+import os
+import shutil
+
+from alabcdk.layer_cache import LayerCache, build_key
+
+
+def make_layer(path, content: bytes):
+    (path / "python").mkdir(parents=True)
+    (path / "python" / "module.py").write_bytes(content)
+    return path
+
+
+def test_store_and_fetch(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"))
+    key = build_key(requirements="a==1", platform="x")
+    cache.store(key, make_layer(tmp_path / "src", b"a"))
+
+    assert cache.fetch(key, tmp_path / "dest")
+    assert (tmp_path / "dest" / "python" / "module.py").read_bytes() == b"a"
+    assert not cache.fetch(build_key(requirements="b==1", platform="x"), tmp_path / "other")
+
+
+def test_build_key_is_order_independent():
+    assert build_key(a=1, b=[1, 2]) == build_key(b=[1, 2], a=1)
+    assert build_key(a=1) != build_key(a=2)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # Each layer is 1 MB, the budget fits two.
+    cache = LayerCache(str(tmp_path / "cache"), max_size_mb=2)
+    for i, key in enumerate(["a" * 64, "b" * 64]):
+        cache.store(key, make_layer(tmp_path / f"src{i}", bytes(1024 * 1024)))
+        os.utime(cache.entry_dir(key) / "complete", (i, i))
+    # Using "a" makes "b" the least recently used.
+    assert cache.fetch("a" * 64, tmp_path / "dest")
+    cache.store("c" * 64, make_layer(tmp_path / "src2", bytes(1024 * 1024)))
+
+    assert [key for _, _, key in cache.entries()] == ["a" * 64, "c" * 64]
+    assert not cache.entry_dir("b" * 64).exists()
+
+
+def test_fetch_misses_an_entry_evicted_halfway(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"))
+    key = "d" * 64
+    cache.store(key, make_layer(tmp_path / "src", b"d"))
+    shutil.rmtree(cache.entry_dir(key) / "content")
+
+    assert not cache.fetch(key, tmp_path / "dest")
+    assert not (tmp_path / "dest").exists()
+
+
+def test_store_replaces_an_incomplete_entry(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"))
+    key = "e" * 64
+    # What an interrupted eviction leaves behind: content without the marker.
+    (cache.entry_dir(key) / "content").mkdir(parents=True)
+
+    cache.store(key, make_layer(tmp_path / "src", b"e"))
+
+    assert cache.contains(key)
+    assert cache.fetch(key, tmp_path / "dest")
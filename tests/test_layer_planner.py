@@ -0,0 +1,64 @@
+import pytest
+
+from alabcdk.layer_planner import drop_preinstalled, plan_layers
+
+
+def test_shared_distributions_are_shipped_once():
+    plan = plan_layers({
+        "data": {"numpy": "2.0.0", "pandas": "2.2.2"},
+        "ml": {"numpy": "2.0.0", "scikit-learn": "1.5.1"},
+    })
+
+    assert plan.chunks == {
+        "data": [("pandas", "2.2.2")],
+        "ml": [("scikit-learn", "1.5.1")],
+        "shared_data_ml": [("numpy", "2.0.0")],
+    }
+    assert plan.groups == {"data": ["data", "shared_data_ml"], "ml": ["shared_data_ml", "ml"]}
+
+
+def test_chunks_are_merged_to_fit_max_layers():
+    resolved = {group: {"common": "1.0", group: "1.0"} for group in "abc"}
+    resolved["a"]["ab"] = resolved["b"]["ab"] = "1.0"
+
+    plan = plan_layers(resolved, max_layers=2, combinations=[["a", "b", "c"]])
+
+    assert len(plan.chunks) <= 2
+    for group, dists in resolved.items():
+        shipped = {pin for chunk in plan.groups[group] for pin in plan.chunks[chunk]}
+        assert set(dists.items()) <= shipped
+
+
+def test_versions_differing_between_groups_are_kept_apart():
+    plan = plan_layers({"a": {"urllib3": "1.26.19"}, "b": {"urllib3": "2.2.2"}})
+    assert plan.chunks == {"a": [("urllib3", "1.26.19")], "b": [("urllib3", "2.2.2")]}
+
+
+def test_combination_with_differing_versions_raises():
+    resolved = {"a": {"urllib3": "1.26.19", "six": "1.16.0"}, "b": {"urllib3": "2.2.2", "six": "1.16.0"}}
+    with pytest.raises(ValueError, match=r"urllib3 \(a: 1.26.19, b: 2.2.2\)"):
+        plan_layers(resolved, combinations=[["a", "b"]])
+
+
+def test_unfittable_layers_raise():
+    resolved = {group: {group: "1.0", "x": group} for group in "abcdef"}
+    with pytest.raises(ValueError, match="Cannot fit"):
+        plan_layers({**resolved, "all": {"a": "1.0", "b": "1.0", "c": "1.0"}}, max_layers=1)
+
+
+def test_drop_preinstalled():
+    resolved = {
+        "boto3": {"version": "1.35.0", "requires": ["botocore", "jmespath"]},
+        "botocore": {"version": "1.35.0", "requires": ["jmespath"]},
+        "jmespath": {"version": "1.0.1", "requires": []},
+        "attrs": {"version": "23.2.0", "requires": []},
+    }
+    manifests = {"python3.12": {"boto3": "1.34.145", "botocore": "1.34.145", "jmespath": "1.0.1"}}
+
+    assert drop_preinstalled(resolved, preinstalled_distributions=manifests, pinned={}) == {"attrs": "23.2.0"}
+    assert drop_preinstalled(resolved, preinstalled_distributions=manifests, pinned={"boto3": ">=1.34"}) == {
+        "attrs": "23.2.0"
+    }
+    assert drop_preinstalled(resolved, preinstalled_distributions=manifests, pinned={"boto3": "==1.35.0"}) == {
+        "attrs": "23.2.0", "boto3": "1.35.0", "botocore": "1.35.0", "jmespath": "1.0.1"
+    }
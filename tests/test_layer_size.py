@@ -0,0 +1,24 @@
+import aws_cdk as cdk
+from constructs import Construct
+
+from alabcdk.layer_size import built_layers, check_budget, record_layer
+
+
+def test_built_layers_are_kept_per_app(tmp_path):
+    (tmp_path / "module.py").write_text("x = 1\n")
+    first, second = cdk.App(), cdk.App()
+    layer = Construct(cdk.Stack(first, "S"), "layer")
+    Construct(cdk.Stack(second, "S"), "layer")
+
+    record_layer(layer, str(tmp_path), architecture="arm64")
+
+    assert built_layers(first) == {
+        "S/layer": {"dir": str(tmp_path), "size": 6, "architecture": "arm64", "versions": {}}
+    }
+    assert built_layers(second) == {}
+
+
+def test_check_budget():
+    assert check_budget("Layer", 10 * 1024 * 1024, warn_mb=20, fail_mb=30) == (None, None)
+    assert check_budget("Layer", 25 * 1024 * 1024, warn_mb=20, fail_mb=30)[0] == "warning"
+    assert check_budget("Layer", 35 * 1024 * 1024, warn_mb=20, fail_mb=30)[0] == "error"
@@ -0,0 +1,47 @@
+import json
+
+import aws_cdk as cdk
+import pytest
+
+from alabcdk.utils import OUTPUTS_CONTEXT_KEY, generate_output
+
+
+def synth(tmp_path, context=None, values=(("url", "https://a"), ("bucket", "b"), ("url", "https://b"))):
+    outdir = tmp_path / "cdk.out"
+    app = cdk.App(outdir=str(outdir), context=context or {})
+    stack = cdk.Stack(app, "S")
+    for name, value in values:
+        generate_output(stack, name, value)
+    app.synth()
+    return json.loads((outdir / "S.template.json").read_text())
+
+
+def test_output_ids_are_stable(tmp_path):
+    first = synth(tmp_path / "first")
+    second = synth(tmp_path / "second")
+
+    assert first == second
+    assert {id: output["Value"] for id, output in first["Outputs"].items()} == {
+        "Outputurl": "url=https://a",
+        "Outputbucket": "bucket=b",
+        "Outputurl2": "url=https://b",
+    }
+
+
+@pytest.mark.parametrize("mode", ["manifest", "ssm"])
+def test_values_are_collected_in_one_sorted_document(tmp_path, mode):
+    template = synth(tmp_path, {OUTPUTS_CONTEXT_KEY: mode})
+
+    if mode == "manifest":
+        [output] = template["Outputs"].values()
+        document = output["Value"]
+    else:
+        [parameter] = [r for r in template["Resources"].values() if r["Type"] == "AWS::SSM::Parameter"]
+        document = parameter["Properties"]["Value"]
+    assert json.loads(document) == {"bucket": "b", "url": "https://a", "url#2": "https://b"}
+    assert list(json.loads(document)) == ["bucket", "url", "url#2"]
+
+
+def test_unknown_mode_raises(tmp_path):
+    with pytest.raises(ValueError, match=OUTPUTS_CONTEXT_KEY):
+        synth(tmp_path, {OUTPUTS_CONTEXT_KEY: "all"})
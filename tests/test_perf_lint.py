@@ -0,0 +1,165 @@
+import json
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk import (
+    aws_apigateway, aws_cloudfront, aws_cloudfront_origins, aws_dynamodb, aws_lambda, aws_lambda_event_sources,
+    aws_sqs)
+
+from alabcdk.perf_lint import REPORT_SUFFIX, PerfLint, suppress
+
+
+def function(scope, id, **kwargs):
+    return aws_lambda.Function(
+        scope, id,
+        runtime=aws_lambda.Runtime.PYTHON_3_12,
+        handler="index.handler",
+        code=aws_lambda.Code.from_inline("def handler(event, context): pass"),
+        **kwargs)
+
+
+def lint(tmp_path, build, **kwargs):
+    """
+    Synthesize stack S built by build(stack) with PerfLint and return the report.
+    """
+    outdir = tmp_path / "cdk.out"
+    app = cdk.App(outdir=str(outdir))
+    stack = cdk.Stack(app, "S")
+    build(stack)
+    cdk.Aspects.of(stack).add(PerfLint(**kwargs))
+    app.synth()
+    return json.loads((outdir / ("S" + REPORT_SUFFIX)).read_text())
+
+
+def rules(report, suppressed=False):
+    return sorted(
+        (finding["rule"], finding["path"])
+        for finding in report["findings"]
+        if (finding["suppressed"] is not None) == suppressed
+    )
+
+
+def test_lambda_defaults_are_reported(tmp_path):
+    def build(stack):
+        function(stack, "Small")
+        function(stack, "Tuned", memory_size=1024, timeout=cdk.Duration.seconds(30))
+
+    report = lint(tmp_path, build)
+
+    assert rules(report) == [("lambda-memory", "S/Small/Resource"), ("lambda-timeout", "S/Small/Resource")]
+    assert report["levels"]["lambda-memory"] == "warning"
+
+
+def test_min_memory_mb(tmp_path):
+    def build(stack):
+        function(stack, "F", memory_size=512, timeout=cdk.Duration.seconds(30))
+
+    assert rules(lint(tmp_path / "default", build)) == []
+    assert rules(lint(tmp_path / "raised", build, min_memory_mb=512)) == [("lambda-memory", "S/F/Resource")]
+
+
+def test_rest_api_without_cache_and_compression(tmp_path):
+    def build(stack):
+        api = aws_apigateway.RestApi(stack, "Api")
+        api.root.add_method("GET")
+        tuned = aws_apigateway.RestApi(
+            stack, "Tuned",
+            min_compression_size=cdk.Size.kibibytes(1),
+            deploy_options=aws_apigateway.StageOptions(cache_cluster_enabled=True))
+        tuned.root.add_method("GET")
+
+    report = lint(tmp_path, build)
+
+    assert rules(report) == [
+        ("apigateway-cache", "S/Api/DeploymentStage.prod/Resource"),
+        ("apigateway-compression", "S/Api/Resource"),
+    ]
+    assert {f["rule"]: f["level"] for f in report["findings"]}["apigateway-cache"] == "info"
+
+
+def test_cloudfront_behaviors_without_cache_policy_or_compression(tmp_path):
+    def build(stack):
+        origin = aws_cloudfront_origins.HttpOrigin("example.com")
+        distribution = aws_cloudfront.Distribution(
+            stack, "Cdn",
+            default_behavior=aws_cloudfront.BehaviorOptions(
+                origin=origin, cache_policy=aws_cloudfront.CachePolicy.CACHING_OPTIMIZED))
+        distribution.add_behavior(
+            "/api/*", origin, compress=False, cache_policy=aws_cloudfront.CachePolicy.CACHING_DISABLED)
+
+    report = lint(tmp_path, build)
+
+    assert rules(report) == [("cloudfront-compression", "S/Cdn/Resource")]
+    assert "behavior /api/*" in report["findings"][0]["message"]
+
+
+def test_provisioned_table_without_autoscaling(tmp_path):
+    key = aws_dynamodb.Attribute(name="id", type=aws_dynamodb.AttributeType.STRING)
+
+    def build(stack):
+        aws_dynamodb.Table(stack, "Fixed", partition_key=key, billing_mode=aws_dynamodb.BillingMode.PROVISIONED)
+        scaled = aws_dynamodb.Table(
+            stack, "Scaled", partition_key=key, billing_mode=aws_dynamodb.BillingMode.PROVISIONED)
+        scaled.auto_scale_read_capacity(min_capacity=1, max_capacity=10).scale_on_utilization(
+            target_utilization_percent=70)
+        aws_dynamodb.Table(
+            stack, "OnDemand", partition_key=key, billing_mode=aws_dynamodb.BillingMode.PAY_PER_REQUEST)
+
+    assert rules(lint(tmp_path, build)) == [("dynamodb-autoscaling", "S/Fixed/Resource")]
+
+
+@pytest.mark.parametrize("visibility, findings", [(30, 1), (180, 0)])
+def test_queue_visibility_timeout_against_consumer_timeout(tmp_path, visibility, findings):
+    def build(stack):
+        queue = aws_sqs.Queue(stack, "Queue", visibility_timeout=cdk.Duration.seconds(visibility))
+        consumer = function(stack, "Consumer", memory_size=1024, timeout=cdk.Duration.seconds(30))
+        consumer.add_event_source(aws_lambda_event_sources.SqsEventSource(queue))
+
+    report = lint(tmp_path, build)
+
+    assert rules(report) == [("sqs-visibility-timeout", "S/Queue/Resource")] * findings
+    if findings:
+        assert "S/Consumer/Resource" in report["findings"][0]["message"]
+
+
+def test_suppressed_findings_are_reported_but_not_annotated(tmp_path):
+    def build(stack):
+        small = function(stack, "Small", timeout=cdk.Duration.seconds(30))
+        suppress(small, "lambda-memory", reason="Only forwards a message.")
+
+    outdir = tmp_path / "cdk.out"
+    app = cdk.App(outdir=str(outdir))
+    stack = cdk.Stack(app, "S")
+    build(stack)
+    cdk.Aspects.of(stack).add(PerfLint())
+    assembly = app.synth()
+    report = json.loads((outdir / ("S" + REPORT_SUFFIX)).read_text())
+
+    assert rules(report) == []
+    assert rules(report, suppressed=True) == [("lambda-memory", "S/Small/Resource")]
+    assert report["findings"][0]["suppressed"] == "Only forwards a message."
+    messages = [m.entry.data for m in assembly.get_stack_by_name("S").messages]
+    assert not any("lambda-memory" in str(message) for message in messages)
+
+
+def test_suppress_requires_a_reason():
+    stack = cdk.Stack(cdk.App(), "S")
+    with pytest.raises(ValueError, match="reason"):
+        suppress(stack, "*", reason="")
+
+
+def test_levels(tmp_path):
+    def build(stack):
+        function(stack, "Small")
+
+    report = lint(tmp_path, build, levels={"lambda-memory": "off", "lambda-timeout": "error"})
+
+    assert report["levels"]["lambda-memory"] == "off"
+    assert rules(report) == [("lambda-timeout", "S/Small/Resource")]
+    assert report["findings"][0]["level"] == "error"
+
+
+@pytest.mark.parametrize("levels, match", [({"lambda-mem": "off"}, "Unknown"), ({"lambda-memory": "fatal"}, "one of")])
+def test_invalid_levels_raise(levels, match):
+    with pytest.raises(ValueError, match=match):
+        PerfLint(levels=levels)
@@ -0,0 +1,70 @@
+import aws_cdk as cdk
+from aws_cdk import assertions, aws_certificatemanager
+
+from alabcdk import Website
+from alabcdk.utils import RoutingPlan, route_kwargs
+
+
+class Part:
+    def __init__(self, scope, id, *, name: str = None, integration_request_templates: dict = None, **kwargs):
+        pass
+
+
+def test_route_splits_by_longest_prefix():
+    plan = RoutingPlan(Part, ["lambda_", "lambda_layer_", "method_"])
+    routed, unrouted = plan.route({
+        "lambda_memory_size": 256,
+        "lambda_layer_name": "deps",
+        "method_api_key_required": True,
+        "name": "own",
+    })
+    assert routed == {
+        "lambda_layer_": {"name": "deps"},
+        "lambda_": {"memory_size": 256},
+        "method_": {"api_key_required": True},
+    }
+    assert unrouted == {}
+
+
+def test_own_parameters_with_a_prefix_are_routed():
+    routed, unrouted = RoutingPlan(Part, ["integration_"]).route({"integration_request_templates": {"a": "b"}})
+    assert routed == {"integration_": {"request_templates": {"a": "b"}}}
+    assert unrouted == {}
+
+
+def test_unknown_arguments_are_explained():
+    plan = RoutingPlan(Part, ["lambda_", "method_"])
+    _, unrouted = plan.route({"lamda_timeout": 3, "memory": 128})
+    assert unrouted["lamda_timeout"] == (
+        "Part: ignoring unknown argument 'lamda_timeout', did you mean 'lambda_timeout'?"
+    )
+    assert "must start with one of lambda_, method_" in unrouted["memory"]
+
+
+def test_route_kwargs_warns_on_the_construct():
+    app = cdk.App()
+    stack = cdk.Stack(app, "S")
+    result = route_kwargs(stack, {"lambda_timeout": 3, "lamda_timeout": 3}, ["method_", "lambda_"])
+    assert list(result) == ["method_", "lambda_"]
+    assert result == {"method_": {}, "lambda_": {"timeout": 3}}
+    assertions.Annotations.from_stack(stack).has_warning("/S", assertions.Match.string_like_regexp("lamda_timeout"))
+
+
+def test_website_passes_prefixed_arguments_to_its_parts(tmp_path):
+    app = cdk.App(outdir=str(tmp_path))
+    stack = cdk.Stack(app, "S")
+    certificate = aws_certificatemanager.Certificate.from_certificate_arn(
+        stack, "cert", "arn:aws:acm:us-east-1:111111111111:certificate/abc"
+    )
+    Website(
+        stack,
+        "site",
+        domain_name="example.com",
+        hosted_zone_id="Z123",
+        certificate=certificate,
+        s3_versioned=True,
+        cf_comment="my site",
+    )
+    template = assertions.Template.from_stack(stack)
+    template.has_resource_properties("AWS::S3::Bucket", {"VersioningConfiguration": {"Status": "Enabled"}})
+    template.has_resource_properties("AWS::CloudFront::Distribution", {"DistributionConfig": {"Comment": "my site"}})
@@ -0,0 +1,47 @@
+import json
+
+import aws_cdk as cdk
+from aws_cdk import aws_lambda
+
+from alabcdk.lambdas import PipLayers
+from alabcdk.utils import gen_name
+
+ENV = cdk.Environment(account="111111111111", region="eu-west-1")
+
+
+def synth(tmp_path, outdir, context):
+    app = cdk.App(outdir=str(tmp_path / outdir), context=context)
+    for id in ("StackA", "StackB"):
+        PipLayers.create_layer(
+            None,
+            cdk.Stack(app, id, env=ENV),
+            "Deps",
+            tmp_path / "layer",
+            architecture=aws_lambda.Architecture.X86_64,
+            compatible_runtimes=[aws_lambda.Runtime.PYTHON_3_12],
+            fingerprint_assets=False,
+            shared=True,
+            shared_namespace="alabcdk",
+        )
+    app.synth()
+    manifest = json.loads((tmp_path / outdir / "manifest.json").read_text())
+    templates = {id: json.loads((tmp_path / outdir / f"{id}.template.json").read_text()) for id in ("StackA", "StackB")}
+    return manifest, templates
+
+
+def test_stacks_of_one_app_reference_the_shared_layer_by_parameter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "layer" / "python").mkdir(parents=True)
+    (tmp_path / "layer" / "python" / "module.py").write_text("x = 1\n")
+
+    manifest, before = synth(tmp_path, "before", {})
+    [missing] = manifest["missing"]
+    assert "StackA" in manifest["artifacts"]["StackB"]["dependencies"]
+    assert "Outputs" not in before["StackA"]
+    assert not any(r["Type"] == "AWS::Lambda::LayerVersion" for r in before["StackB"].get("Resources", {}).values())
+
+    # After deploying, the lookup finds the layer published by StackA.
+    name = gen_name(cdk.Stack(cdk.App(), "StackA"), "Deps")
+    arn = f"arn:aws:lambda:eu-west-1:111111111111:layer:{name}:1"
+    _, after = synth(tmp_path, "after", {missing["key"]: arn})
+    assert after == before
@@ -0,0 +1,138 @@
+import collections
+import io
+import os
+import pathlib
+
+import pytest
+
+from alabcdk.runtime import warm_cache
+
+
+class NotModified(Exception):
+    def __init__(self):
+        super().__init__("Not Modified")
+        self.response = {"Error": {"Code": "304"}}
+
+
+class FakeS3:
+    """
+    Stand-in for an S3 client: get_object with ETags and If-None-Match.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+
+    def put(self, bucket, key, body: bytes):
+        version = self.objects.get((bucket, key), (None, 0))[1] + 1
+        self.objects[(bucket, key)] = (body, version)
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.calls.append((Bucket, Key, IfNoneMatch))
+        body, version = self.objects[(Bucket, Key)]
+        etag = f'"{version}"'
+        if IfNoneMatch == etag:
+            raise NotModified()
+        return {"Body": io.BytesIO(body), "ETag": etag, "ContentLength": len(body)}
+
+
+@pytest.fixture
+def s3():
+    warm_cache.reset_stats()
+    return FakeS3()
+
+
+def test_unchanged_object_is_revalidated(s3, tmp_path):
+    s3.put("b", "k", b"data")
+    cache = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    assert cache.load("b", "k", loader) == b"data"
+    assert cache.load("b", "k", loader) == b"data"
+
+    assert s3.calls == [("b", "k", None), ("b", "k", '"1"')]
+    assert len(loads) == 1
+    stats = warm_cache.stats()
+    assert (stats["s3.misses"], stats["s3.hits"], stats["load.hits"]) == (1, 1, 1)
+
+
+def test_changed_object_is_loaded_again(s3, tmp_path):
+    s3.put("b", "k", b"old")
+    cache = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    assert cache.read_bytes("b", "k") == b"old"
+
+    s3.put("b", "k", b"new")
+    assert cache.load("b", "k", lambda path: pathlib.Path(path).read_bytes()) == b"new"
+    assert cache.etag("b", "k") == '"2"'
+    assert warm_cache.stats()["s3.misses"] == 2
+
+
+def test_least_recently_used_is_evicted(s3, tmp_path):
+    for key in "abc":
+        s3.put("b", key, b"1234")
+    cache = warm_cache.S3Cache(directory=str(tmp_path), client=s3, max_bytes=10)
+    path_b = cache.path("b", "b")
+    cache.path("b", "a")
+    cache.path("b", "b")
+    cache.path("b", "a")
+    cache.path("b", "c")
+
+    assert not os.path.exists(path_b)
+    assert list(cache._entries) == [("b", "a"), ("b", "c")]
+    assert cache.size == 8
+    assert warm_cache.stats()["s3.evictions"] == 1
+
+
+def test_missing_file_is_downloaded_again(s3, tmp_path):
+    s3.put("b", "k", b"data")
+    cache = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    os.unlink(cache.path("b", "k"))
+
+    assert cache.read_bytes("b", "k") == b"data"
+    assert s3.calls[-1] == ("b", "k", None)
+
+
+def test_caches_sharing_a_directory_keep_their_files(s3, tmp_path):
+    s3.put("b", "k", b"data")
+    first = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    path = first.path("b", "k")
+    second = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    second.path("b", "k")
+    second.clear()
+
+    assert os.path.exists(path)
+    assert first.read_bytes("b", "k") == b"data"
+
+
+def test_caches_share_the_storage_budget(s3, tmp_path, monkeypatch):
+    usage = collections.namedtuple("usage", "total used free")
+    monkeypatch.setattr(warm_cache.shutil, "disk_usage", lambda directory: usage(20, 0, 20))
+    monkeypatch.setattr(warm_cache, "_budgets", {})
+    for key in "abc":
+        s3.put("b", key, b"1234")
+    first = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    second = warm_cache.S3Cache(directory=str(tmp_path), client=s3)
+    path_a = first.path("b", "a")
+    second.path("b", "b")
+    first.path("b", "c")
+
+    assert first.max_bytes == second.max_bytes == 10
+    assert not os.path.exists(path_a)
+    assert list(first._entries) == [("b", "c")]
+    assert list(second._entries) == [("b", "b")]
+    assert warm_cache.stats()["s3.evictions"] == 1
+
+
+def test_default_cache(s3, tmp_path, monkeypatch):
+    monkeypatch.setitem(warm_cache.S3Cache.__init__.__kwdefaults__, "directory", str(tmp_path))
+    monkeypatch.setitem(warm_cache.S3Cache.__init__.__kwdefaults__, "client", s3)
+    monkeypatch.setattr(warm_cache, "_default_s3_cache", None)
+    s3.put("b", "k", b"data")
+
+    assert warm_cache.s3_cache() is warm_cache.s3_cache()
+    assert warm_cache.s3_cache().read_bytes("b", "k") == b"data"